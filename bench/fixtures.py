@@ -0,0 +1,133 @@
+"""Jeux de données et services locaux des benchmarks (aucun accès réseau externe)."""
+
+import asyncio
+import os
+import random
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from aiohttp import web
+
+LEVELS = ["INFO"] * 14 + ["WARNING"] * 3 + ["ERROR"] * 2 + ["CRITICAL"]
+
+MESSAGES = [
+    "Connection from 10.0.{a}.{b} port {c} accepted",
+    "Request GET /api/v1/items/{c} completed in {a} ms",
+    "Worker {a} processed {c} jobs",
+    "Disk usage on /dev/sda{a} at {b}%",
+    "Timeout while connecting to db-{a}.internal:5432 after {b} s",
+    "User user{c} logged in from 192.168.{a}.{b}",
+    "Cache miss for key session:{c}",
+    "Out of memory: killed process {c} (python) score {a}",
+]
+
+WORDS = ("nginx dns proxy cache disque mémoire réseau firewall certificat ssl docker kernel "
+         "systemd journal sauvegarde restauration latence timeout inode partition swap "
+         "processus service redémarrage configuration authentification ldap vpn routeur").split()
+
+SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)([KMGT]?)$", re.I)
+
+def parse_size(text: str) -> int:
+    """Convertit une taille lisible (ex: 256M, 2G) en octets."""
+    found = SIZE_RE.match(text.strip())
+    if not found:
+        raise ValueError(f"Taille invalide: {text}")
+    number, unit = found.groups()
+    return int(float(number) * 1024 ** " KMGT".index(unit.upper() or " "))
+
+def write_synthetic_log(path: Path, size: int, seed: int = 42) -> None:
+    """Écrit un log horodaté d'environ size octets; un fichier existant de la bonne taille est réutilisé."""
+    if path.exists() and abs(path.stat().st_size - size) < 1024 * 1024:
+        return
+    rng = random.Random(seed)
+    moment = datetime(2024, 1, 1)
+    tmp = path.with_suffix(".tmp")
+    written = 0
+    with open(tmp, "w", encoding="ascii") as f:
+        while written < size:
+            lines = []
+            for _ in range(100):
+                # Un horodatage par groupe de lignes: la génération reste rapide même pour plusieurs Go
+                moment += timedelta(seconds=rng.randint(1, 3))
+                stamp = moment.strftime("%Y-%m-%dT%H:%M:%S")
+                for _ in range(50):
+                    message = rng.choice(MESSAGES).format(a=rng.randint(0, 255), b=rng.randint(0, 99),
+                                                          c=rng.randint(1000, 99999))
+                    lines.append(f"{stamp} host{rng.randint(1, 8)} app[{rng.randint(100, 999)}]: "
+                                 f"{rng.choice(LEVELS)} {message}")
+            block = "\n".join(lines) + "\n"
+            f.write(block)
+            written += len(block)
+    os.replace(tmp, path)
+
+def write_docs(directory: Path, count: int, seed: int = 7) -> None:
+    """Crée un corpus de documentation Markdown pour l'index de search_web."""
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    for i in range(count):
+        path = directory / f"doc-{i:04d}.md"
+        if path.exists():
+            continue
+        title = " ".join(rng.sample(WORDS, 3))
+        paragraphs = [" ".join(rng.choices(WORDS, k=60)) for _ in range(8)]
+        path.write_text(f"# {title}\n\n" + "\n\n".join(paragraphs) + "\n", encoding="utf-8")
+
+def prepare_files(workdir: Path, log_size: int, docs: int) -> Dict[str, Any]:
+    """Prépare les fichiers des benchmarks dans workdir et retourne leurs chemins."""
+    logs = workdir / "logs"
+    logs.mkdir(parents=True, exist_ok=True)
+    main_log = logs / "app.log"
+    write_synthetic_log(main_log, log_size)
+    # Quelques fichiers rotatifs plus petits pour la recherche multi-fichiers
+    for i in range(1, 4):
+        write_synthetic_log(logs / f"app.log.{i}", max(1024 * 1024, log_size // 16), seed=42 + i)
+    config = workdir / "config.ini"
+    if not config.exists():
+        config.write_text("".join(f"[section{i}]\nkey{i} = value{i}\n" for i in range(500)), encoding="utf-8")
+    write_docs(workdir / "docs", docs)
+    with open(main_log, "rb") as f:
+        lines = sum(block.count(b"\n") for block in iter(lambda: f.read(64 * 1024 * 1024), b""))
+    return {
+        "log": str(main_log),
+        "log_dir": str(logs),
+        "log_size": main_log.stat().st_size,
+        "log_lines": lines,
+        "config": str(config),
+        "docs": str(workdir / "docs"),
+    }
+
+async def start_http_stub() -> Tuple[web.AppRunner, str]:
+    """Serveur aiohttp local remplaçant les sites distants de http_request."""
+    page = "<html><head><title>Page {n}</title></head><body>" + ("<p>" + " ".join(WORDS) + "</p>") * 40 + "</body></html>"
+
+    async def handle_page(request: web.Request) -> web.Response:
+        return web.Response(text=page.format(n=request.match_info["n"]), content_type="text/html")
+
+    async def handle_slow(request: web.Request) -> web.Response:
+        await asyncio.sleep(int(request.query.get("ms", "50")) / 1000)
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get("/page/{n}", handle_page)
+    app.router.add_get("/slow", handle_slow)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+async def start_listeners(count: int) -> Tuple[List[asyncio.AbstractServer], List[int]]:
+    """Ouvre count ports TCP en écoute sur localhost pour port_scan et ping_host (méthode tcp)."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.close()
+
+    servers = []
+    ports = []
+    for _ in range(count):
+        listener = await asyncio.start_server(handle, "127.0.0.1", 0)
+        servers.append(listener)
+        ports.append(listener.sockets[0].getsockname()[1])
+    return servers, sorted(ports)
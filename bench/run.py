@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Benchmarks du serveur MCP: latence, débit, mémoire et latence de boucle, outil par outil.
+
+Le serveur est piloté en processus (sessions MCP en mémoire, une par client simulé) et via
+stdio (un processus serveur, les clients simulés partageant la session), uniquement contre
+des ressources locales: log synthétique, serveur aiohttp local, ports en écoute sur localhost.
+
+Exemples:
+    python bench/run.py
+    python bench/run.py --mode stdio --clients 16 --log-size 2G
+    python bench/run.py --save-baseline bench/baseline.json
+    python bench/run.py --compare bench/baseline.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import psutil
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fixtures import WORDS, parse_size, prepare_files, start_http_stub, start_listeners  # noqa: E402
+
+CACHED_TOOLS = ("system_info", "read_file", "http_request", "log_analysis")
+
+class Scenario:
+    """Appel d'outil répété: make_args(i, rng) fournit les arguments du i-ème appel."""
+
+    def __init__(self, label: str, tool: str, make_args: Callable[[int, random.Random], Dict[str, Any]],
+                 heavy: bool = False):
+        self.label = label
+        self.tool = tool
+        self.make_args = make_args
+        self.heavy = heavy  # parcourt des fichiers entiers: moins d'appels
+
+def build_scenarios(fx: Dict[str, Any], base_url: str, ports: List[int]) -> List[Scenario]:
+    log = fx["log"]
+    last_line = max(1, fx["log_lines"] - 5000)
+    return [
+        Scenario("calculator", "calculator",
+                 lambda i, rng: {"expression": "sqrt(x) * 2 + sin(x) / (1 + x^2)", "variables": {"x": i}}),
+        Scenario("calculator.batch", "calculator",
+                 lambda i, rng: {"expression": "x * 1024^2 + log(x + 1)", "batch": [{"x": i + k} for k in range(1000)]}),
+        Scenario("system_info.cpu", "system_info", lambda i, rng: {"info_type": "cpu"}),
+        Scenario("system_info.processes", "system_info", lambda i, rng: {"info_type": "processes", "limit": 20}),
+        Scenario("read_file.whole", "read_file", lambda i, rng: {"file_path": fx["config"]}),
+        # Seuls scénarios avec le cache des résultats: les autres mesurent toujours l'exécution réelle
+        Scenario("cached.system_info", "system_info", lambda i, rng: {"info_type": "processes", "limit": 20,
+                                                                      "cache": True}),
+        Scenario("cached.read_file", "read_file", lambda i, rng: {"file_path": fx["config"], "cache": True}),
+        Scenario("read_file.range", "read_file",
+                 lambda i, rng: {"file_path": log, "offset": rng.randrange(fx["log_size"]), "length": 65536}),
+        Scenario("read_file.lines", "read_file",
+                 lambda i, rng: (lambda start: {"file_path": log, "start_line": start, "end_line": start + 199})(
+                     rng.randint(1, last_line))),
+        Scenario("read_file.hex", "read_file",
+                 lambda i, rng: {"file_path": log, "offset": rng.randrange(fx["log_size"]), "view": "hex"}),
+        Scenario("log_analysis.tail", "log_analysis",
+                 lambda i, rng: {"log_file": log, "pattern": "ERROR|CRITICAL", "lines": 2000 + i % 7}),
+        Scenario("log_analysis.range", "log_analysis",
+                 lambda i, rng: {"log_file": log, "patterns": ["ERROR", "Timeout"],
+                                 "start_line": rng.randint(1, last_line), "lines": 5000}),
+        Scenario("log_analysis.search", "log_analysis",
+                 lambda i, rng: {"log_file": fx["log_dir"], "patterns": ["Out of memory", f"user{1000 + i}"],
+                                 "max_matches": 100}, heavy=True),
+        Scenario("log_analysis.aggregate", "log_analysis",
+                 lambda i, rng: {"log_file": fx["log_dir"], "mode": "aggregate", "bucket": "hour",
+                                 "pattern": "ERROR" if i % 2 else "WARNING"}, heavy=True),
+        Scenario("http_request", "http_request",
+                 lambda i, rng: {"url": f"{base_url}/page/{i}", "preview_chars": 500}),
+        Scenario("http_request.slow", "http_request",
+                 lambda i, rng: {"url": f"{base_url}/slow?ms=50&i={i}", "preview_chars": 100}),
+        Scenario("port_scan", "port_scan",
+                 lambda i, rng: {"host": "127.0.0.1", "ports": f"{ports[0]}-{ports[0] + 199}", "timeout": 0.5}),
+        Scenario("ping_host.tcp", "ping_host",
+                 lambda i, rng: {"host": "127.0.0.1", "method": "tcp", "port": rng.choice(ports), "count": 3}),
+        Scenario("search_web.local", "search_web",
+                 lambda i, rng: {"query": " ".join(rng.sample(WORDS, 2)), "providers": ["local"]}),
+        Scenario("server_stats", "server_stats", lambda i, rng: {}),
+        Scenario("batch.triage", "batch",
+                 lambda i, rng: {"calls": [{"name": "system_info", "arguments": {"info_type": kind}}
+                                           for kind in ("cpu", "memory", "disk", "processes")] + [
+                     {"name": "ping_host", "arguments": {"host": "127.0.0.1", "method": "tcp", "port": ports[0], "count": 1}},
+                     {"name": "log_analysis", "arguments": {"log_file": log, "pattern": "ERROR|CRITICAL", "lines": 500 + i % 7}},
+                 ]}),
+    ]
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+class Monitor:
+    """Échantillonne le RSS de l'arbre de processus du serveur et, en processus, la latence de la boucle."""
+
+    def __init__(self, pid: int, measure_lag: bool, interval: float = 0.02):
+        self.process = psutil.Process(pid)
+        self.measure_lag = measure_lag
+        self.interval = interval
+        self.peak_rss = 0
+        self.lags: List[float] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def rss(self) -> int:
+        total = 0
+        for proc in [self.process] + self.process.children(recursive=True):
+            with contextlib.suppress(psutil.Error):
+                total += proc.memory_info().rss
+        return total
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            if self.measure_lag:
+                self.lags.append(max(0.0, loop.time() - expected))
+            self.peak_rss = max(self.peak_rss, self.rss())
+
+    def __enter__(self) -> "Monitor":
+        self.peak_rss = self.rss()
+        self.task = asyncio.ensure_future(self.run())
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.task.cancel()
+
+async def run_scenario(call: Callable[[str, Dict[str, Any]], Awaitable[Any]], scenario: Scenario,
+                       clients: int, requests: int, warmup: int, pid: int, measure_lag: bool,
+                       seed: int) -> Dict[str, Any]:
+    """Exécute un scénario avec clients appelants concurrents et retourne ses statistiques.
+
+    Chaque client a ses propres appels (i = client, client + clients, ...) et son propre générateur
+    aléatoire: la suite de requêtes ne dépend pas de l'ordonnancement et se reproduit à graine égale.
+    """
+    rng = random.Random(seed)
+    for i in range(warmup):
+        await call(scenario.tool, scenario.make_args(-1 - i, rng))
+
+    latencies: List[float] = []
+    errors = 0
+
+    async def client(client_id: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + client_id)
+        for i in range(client_id, requests, clients):
+            args = scenario.make_args(i, rng)
+            started = time.perf_counter()
+            try:
+                result = await call(scenario.tool, args)
+                if result.isError:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    with Monitor(pid, measure_lag) as monitor:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(client_id) for client_id in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": monitor.peak_rss / (1024 ** 2),
+        "loop_lag_p99_ms": percentile(monitor.lags, 99) * 1000 if measure_lag else None,
+        "loop_lag_max_ms": max(monitor.lags, default=0.0) * 1000 if measure_lag else None,
+    }
+
+@contextlib.asynccontextmanager
+async def inprocess_sessions(clients: int):
+    """Sessions MCP en mémoire sur le serveur importé dans ce processus."""
+    import server
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    await server.start_services()
+    if server.docs_index_task is not None:
+        await server.docs_index_task
+    try:
+        async with contextlib.AsyncExitStack() as stack:
+            sessions = [await stack.enter_async_context(create_connected_server_and_client_session(server.server))
+                        for _ in range(clients)]
+            turn = iter(range(sys.maxsize))
+
+            async def call(tool: str, args: Dict[str, Any]) -> Any:
+                return await sessions[next(turn) % len(sessions)].call_tool(tool, args)
+
+            yield call, os.getpid()
+    finally:
+        await server.stop_services()
+
+@contextlib.asynccontextmanager
+async def stdio_session(env: Dict[str, str]):
+    """Un processus serveur lancé comme par un client MCP, piloté via stdio."""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(command=sys.executable, args=[str(ROOT / "server.py")],
+                                   env={**os.environ, **env, "MCP_TRANSPORT": "stdio"}, cwd=str(ROOT))
+    with open(os.devnull, "w") as errlog:
+        async with stdio_client(params, errlog=errlog) as (read_stream, write_stream):
+            async with ClientSession(read_stream, write_stream) as session:
+                await session.initialize()
+                server_pid = None
+                for proc in psutil.Process().children(recursive=True):
+                    with contextlib.suppress(psutil.Error):
+                        if str(ROOT / "server.py") in proc.cmdline():
+                            server_pid = proc.pid
+                # Laisse l'index de la documentation se construire avant les mesures
+                await session.call_tool("search_web", {"query": "nginx", "providers": ["local"]})
+                await asyncio.sleep(1.0)
+                yield session.call_tool, server_pid or os.getpid()
+
+def format_table(mode: str, results: Dict[str, Dict[str, Any]]) -> str:
+    header = f"{'scénario':<26}{'appels':>8}{'erreurs':>9}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'RSS Mo':>9}{'lag p99':>9}"
+    lines = [f"\n== {mode} ==", header, "-" * len(header)]
+    for label, r in results.items():
+        lag = f"{r['loop_lag_p99_ms']:.1f}" if r["loop_lag_p99_ms"] is not None else "n/a"
+        lines.append(f"{label:<26}{r['calls']:>8}{r['errors']:>9}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+                     f"{r['throughput']:>10.1f}{r['peak_rss_mb']:>9.0f}{lag:>9}")
+    return "\n".join(lines)
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Liste les régressions: p99 ou débit au-delà de la tolérance (avec un plancher de bruit de 1 ms)."""
+    regressions = []
+    for mode, scenarios in results.items():
+        for label, current in scenarios.items():
+            reference = baseline.get(mode, {}).get(label)
+            if not reference:
+                regressions.append(f"{mode}/{label}: absent de la référence, enregistrez-la de nouveau")
+                continue
+            if current["p99_ms"] > reference["p99_ms"] * (1 + tolerance) and current["p99_ms"] - reference["p99_ms"] > 1.0:
+                regressions.append(f"{mode}/{label}: p99 {reference['p99_ms']:.2f} -> {current['p99_ms']:.2f} ms")
+            if current["throughput"] < reference["throughput"] * (1 - tolerance):
+                regressions.append(f"{mode}/{label}: débit {reference['throughput']:.1f} -> {current['throughput']:.1f} req/s")
+            if current["errors"] > reference["errors"]:
+                regressions.append(f"{mode}/{label}: erreurs {reference['errors']} -> {current['errors']}")
+    return regressions
+
+async def main(options: argparse.Namespace, env: Dict[str, str]) -> int:
+    if options.compare and not Path(options.compare).exists():
+        # Sans référence, la comparaison ne peut rien détecter: échec explicite plutôt qu'un succès silencieux
+        print(f"Pas de référence {options.compare}: lancez d'abord avec --save-baseline {options.compare}")
+        return 2
+    workdir = Path(options.workdir)
+    print(f"Préparation des fixtures dans {workdir} (log de {options.log_size})...")
+    loop = asyncio.get_running_loop()
+    fx = await loop.run_in_executor(None, prepare_files, workdir, parse_size(options.log_size), options.docs)
+    runner, base_url = await start_http_stub()
+    listeners, ports = await start_listeners(options.listeners)
+    scenarios = [s for s in build_scenarios(fx, base_url, ports)
+                 if not options.only or any(s.label.startswith(prefix) for prefix in options.only)]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    modes = ["inprocess", "stdio"] if options.mode == "both" else [options.mode]
+    try:
+        for mode in modes:
+            opener = inprocess_sessions(options.clients) if mode == "inprocess" else stdio_session(env)
+            results[mode] = {}
+            async with opener as (call, pid):
+                for index, scenario in enumerate(scenarios):
+                    requests = max(options.clients, options.requests // 25) if scenario.heavy else options.requests
+                    results[mode][scenario.label] = await run_scenario(
+                        call, scenario, options.clients, requests, options.warmup, pid,
+                        measure_lag=mode == "inprocess", seed=options.seed + index
+                    )
+                    print(f"  {mode}/{scenario.label}: {results[mode][scenario.label]['p50_ms']:.2f} ms (p50)", flush=True)
+            print(format_table(mode, results[mode]))
+    finally:
+        for listener in listeners:
+            listener.close()
+        await runner.cleanup()
+
+    report = {"meta": {"clients": options.clients, "requests": options.requests, "log_size": fx["log_size"],
+                       "python": sys.version.split()[0], "cpus": os.cpu_count(), "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+              **results}
+    if options.output:
+        Path(options.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if options.save_baseline:
+        Path(options.save_baseline).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nRéférence enregistrée dans {options.save_baseline}")
+    if options.compare:
+        path = Path(options.compare)
+        baseline = json.loads(path.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, options.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} régressions (tolérance {options.tolerance:.0%}):")
+            print("\n".join(f"- {line}" for line in regressions))
+            return 1
+        print(f"\nAucune régression par rapport à {path} (tolérance {options.tolerance:.0%})")
+    return 0
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks des outils du serveur MCP")
+    parser.add_argument("--mode", choices=["inprocess", "stdio", "both"], default="both")
+    parser.add_argument("--clients", type=int, default=8, help="clients simulés concurrents")
+    parser.add_argument("--requests", type=int, default=200, help="appels mesurés par scénario")
+    parser.add_argument("--warmup", type=int, default=3, help="appels de chauffe par scénario")
+    parser.add_argument("--log-size", default="256M", help="taille du log synthétique (ex: 256M, 4G)")
+    parser.add_argument("--docs", type=int, default=200, help="documents du corpus de search_web")
+    parser.add_argument("--listeners", type=int, default=16, help="ports en écoute pour port_scan")
+    parser.add_argument("--only", nargs="*", help="préfixes des scénarios à exécuter (ex: read_file log_analysis.tail)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "mcp-bench"))
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--save-baseline", help="enregistre les résultats comme référence")
+    parser.add_argument("--compare", help="compare à une référence et échoue en cas de régression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="écart toléré par rapport à la référence")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    options = parse_args()
+    workdir = Path(options.workdir)
+    # Configuration commune au serveur en processus et au serveur stdio: état isolé dans workdir
+    env = {
+        "MCP_SEARCH_INDEX_PATH": str(workdir / "search-index.sqlite3"),
+        "MCP_SEARCH_DOCS_DIRS": str(workdir / "docs"),
+        "MCP_SEARCH_PROVIDERS": "local",
+        "MCP_LINE_INDEX_DIR": str(workdir / "line-index"),
+        "MCP_HTTP_SPILL_DIR": str(workdir / "http-bodies"),
+    }
+    # Cache des résultats coupé quel que soit l'environnement; les scénarios cached.* l'activent par appel
+    env.update({f"MCP_TOOL_{tool.upper()}_CACHE_TTL": "0" for tool in CACHED_TOOLS})
+    os.environ.update(env)
+    sys.exit(asyncio.run(main(options, env)))
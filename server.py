@@ -4,22 +4,71 @@ Serveur MCP pour assistance informatique
 Expose plusieurs outils utiles pour le diagnostic et la maintenance système
 """
 
+import ast
 import asyncio
+import bisect
+import bz2
+import codecs
+import concurrent.futures
+import contextlib
+import contextvars
+import cProfile
+import ctypes
+import ctypes.util
+import errno
+import functools
+import glob
+import gzip
+import hashlib
+import heapq
+import html
+import io
+import ipaddress
 import json
 import logging
+import lzma
+import math
+import mmap
+import multiprocessing
 import os
 import platform
-import subprocess
+import pstats
+import random
+import re
+import socket
+import sqlite3
+import stat
 import sys
+import tempfile
+import threading
+import time
+import traceback
+import tracemalloc
+import uuid
+from array import array
+from collections import OrderedDict, deque
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 
 import aiohttp
+import jsonschema
 import psutil
+from aiohttp import web
+import uvicorn
 from mcp import types
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est optionnel: il ne sert qu'au mode batch vectorisé de la calculatrice
+    np = None
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -28,13 +77,946 @@ logger = logging.getLogger("mcp-it-assistant")
 # Initialisation du serveur MCP
 server = Server("it-assistant")
 
+# Paramètres du moteur de scan de ports (surchargeables par variables d'environnement)
+PORT_SCAN_MAX_PORTS = int(os.getenv("MCP_PORT_SCAN_MAX_PORTS", "10000"))
+PORT_SCAN_CONCURRENCY = int(os.getenv("MCP_PORT_SCAN_CONCURRENCY", "256"))
+PORT_SCAN_TIMEOUT = float(os.getenv("MCP_PORT_SCAN_TIMEOUT", "2.0"))
+PORT_SCAN_MIN_TIMEOUT = float(os.getenv("MCP_PORT_SCAN_MIN_TIMEOUT", "0.25"))
+PORT_SCAN_BUDGET = float(os.getenv("MCP_PORT_SCAN_BUDGET", "60"))
+# Ressources locales épuisées (descripteurs, ports éphémères, tampons): la sonde est reprise plus tard
+PORT_SCAN_EXHAUSTED_ERRNOS = (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EADDRNOTAVAIL, errno.EAGAIN)
+PORT_SCAN_MAX_ATTEMPTS = 5
+
+# Paramètres du balayage ping multi-hôtes
+PING_SWEEP_MAX_HOSTS = int(os.getenv("MCP_PING_SWEEP_MAX_HOSTS", "1024"))
+PING_SWEEP_CONCURRENCY = int(os.getenv("MCP_PING_SWEEP_CONCURRENCY", "128"))
+
+# Recherche: fournisseurs interrogés dans l'ordre et index plein texte local (SQLite FTS5)
+SEARCH_PROVIDERS = [name.strip() for name in os.getenv("MCP_SEARCH_PROVIDERS", "local,duckduckgo").split(",") if name.strip()]
+SEARCH_INDEX_PATH = os.getenv("MCP_SEARCH_INDEX_PATH", os.path.join(tempfile.gettempdir(), "mcp-search-index.sqlite3"))
+SEARCH_DOCS_DIRS = [d for d in os.getenv("MCP_SEARCH_DOCS_DIRS", "").split(os.pathsep) if d]
+SEARCH_INDEX_HTTP = os.getenv("MCP_SEARCH_INDEX_HTTP", "1") == "1"
+SEARCH_INDEX_MAX_CHARS = int(os.getenv("MCP_SEARCH_INDEX_MAX_CHARS", "200000"))
+SEARCH_DOC_EXTENSIONS = (".md", ".markdown", ".txt", ".rst", ".adoc", ".html", ".htm")
+SEARCH_INDEXED_TYPES = ("text/html", "text/plain", "text/markdown", "application/xhtml+xml")
+
+# Calculatrice: limites d'évaluation et cache des expressions compilées
+CALC_MAX_EXPRESSION_LENGTH = 2000
+CALC_MAX_EXPONENT = int(os.getenv("MCP_CALC_MAX_EXPONENT", "10000"))
+CALC_MAX_INT_BITS = int(os.getenv("MCP_CALC_MAX_INT_BITS", "4096"))
+CALC_CACHE_SIZE = int(os.getenv("MCP_CALC_CACHE_SIZE", "512"))
+CALC_MAX_BATCH = int(os.getenv("MCP_CALC_MAX_BATCH", "10000"))
+CALC_MAX_OPERATIONS = int(os.getenv("MCP_CALC_MAX_OPERATIONS", "1000000"))
+
+# Échantillonneur de métriques système en arrière-plan
+METRICS_INTERVAL = float(os.getenv("MCP_METRICS_INTERVAL", "5"))
+METRICS_HISTORY = int(os.getenv("MCP_METRICS_HISTORY", "720"))
+
+# Pool de connexions HTTP partagé
+HTTP_POOL_LIMIT = int(os.getenv("MCP_HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("MCP_HTTP_POOL_LIMIT_PER_HOST", "10"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("MCP_HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("MCP_HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# Lecture en flux des corps de réponse HTTP
+HTTP_CHUNK_SIZE = 64 * 1024
+HTTP_MAX_BODY_BYTES = int(os.getenv("MCP_HTTP_MAX_BODY_BYTES", str(1024 * 1024)))
+HTTP_SPILL_DIR = os.getenv("MCP_HTTP_SPILL_DIR", os.path.join(tempfile.gettempdir(), "mcp-http-bodies"))
+HTTP_SPILL_MAX_BYTES = int(os.getenv("MCP_HTTP_SPILL_MAX_BYTES", str(256 * 1024 * 1024)))
+HTTP_SPILL_MAX_FILES = int(os.getenv("MCP_HTTP_SPILL_MAX_FILES", "32"))
+
+# Lecture des fichiers de log volumineux
+LOG_BLOCK_SIZE = 1024 * 1024
+LINE_INDEX_STEP = int(os.getenv("MCP_LINE_INDEX_STEP", "10000"))
+LINE_INDEX_MAX_FILES = int(os.getenv("MCP_LINE_INDEX_MAX_FILES", "64"))
+LINE_INDEX_DIR = os.getenv("MCP_LINE_INDEX_DIR", os.path.join(tempfile.gettempdir(), "mcp-line-index"))
+LINE_INDEX_FINGERPRINT_BYTES = 1024
+
+# Lecture de fichiers par fenêtres (read_file)
+READ_FILE_MAX_WINDOW = int(os.getenv("MCP_READ_FILE_MAX_WINDOW", str(1024 * 1024)))
+READ_FILE_HEX_WINDOW = 4096
+READ_FILE_MAX_HEX_WINDOW = 64 * 1024
+READ_FILE_SNIFF_BYTES = 64 * 1024
+
+# Cache des expressions régulières compilées
+REGEX_CACHE_SIZE = int(os.getenv("MCP_REGEX_CACHE_SIZE", "256"))
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
+# Références arrière numérotées (\1) ou nommées ((?P=nom)), faussées par l'alternance combinée
+BACKREFERENCE_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+# Suivi en continu des fichiers de log
+LOG_FOLLOW_MAX_SECONDS = float(os.getenv("MCP_LOG_FOLLOW_MAX_SECONDS", "300"))
+LOG_FOLLOW_POLL_INTERVAL = float(os.getenv("MCP_LOG_FOLLOW_POLL_INTERVAL", "1.0"))
+LOG_FOLLOW_INOTIFY = os.getenv("MCP_LOG_FOLLOW_INOTIFY", "1") == "1"
+LOG_FOLLOW_MAX_SUBSCRIPTIONS = int(os.getenv("MCP_LOG_FOLLOW_MAX_SUBSCRIPTIONS", "64"))
+LOG_FOLLOW_READ_LIMIT = 8 * 1024 * 1024
+
+# Recherche multi-fichiers (répertoires, globs, archives compressées)
+LOG_SEARCH_WORKERS = int(os.getenv("MCP_LOG_SEARCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+LOG_SEARCH_MAX_FILES = int(os.getenv("MCP_LOG_SEARCH_MAX_FILES", "500"))
+LOG_SEARCH_BUDGET = float(os.getenv("MCP_LOG_SEARCH_BUDGET", "30"))
+# Au-delà, une « ligne » (fichier sans sauts de ligne) est tronquée plutôt que chargée entière en mémoire
+LOG_MAX_LINE_BYTES = int(os.getenv("MCP_LOG_MAX_LINE_BYTES", str(64 * 1024)))
+
+# Agrégation des logs (histogrammes et modèles de messages)
+LOG_AGGREGATE_CAPACITY_FACTOR = 20
+LOG_AGGREGATE_SHOWN_BUCKETS = 60
+
+# Transport Streamable HTTP (MCP_TRANSPORT=http)
+HTTP_HOST = os.getenv("MCP_HTTP_HOST", "0.0.0.0")
+HTTP_PORT = int(os.getenv("MCP_HTTP_PORT", "8000"))
+HTTP_PATH = os.getenv("MCP_HTTP_PATH", "/mcp")
+HTTP_WORKERS = int(os.getenv("MCP_HTTP_WORKERS", "1"))
+# Sans affinité possible entre processus d'un même conteneur, plusieurs workers imposent le mode sans état
+HTTP_STATELESS = os.getenv("MCP_HTTP_STATELESS", "1" if HTTP_WORKERS > 1 else "0") == "1"
+# Plusieurs workers sur un même socket: l'appel suivant peut arriver sur un autre processus, qui ne
+# connaît pas l'état gardé en mémoire (body_id, subscription_id, page_cursor)
+HTTP_SHARED_SOCKET = os.getenv("MCP_TRANSPORT", "stdio") == "http" and HTTP_WORKERS > 1
+HTTP_DRAIN_TIMEOUT = float(os.getenv("MCP_HTTP_DRAIN_TIMEOUT", "30"))
+
+# Répartition des appels d'outils (surchargeable par outil: MCP_TOOL_<NOM>_TIMEOUT / _CONCURRENCY)
+IO_POOL_WORKERS = int(os.getenv("MCP_IO_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+TOOL_DEFAULT_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", "120"))
+TOOL_DEFAULT_CONCURRENCY = int(os.getenv("MCP_TOOL_CONCURRENCY", "32"))
+
+# Cache des résultats d'outils idempotents (TTL par outil: MCP_TOOL_<NOM>_CACHE_TTL, 0 pour désactiver)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("MCP_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_ENTRY_OVERHEAD = 256
+
+# Résultats JSON (format="json"): budget d'octets par réponse et suites de listes tronquées
+RESPONSE_MAX_BYTES = int(os.getenv("MCP_RESPONSE_MAX_BYTES", "32768"))
+RESPONSE_PAGES = int(os.getenv("MCP_RESPONSE_PAGES", "64"))
+RESPONSE_PAGE_TTL = float(os.getenv("MCP_RESPONSE_PAGE_TTL", "600"))
+RESPONSE_TRAILER_RESERVE = 256  # place gardée pour "more" et "page_cursor"
+
+# Outil batch: plusieurs appels d'outils exécutés en parallèle dans une seule requête
+BATCH_MAX_CALLS = int(os.getenv("MCP_BATCH_MAX_CALLS", "32"))
+BATCH_DEADLINE = float(os.getenv("MCP_BATCH_DEADLINE", "60"))
+
+# Instrumentation: histogrammes de latence, latence de la boucle asyncio, profilage échantillonné
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOOP_LAG_INTERVAL = float(os.getenv("MCP_LOOP_LAG_INTERVAL", "0.1"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("MCP_LOOP_BLOCK_THRESHOLD", "0.5"))
+PROFILE_SAMPLE_RATE = float(os.getenv("MCP_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DEFAULT_RATE = 0.05
+PROFILE_TOP = 20
+TRACEMALLOC_FRAMES = int(os.getenv("MCP_TRACEMALLOC_FRAMES", "1"))
+METRICS_HOST = os.getenv("MCP_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("MCP_METRICS_PORT", "0"))
+
+async def report_progress(progress: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+    """Envoie une notification de progression MCP si le client en a fourni le jeton."""
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return
+    token = ctx.meta.progressToken if ctx.meta else None
+    if token is None:
+        return
+    try:
+        await ctx.session.send_progress_notification(token, progress, total, message=message)
+    except Exception as e:
+        logger.debug(f"Notification de progression impossible: {e}")
+
+io_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+process_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+def get_io_pool() -> concurrent.futures.ThreadPoolExecutor:
+    """Pool de threads partagé pour les E/S bloquantes, créé à la demande."""
+    global io_pool
+    if io_pool is None:
+        io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="mcp-io")
+    return io_pool
+
+def get_process_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """Pool de processus partagé (recherche multi-fichiers, outils CPU), créé à la demande."""
+    global process_pool
+    if process_pool is None:
+        process_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=LOG_SEARCH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return process_pool
+
+async def run_io(func: Any, *args: Any) -> Any:
+    """Exécute une fonction bloquante dans le pool d'E/S en conservant le contexte de la requête."""
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), functools.partial(ctx.run, func, *args))
+
+def result_size(result: List[Any]) -> int:
+    """Taille approximative d'un résultat d'outil en mémoire, pour le budget du cache."""
+    return RESULT_CACHE_ENTRY_OVERHEAD + sum(
+        len(JSON_ENCODER.encode(item["json"])) if isinstance(item, dict) else len(getattr(item, "text", ""))
+        for item in result)
+
+class ResultCache:
+    """Cache LRU des résultats d'outils, borné en octets, avec TTL et fusion des appels identiques.
+
+    Un appel identique à un appel en cours attend le même résultat au lieu de relancer l'outil.
+    Les exceptions ne sont pas mises en cache.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Any, Tuple[float, int, List[Any]]]" = OrderedDict()
+        self.pending: Dict[Any, "asyncio.Future[List[Any]]"] = {}
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key: Any) -> Optional[List[types.TextContent]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, size, result = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            self.bytes -= size
+            return None
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key: Any, ttl: float, result: List[Any]) -> None:
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous[1]
+        self.entries[key] = (time.monotonic() + ttl, size, result)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    async def fetch(self, key: Any, ttl: float, spec: "ToolSpec", args: Dict[str, Any]) -> List[Any]:
+        """Retourne le résultat en cache, attend l'appel identique en cours, ou exécute l'outil."""
+        result = self.get(key)
+        if result is not None:
+            spec.cache_hits += 1
+            return result
+        task = self.pending.get(key)
+        if task is not None:
+            spec.coalesced += 1
+        else:
+            spec.cache_misses += 1
+            task = asyncio.ensure_future(self._fill(key, ttl, spec, args))
+            self.pending[key] = task
+        # shield: l'annulation d'un appelant n'interrompt pas l'exécution partagée
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: Any, ttl: float, spec: "ToolSpec", args: Dict[str, Any]) -> List[Any]:
+        try:
+            result = await spec.execute(args)
+            # Un échec (hôte injoignable, fichier absent...) n'est pas resservi pendant le TTL
+            if not reported_error(result):
+                self.put(key, ttl, result)
+            return result
+        finally:
+            del self.pending[key]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES)
+
+class ToolError(types.TextContent):
+    """Message d'échec d'un outil: le type porte l'erreur, le texte n'est jamais interprété."""
+
+def tool_error(text: str) -> List[types.TextContent]:
+    """Résultat d'un gestionnaire qui intercepte son échec (hôte injoignable, fichier absent, délai...)."""
+    return [ToolError(type="text", text=text)]
+
+def reported_error(result: List[Any]) -> bool:
+    """Vrai si le gestionnaire a signalé un échec avec tool_error (jamais mis en cache, compté en erreur)."""
+    return any(isinstance(item, ToolError) for item in result)
+
+def require_process_state(feature: str) -> None:
+    """Refuse une fonction dont la suite dépend d'un état propre au processus (voir HTTP_SHARED_SOCKET)."""
+    if HTTP_SHARED_SOCKET:
+        raise ValueError(f"{feature} indisponible avec MCP_HTTP_WORKERS={HTTP_WORKERS}: l'état reste propre à chaque "
+                         "worker; déployez un worker par conteneur derrière l'upstream nginx")
+
+def utf8_len(text: str) -> int:
+    """Taille en octets UTF-8 d'un texte, sans l'encoder s'il est ASCII."""
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+
+def json_result(data: Dict[str, Any], paged: Tuple[str, ...] = ()) -> List[Any]:
+    """Résultat structuré d'un outil appelé avec format="json".
+
+    ToolSpec le sérialise dans le processus serveur (y compris au retour du pool de processus,
+    d'où des types natifs uniquement); les listes nommées dans paged sont tronquées au budget
+    d'octets et leur suite est servie par result_page.
+    """
+    return [{"json": data, "paged": paged}]
+
+class PageStore:
+    """Listes complètes des résultats JSON tronqués, relues par curseur (LRU borné, avec TTL)."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[float, Dict[str, List[Any]]]]" = OrderedDict()
+
+    def put(self, lists: Dict[str, List[Any]]) -> str:
+        page_id = uuid.uuid4().hex[:12]
+        self.entries[page_id] = (time.monotonic() + self.ttl, lists)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return page_id
+
+    def get(self, page_id: str) -> Dict[str, List[Any]]:
+        entry = self.entries.get(page_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(page_id, None)
+            raise KeyError(f"Résultat inconnu ou expiré: {page_id}")
+        self.entries.move_to_end(page_id)
+        return entry[1]
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+page_store = PageStore(RESPONSE_PAGES, RESPONSE_PAGE_TTL)
+
+TRUNCATION_MARKER = "…[tronqué]"
+
+def clip_string(text: str, limit: int) -> str:
+    """Plus long préfixe de text, suivi du marqueur, dont la sérialisation JSON tient dans limit octets."""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if utf8_len(JSON_ENCODER.encode(text[:middle] + TRUNCATION_MARKER)) <= limit:
+            low = middle
+        else:
+            high = middle - 1
+    clipped = text[:low] + TRUNCATION_MARKER
+    return clipped if utf8_len(JSON_ENCODER.encode(clipped)) <= limit else ""
+
+def fit_json(value: Any, limit: int) -> Any:
+    """Réduit value pour que sa sérialisation tienne dans limit octets.
+
+    Les chaînes sont coupées (avec TRUNCATION_MARKER), les objets et listes gardent leurs premiers
+    éléments, réduits à leur tour; les autres valeurs qui ne tiennent pas deviennent null.
+    """
+    if utf8_len(JSON_ENCODER.encode(value)) <= limit:
+        return value
+    if isinstance(value, str):
+        return clip_string(value, limit)
+    if isinstance(value, (dict, list, tuple)):
+        is_dict = isinstance(value, dict)
+        fitted: Any = {} if is_dict else []
+        size = 2
+        for key, item in (value.items() if is_dict else enumerate(value)):
+            overhead = (utf8_len(JSON_ENCODER.encode(key)) + 1 if is_dict else 0) + (1 if fitted else 0)
+            room = limit - size - overhead
+            item_size = utf8_len(JSON_ENCODER.encode(item))
+            if item_size > room:
+                if room < len(TRUNCATION_MARKER) + 4:
+                    break
+                item = fit_json(item, room)
+                item_size = utf8_len(JSON_ENCODER.encode(item))
+            if is_dict:
+                fitted[key] = item
+            else:
+                fitted.append(item)
+            size += overhead + item_size
+        return fitted
+    return None
+
+def share_budget(sizes: Dict[str, int], available: int) -> Dict[str, int]:
+    """Répartit available octets entre des champs: les plus petits d'abord, chacun au plus sa part égale du reste."""
+    limits = {}
+    pending = sorted(sizes, key=sizes.get)
+    for i, key in enumerate(pending):
+        limits[key] = min(sizes[key], max(0, available) // (len(pending) - i))
+        available -= limits[key]
+    return limits
+
+def render_json(data: Dict[str, Any], paged: Tuple[str, ...] = (), budget: int = RESPONSE_MAX_BYTES,
+                page_id: Optional[str] = None, starts: Optional[Dict[str, int]] = None) -> types.TextContent:
+    """Sérialise un résultat en JSON compact, champ par champ et élément par élément, sous budget octets.
+
+    Les fragments sont accumulés puis joints une seule fois. Une liste paginée s'arrête quand le
+    budget est atteint (au moins un élément par réponse pour garantir la progression); les positions
+    d'arrêt forment le curseur de result_page. Les champs non paginés qui tiennent restent entiers; les
+    plus grands se partagent la place restante (share_budget) et sont réduits par fit_json, comme un
+    premier élément de liste trop grand, avec leur nom dans "clipped". Un quart du budget reste
+    réservé aux listes paginées.
+    """
+    starts = starts or {}
+    parts = ["{"]
+    size = 1
+    positions: Dict[str, int] = {}
+    clipped: List[str] = []
+    progressed = False
+    reserved = budget // 4 if any(data.get(key) for key in paged) else 0
+    encoded = {key: JSON_ENCODER.encode(value) for key, value in data.items() if key not in paged}
+    limits = share_budget({key: utf8_len(JSON_ENCODER.encode(key)) + 2 + utf8_len(text) for key, text in encoded.items()},
+                          budget - 2 - RESPONSE_TRAILER_RESERVE - reserved)
+    for key, value in data.items():
+        prefix = ("," if len(parts) > 1 else "") + JSON_ENCODER.encode(key) + ":"
+        if key not in paged:
+            chunk = prefix + encoded[key]
+            if utf8_len(chunk) > limits[key]:
+                chunk = prefix + JSON_ENCODER.encode(fit_json(value, limits[key] - utf8_len(prefix)))
+                clipped.append(key)
+            parts.append(chunk)
+            size += utf8_len(chunk)
+            continue
+        parts.append(prefix + "[")
+        size += utf8_len(prefix) + 1
+        position = starts.get(key, 0)
+        first = True
+        while position < len(value):
+            chunk = ("" if first else ",") + JSON_ENCODER.encode(value[position])
+            chunk_size = utf8_len(chunk)
+            if size + chunk_size + RESPONSE_TRAILER_RESERVE > budget:
+                if progressed:
+                    break
+                # Premier élément plus grand que le budget: réduit plutôt que dépassé
+                chunk = ("" if first else ",") + JSON_ENCODER.encode(
+                    fit_json(value[position], budget - size - RESPONSE_TRAILER_RESERVE - 1))
+                chunk_size = utf8_len(chunk)
+                clipped.append(key)
+            parts.append(chunk)
+            size += chunk_size
+            position += 1
+            first = False
+            progressed = True
+        parts.append("]")
+        size += 1
+        positions[key] = position
+
+    remaining = {key: len(data[key]) - position for key, position in positions.items()}
+    if clipped:
+        parts.append(',"clipped":' + JSON_ENCODER.encode(clipped))
+    if any(remaining.values()):
+        parts.append(',"more":' + JSON_ENCODER.encode({key: n for key, n in remaining.items() if n}))
+    if any(remaining.values()) and not HTTP_SHARED_SOCKET:
+        if page_id is None:
+            page_id = page_store.put({key: data[key] for key in positions})
+        parts.append(',"page_cursor":' + JSON_ENCODER.encode(f"{page_id}:{'.'.join(map(str, positions.values()))}"))
+    parts.append("}")
+    return types.TextContent(type="text", text="".join(parts))
+
+class Histogram:
+    """Histogramme à seaux fixes (bornes supérieures inclusives, comme Prometheus), O(log n) par observation."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # dernier seau: +Inf
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Quantile estimé par interpolation linéaire dans le seau qui le contient."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    return self.max
+                return min(self.max, lower + (self.buckets[i] - lower) * (rank - cumulative) / n)
+            cumulative += n
+        return self.max
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Comptes cumulés par borne supérieure, pour l'export Prometheus."""
+        result = []
+        total = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+class LoopMonitor:
+    """Mesure la latence de la boucle asyncio et repère les appels bloquants.
+
+    Une tâche dort LOOP_LAG_INTERVAL et mesure son retard au réveil. Un thread de surveillance
+    relève la pile du thread de la boucle quand celle-ci ne répond plus depuis LOOP_BLOCK_THRESHOLD,
+    ce qui désigne directement l'appel fautif (ex: psutil.cpu_percent(interval=1)).
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = Histogram(LOOP_LAG_BUCKETS)
+        self.blocked = 0
+        self.recent_blocks: deque = deque(maxlen=5)
+        self.heartbeat = time.monotonic()
+        self.loop_thread: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stopping = threading.Event()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            self.heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag.observe(max(0.0, loop.time() - expected))
+
+    def watch(self, stopping: threading.Event) -> None:
+        reported = None
+        while not stopping.wait(self.interval):
+            heartbeat = self.heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported:
+                continue
+            # Un seul signalement par blocage
+            reported = heartbeat
+            frame = sys._current_frames().get(self.loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=8)) if frame is not None else "pile indisponible\n"
+            self.blocked += 1
+            self.recent_blocks.append((time.time(), stalled, stack))
+            logger.warning(f"Boucle asyncio bloquée depuis {stalled:.2f} s:\n{stack}")
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.loop_thread = threading.get_ident()
+            self.heartbeat = time.monotonic()
+            self.task = asyncio.create_task(self.run())
+            self.stopping = threading.Event()
+            threading.Thread(target=self.watch, args=(self.stopping,), name="mcp-loop-watchdog", daemon=True).start()
+
+    async def stop(self) -> None:
+        self.stopping.set()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+loop_monitor = LoopMonitor()
+
+class SampledProfiler:
+    """Profilage cProfile d'une fraction des appels d'outils, activable à chaud.
+
+    Un seul appel est profilé à la fois; pour un outil async, le profil couvre aussi les autres
+    coroutines exécutées par la boucle pendant l'appel. Les outils CPU (autre processus) ne sont pas profilés.
+    """
+
+    def __init__(self, rate: float = PROFILE_SAMPLE_RATE):
+        self.rate = rate
+        self.busy = threading.Lock()  # tenu pendant l'appel profilé, éventuellement à travers des await
+        self.lock = threading.Lock()  # protège stats, jamais tenu à travers un await
+        self.stats: Optional[pstats.Stats] = None
+        self.sampled = 0
+        self.started = time.time() if rate > 0 else None
+
+    def start(self, rate: float) -> None:
+        with self.lock:
+            self.rate = rate
+            self.stats = None
+            self.sampled = 0
+            self.started = time.time()
+
+    def stop(self) -> None:
+        with self.lock:
+            self.rate = 0.0
+            self.stats = None
+            self.started = None
+
+    @contextlib.contextmanager
+    def sample(self) -> Any:
+        if self.rate <= 0 or random.random() >= self.rate or not self.busy.acquire(blocking=False):
+            yield
+            return
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # un autre profileur est déjà actif
+                yield
+                return
+            try:
+                yield
+            finally:
+                profile.disable()
+                with self.lock:
+                    if self.stats is None:
+                        self.stats = pstats.Stats(profile)
+                    else:
+                        self.stats.add(profile)
+                    self.sampled += 1
+        finally:
+            self.busy.release()
+
+    def call(self, func: Any, *args: Any) -> Any:
+        """Exécute func(*args), éventuellement sous profilage (depuis le pool d'E/S)."""
+        with self.sample():
+            return func(*args)
+
+    def report(self, top: int) -> str:
+        with self.lock:
+            if self.stats is None:
+                return "aucun appel échantillonné pour l'instant\n"
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats("cumulative").print_stats(top)
+            return out.getvalue().strip("\n") + "\n"
+
+profiler = SampledProfiler()
+
+class AllocationTracker:
+    """Suivi des allocations avec tracemalloc, activable à chaud: croissance par ligne depuis l'activation."""
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.baseline = tracemalloc.take_snapshot()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.baseline = None
+
+    def report(self, top: int) -> str:
+        """Principales lignes allouantes (coûteux: à exécuter dans le pool d'E/S)."""
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        stats = snapshot.compare_to(self.baseline, "lineno") if self.baseline else snapshot.statistics("lineno")
+        lines = [f"Mémoire tracée: {current / (1024**2):.1f} MB (pic {peak / (1024**2):.1f} MB)"]
+        lines += [f"- {stat}" for stat in stats[:top]]
+        return "\n".join(lines) + "\n"
+
+allocations = AllocationTracker()
+
+class ToolSpec:
+    """Outil enregistré: gestionnaire, mode d'exécution et limites.
+
+    Modes: "async" (coroutine sur la boucle), "io" (fonction bloquante dans le pool de threads),
+    "cpu" (fonction de niveau module dans le pool de processus).
+    """
+
+    KINDS = ("async", "io", "cpu")
+
+    def __init__(self, name: str, handler: Any, kind: str, concurrency: int, timeout: float,
+                 cache_ttl: float = 0.0, cache_key: Any = None, opt_in_ttl: float = 0.0):
+        if kind not in self.KINDS:
+            raise ValueError(f"Mode d'exécution inconnu pour {name}: {kind}")
+        self.name = name
+        self.handler = handler
+        self.kind = kind
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl      # TTL appliqué à tous les appels (0: cache seulement sur demande)
+        self.opt_in_ttl = opt_in_ttl    # TTL d'un appel avec cache=true
+        self.cache_key = cache_key
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.calls = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.errors: Dict[str, int] = {}
+        self.result_bytes = 0
+
+    async def __call__(self, args: Dict[str, Any]) -> List[types.TextContent]:
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            result = await self.dispatch(args)
+        except BaseException as e:
+            self.count_error(type(e).__name__)
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - started)
+        for item in result:
+            self.result_bytes += utf8_len(getattr(item, "text", ""))
+        if reported_error(result):
+            self.count_error("ReportedError")
+        return result
+
+    @property
+    def cacheable(self) -> bool:
+        return self.cache_ttl > 0 or self.opt_in_ttl > 0
+
+    def ttl_for(self, args: Dict[str, Any]) -> float:
+        """TTL de cache d'un appel: cache=false l'exclut, cache=true l'active avec le TTL de l'outil."""
+        requested = args.get("cache")
+        if requested is False:
+            return 0.0
+        if requested:
+            return self.cache_ttl or self.opt_in_ttl
+        return self.cache_ttl
+
+    def count_error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    async def dispatch(self, args: Dict[str, Any]) -> List[types.TextContent]:
+        ttl = self.ttl_for(args)
+        key = await self.result_key(args) if ttl > 0 else None
+        if key is not None:
+            # Le cache garde le résultat structuré: chaque réponse est rendue à part, avec son propre page_cursor
+            result = await result_cache.fetch(key, ttl, self, args)
+        else:
+            result = await self.execute(args)
+        return self.finish(args, result)
+
+    async def result_key(self, args: Dict[str, Any]) -> Any:
+        """Clé de cache: arguments normalisés et, si l'outil en fournit, l'état des fichiers lus (None: pas de cache)."""
+        state = ()
+        if self.cache_key is not None:
+            # Les fonctions de clé peuvent faire des stat/glob: elles passent par le pool d'E/S
+            state = await run_io(self.cache_key, args)
+            if state is None:
+                return None
+        normalized = {name: value for name, value in args.items() if name != "cache"}
+        return (self.name, json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str), state)
+
+    async def execute(self, args: Dict[str, Any]) -> List[Any]:
+        try:
+            # Le délai couvre aussi l'attente d'une place libre
+            result = await asyncio.wait_for(self.run(args), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"Délai de {self.timeout:g} s dépassé pour {self.name}") from None
+        return result
+
+    def finish(self, args: Dict[str, Any], result: List[Any]) -> List[types.TextContent]:
+        """Sérialise les résultats structurés (json_result); en format JSON, un message d'erreur devient {"error": ...}."""
+        as_json = args.get("format") == "json"
+        finished = []
+        for item in result:
+            if isinstance(item, dict):
+                item = render_json(item["json"], tuple(item["paged"]))
+            elif as_json and not item.text.startswith("{"):
+                item = type(item)(type="text", text=JSON_ENCODER.encode({"error": item.text}))
+            finished.append(item)
+        return finished
+
+    async def run(self, args: Dict[str, Any]) -> List[types.TextContent]:
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            if self.kind == "async":
+                with profiler.sample():
+                    return await self.handler(args)
+            if self.kind == "io":
+                return await run_io(profiler.call, self.handler, args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(get_process_pool(), self.handler, args)
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+tool_registry: Dict[str, ToolSpec] = {}
+
+def register_tool(name: str, kind: str = "async", concurrency: Optional[int] = None,
+                  timeout: Optional[float] = None, cache_ttl: float = 0.0, cache_key: Any = None) -> Any:
+    """Enregistre le gestionnaire d'un outil dans le registre de call_tool.
+
+    cache_ttl > 0 rend l'outil cachable: le cache s'applique aux appels avec cache=true, ou à tous
+    si MCP_TOOL_<NOM>_CACHE_TTL est défini. cache_key(args) retourne l'état complémentaire de la
+    clé (ex: mtime et taille des fichiers lus), ou None pour ne pas mettre l'appel en cache.
+    """
+    prefix = f"MCP_TOOL_{name.upper()}"
+    def decorator(handler: Any) -> Any:
+        tool_registry[name] = ToolSpec(
+            name, handler, kind,
+            int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency or TOOL_DEFAULT_CONCURRENCY))),
+            float(os.getenv(f"{prefix}_TIMEOUT", str(timeout or TOOL_DEFAULT_TIMEOUT))),
+            float(os.getenv(f"{prefix}_CACHE_TTL", "0")),
+            cache_key,
+            cache_ttl
+        )
+        return handler
+    return decorator
+
+def file_state(path: str) -> Optional[Tuple[int, int, int]]:
+    """Identité et version d'un fichier (inode, taille, mtime) pour les clés de cache; None s'il est absent."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+class HttpPool:
+    """Session aiohttp partagée (keep-alive, cache DNS) pour toute la durée de vie du serveur."""
+
+    def __init__(self):
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    async def start(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_end.append(self._on_connection_create)
+            trace.on_connection_reuseconn.append(self._on_connection_reuse)
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                use_dns_cache=True,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+            )
+            # Session partagée par tous les clients MCP: sans jar, un cookie reçu par l'un serait renvoyé aux autres
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=[trace],
+                                                 cookie_jar=aiohttp.DummyCookieJar())
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _on_request_start(self, session, ctx, params) -> None:
+        self.requests += 1
+
+    async def _on_connection_create(self, session, ctx, params) -> None:
+        self.new_connections += 1
+
+    async def _on_connection_reuse(self, session, ctx, params) -> None:
+        self.reused_connections += 1
+
+    def stats(self) -> Dict[str, Any]:
+        idle = acquired = 0
+        if self.session is not None and not self.session.closed:
+            connector = self.session.connector
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            acquired = len(getattr(connector, "_acquired", ()))
+        connections = self.new_connections + self.reused_connections
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_ratio": self.reused_connections / connections if connections else 0.0,
+            "open_sockets": idle + acquired,
+            "idle_sockets": idle,
+        }
+
+http_pool = HttpPool()
+
+class BodyStore:
+    """Corps de réponse HTTP enregistrés sur disque, relisibles ensuite par offset."""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def create(self, url: str, charset: str) -> Tuple[str, Path]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        body_id = uuid.uuid4().hex[:16]
+        path = self.directory / f"{body_id}.body"
+        self.entries[body_id] = {"path": path, "url": url, "charset": charset, "size": 0}
+        while len(self.entries) > self.max_files:
+            _, evicted = self.entries.popitem(last=False)
+            evicted["path"].unlink(missing_ok=True)
+        return body_id, path
+
+    def get(self, body_id: str) -> Dict[str, Any]:
+        entry = self.entries.get(body_id)
+        if entry is None or not entry["path"].exists():
+            raise KeyError(f"Corps HTTP inconnu ou expiré: {body_id}")
+        return entry
+
+    def clear(self) -> None:
+        for entry in self.entries.values():
+            entry["path"].unlink(missing_ok=True)
+        self.entries.clear()
+
+body_store = BodyStore(HTTP_SPILL_DIR, HTTP_SPILL_MAX_FILES)
+
+async def read_body(response: aiohttp.ClientResponse, max_bytes: int, preview_chars: int,
+                    hash_name: Optional[str] = None, spill_path: Optional[Path] = None) -> Dict[str, Any]:
+    """Lit le corps par blocs jusqu'à max_bytes, en ne décodant que l'aperçu demandé."""
+    try:
+        decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    hasher = hashlib.new(hash_name) if hash_name else None
+    preview: List[str] = []
+    preview_len = 0
+    size = 0
+    truncated = False
+    spill = open(spill_path, "wb") if spill_path else None
+    try:
+        async for chunk in response.content.iter_chunked(HTTP_CHUNK_SIZE):
+            if size + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - size]
+                truncated = True
+            size += len(chunk)
+            if hasher:
+                hasher.update(chunk)
+            if spill:
+                spill.write(chunk)
+            if preview_len < preview_chars:
+                text = decoder.decode(chunk)
+                preview.append(text)
+                preview_len += len(text)
+            if truncated:
+                break
+    finally:
+        if spill:
+            spill.close()
+    if truncated:
+        # Ferme la connexion plutôt que de télécharger le reste du corps
+        response.close()
+    elif preview_len < preview_chars:
+        preview.append(decoder.decode(b"", final=True))
+    return {
+        "preview": "".join(preview)[:preview_chars],
+        "size": size,
+        "truncated": truncated,
+        "digest": hasher.hexdigest() if hasher else None,
+    }
+
+RESPONSE_FORMAT_PROPERTY = {
+    "type": "string",
+    "enum": ["text", "json"],
+    "description": (f"text: compte rendu lisible; json: résultat structuré compact, limité à {RESPONSE_MAX_BYTES} octets "
+                    "(listes tronquées reprises avec result_page et page_cursor) (défaut: text)"),
+    "default": "text"
+}
+
+RESULT_CACHE_PROPERTY = {
+    "type": "boolean",
+    "description": ("true: accepte un résultat identique récent (cache, TTL propre à l'outil); "
+                    "false: ignore le cache activé par MCP_TOOL_<OUTIL>_CACHE_TTL (défaut: selon la configuration)")
+}
+
 @server.list_tools()
 async def list_tools() -> List[types.Tool]:
     """Liste tous les outils disponibles."""
-    return [
+    tools = [
         types.Tool(
             name="search_web",
-            description="Recherche d'informations sur le web",
+            description="Recherche d'informations: index local des pages et documents consultés (BM25), puis le web",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -46,6 +1028,11 @@ async def list_tools() -> List[types.Tool]:
                         "type": "integer",
                         "description": "Nombre maximum de résultats (défaut: 5)",
                         "default": 5
+                    },
+                    "providers": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": ["local", "duckduckgo"]},
+                        "description": f"Fournisseurs à interroger, dans l'ordre (défaut: {', '.join(SEARCH_PROVIDERS)})"
                     }
                 },
                 "required": ["query"]
@@ -59,7 +1046,16 @@ async def list_tools() -> List[types.Tool]:
                 "properties": {
                     "expression": {
                         "type": "string",
-                        "description": "Expression mathématique à évaluer (ex: 2+2, sqrt(16), sin(3.14159/2))"
+                        "description": "Expression mathématique à évaluer (ex: 2+2, sqrt(16), sin(3.14159/2), 2^10); peut utiliser des variables"
+                    },
+                    "variables": {
+                        "type": "object",
+                        "description": "Valeurs des variables de l'expression (ex: {\"x\": 3})"
+                    },
+                    "batch": {
+                        "type": "array",
+                        "items": {"type": "object"},
+                        "description": f"Évalue l'expression pour chaque jeu de variables (max: {CALC_MAX_BATCH}), vectorisé avec NumPy si disponible"
                     }
                 },
                 "required": ["expression"]
@@ -75,6 +1071,21 @@ async def list_tools() -> List[types.Tool]:
                         "type": "string",
                         "enum": ["general", "cpu", "memory", "disk", "network", "processes"],
                         "description": "Type d'information système à récupérer"
+                    },
+                    "window_minutes": {
+                        "type": "number",
+                        "description": "Ajoute min/moy/max/p95 sur les N dernières minutes (historique échantillonné en arrière-plan)"
+                    },
+                    "sort_by": {
+                        "type": "string",
+                        "enum": ["cpu", "memory", "io", "fds"],
+                        "description": "Processus: critère de classement (défaut: cpu)",
+                        "default": "cpu"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Processus: nombre de processus affichés (défaut: 10)",
+                        "default": 10
                     }
                 },
                 "required": ["info_type"]
@@ -88,20 +1099,41 @@ async def list_tools() -> List[types.Tool]:
                 "properties": {
                     "host": {
                         "type": "string",
-                        "description": "Adresse IP ou nom d'hôte à pinger"
+                        "description": "Adresse IP, nom d'hôte, liste séparée par des virgules ou réseau CIDR (ex: 192.168.1.0/24)"
+                    },
+                    "hosts": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Liste d'hôtes ou de réseaux CIDR à balayer"
                     },
                     "count": {
                         "type": "integer",
                         "description": "Nombre de pings à envoyer (défaut: 4)",
                         "default": 4
+                    },
+                    "method": {
+                        "type": "string",
+                        "enum": ["icmp", "tcp"],
+                        "description": "Sonde ICMP (commande ping) ou connexion TCP (défaut: icmp)",
+                        "default": "icmp"
+                    },
+                    "port": {
+                        "type": "integer",
+                        "description": "Port utilisé par la sonde TCP (défaut: 80)",
+                        "default": 80
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": "Timeout par sonde en secondes (défaut: 1)",
+                        "default": 1
                     }
                 },
-                "required": ["host"]
+                "anyOf": [{"required": ["host"]}, {"required": ["hosts"]}]
             }
         ),
         types.Tool(
             name="read_file",
-            description="Lit le contenu d'un fichier texte",
+            description="Lit un fichier par fenêtres (octets, lignes, fin de fichier), en texte ou en hexadécimal",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -111,8 +1143,37 @@ async def list_tools() -> List[types.Tool]:
                     },
                     "encoding": {
                         "type": "string",
-                        "description": "Encodage du fichier (défaut: utf-8)",
-                        "default": "utf-8"
+                        "description": "Encodage du fichier; auto détecte BOM, UTF-8, UTF-16 et fichiers binaires (défaut: auto)",
+                        "default": "auto"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Position de départ en octets (défaut: 0)"
+                    },
+                    "length": {
+                        "type": "integer",
+                        "description": f"Taille de la fenêtre en octets (défaut et max: {READ_FILE_MAX_WINDOW} en texte, {READ_FILE_HEX_WINDOW} en hexadécimal)"
+                    },
+                    "tail": {
+                        "type": "boolean",
+                        "description": "Lit les length derniers octets du fichier"
+                    },
+                    "start_line": {
+                        "type": "integer",
+                        "description": "Première ligne à lire (1 = première ligne du fichier)"
+                    },
+                    "end_line": {
+                        "type": "integer",
+                        "description": "Dernière ligne à lire (incluse, avec start_line)"
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "Jeton de continuation renvoyé par un appel précédent"
+                    },
+                    "view": {
+                        "type": "string",
+                        "description": "Affichage: text ou hex (défaut: hex pour les fichiers binaires, text sinon)",
+                        "enum": ["text", "hex"]
                     }
                 },
                 "required": ["file_path"]
@@ -141,11 +1202,59 @@ async def list_tools() -> List[types.Tool]:
                     "data": {
                         "type": "string",
                         "description": "Corps de la requête (pour POST/PUT)"
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "description": f"Nombre maximum d'octets du corps à lire (défaut: {HTTP_MAX_BODY_BYTES}, ou {HTTP_SPILL_MAX_BYTES} avec spill)"
+                    },
+                    "preview_chars": {
+                        "type": "integer",
+                        "description": "Nombre de caractères du corps à afficher (défaut: 1000)",
+                        "default": 1000
+                    },
+                    "hash": {
+                        "type": "string",
+                        "enum": ["md5", "sha1", "sha256", "sha512"],
+                        "description": "Calcule l'empreinte des octets lus"
+                    },
+                    "spill": {
+                        "type": "boolean",
+                        "description": "Enregistre le corps sur disque pour le relire ensuite avec http_body",
+                        "default": False
+                    },
+                    "index": {
+                        "type": "boolean",
+                        "description": "Ajoute la page (GET, HTML ou texte) à l'index local de search_web",
+                        "default": SEARCH_INDEX_HTTP
                     }
                 },
                 "required": ["url"]
             }
         ),
+        types.Tool(
+            name="http_body",
+            description="Relit par offset un corps de réponse enregistré par http_request (spill)",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "body_id": {
+                        "type": "string",
+                        "description": "Identifiant retourné par http_request"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Position de départ en octets (défaut: 0)",
+                        "default": 0
+                    },
+                    "length": {
+                        "type": "integer",
+                        "description": "Nombre d'octets à lire (défaut: 65536, max: 1048576)",
+                        "default": 65536
+                    }
+                },
+                "required": ["body_id"]
+            }
+        ),
         types.Tool(
             name="port_scan",
             description="Scanne les ports ouverts sur un hôte",
@@ -160,6 +1269,21 @@ async def list_tools() -> List[types.Tool]:
                         "type": "string",
                         "description": "Ports à scanner (ex: '22,80,443' ou '1-1000')",
                         "default": "22,23,25,53,80,110,443,993,995"
+                    },
+                    "concurrency": {
+                        "type": "integer",
+                        "description": f"Nombre maximum de connexions simultanées (défaut: {PORT_SCAN_CONCURRENCY})",
+                        "default": PORT_SCAN_CONCURRENCY
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": f"Timeout initial par port en secondes, ajusté ensuite selon le RTT (défaut: {PORT_SCAN_TIMEOUT})",
+                        "default": PORT_SCAN_TIMEOUT
+                    },
+                    "budget": {
+                        "type": "number",
+                        "description": f"Durée maximale du scan en secondes (défaut: {PORT_SCAN_BUDGET})",
+                        "default": PORT_SCAN_BUDGET
                     }
                 },
                 "required": ["host"]
@@ -173,102 +1297,1006 @@ async def list_tools() -> List[types.Tool]:
                 "properties": {
                     "log_file": {
                         "type": "string",
-                        "description": "Chemin vers le fichier de log à analyser"
+                        "description": "Fichier de log, répertoire ou glob (ex: /host/var/log/**/*.log*); les archives .gz/.bz2/.xz sont lues directement"
                     },
                     "pattern": {
                         "type": "string",
                         "description": "Pattern de recherche (regex supportée)"
                     },
+                    "patterns": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Plusieurs patterns recherchés en une seule passe, avec un décompte par pattern"
+                    },
                     "lines": {
                         "type": "integer",
                         "description": "Nombre de lignes à analyser depuis la fin (défaut: 100)",
                         "default": 100
+                    },
+                    "start_line": {
+                        "type": "integer",
+                        "description": "Première ligne à analyser (1 = début du fichier); remplace l'analyse de la fin du fichier"
+                    },
+                    "end_line": {
+                        "type": "integer",
+                        "description": "Dernière ligne à analyser, incluse (défaut: start_line + lines - 1)"
+                    },
+                    "follow": {
+                        "type": "boolean",
+                        "description": "Suit le fichier et ne retourne que les nouvelles lignes correspondantes (notifications de progression)",
+                        "default": False
+                    },
+                    "follow_seconds": {
+                        "type": "number",
+                        "description": f"Durée du suivi en secondes (défaut: 30, max: {LOG_FOLLOW_MAX_SECONDS:.0f})",
+                        "default": 30
+                    },
+                    "subscription_id": {
+                        "type": "string",
+                        "description": "Reprend un suivi précédent à partir de sa dernière position (avec les patterns passés à cet appel)"
+                    },
+                    "mode": {
+                        "type": "string",
+                        "enum": ["search", "aggregate"],
+                        "description": "search: lignes correspondantes; aggregate: histogramme temporel et modèles de messages les plus fréquents sur tout le fichier (défaut: search)",
+                        "default": "search"
+                    },
+                    "bucket": {
+                        "type": "string",
+                        "enum": ["minute", "hour"],
+                        "description": "Agrégation: granularité de l'histogramme (défaut: minute)",
+                        "default": "minute"
+                    },
+                    "top_k": {
+                        "type": "integer",
+                        "description": "Agrégation: nombre de modèles de messages retournés (défaut: 10)",
+                        "default": 10
+                    },
+                    "max_matches": {
+                        "type": "integer",
+                        "description": "Recherche multi-fichiers: nombre maximum de correspondances retournées, les plus récentes (défaut: 50)",
+                        "default": 50
+                    },
+                    "budget": {
+                        "type": "number",
+                        "description": f"Recherche multi-fichiers: durée maximale en secondes (défaut: {LOG_SEARCH_BUDGET:.0f})",
+                        "default": LOG_SEARCH_BUDGET
+                    }
+                },
+                "required": ["log_file"],
+                "anyOf": [{"required": ["pattern"]}, {"required": ["patterns"]}, {"required": ["subscription_id"]},
+                          {"required": ["mode"]}]
+            }
+        ),
+        types.Tool(
+            name="server_stats",
+            description="Statistiques internes du serveur: latence et erreurs par outil, boucle asyncio, pools, cache et profilage à chaud",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "format": {
+                        "type": "string",
+                        "enum": ["text", "json", "prometheus"],
+                        "description": "text: résumé lisible; json: résultat structuré; prometheus: format d'exposition texte de /metrics (défaut: text)",
+                        "default": "text"
+                    },
+                    "profile": {
+                        "type": "string",
+                        "enum": ["start", "stop"],
+                        "description": "Active ou désactive le profilage cProfile échantillonné des appels d'outils"
+                    },
+                    "profile_rate": {
+                        "type": "number",
+                        "description": f"Fraction des appels profilés avec profile=start (défaut: {PROFILE_DEFAULT_RATE:g})"
+                    },
+                    "tracemalloc": {
+                        "type": "string",
+                        "enum": ["start", "stop"],
+                        "description": "Active ou désactive le suivi des allocations (croissance mémoire par ligne de code)"
+                    },
+                    "top": {
+                        "type": "integer",
+                        "description": f"Nombre de lignes des rapports de profilage et d'allocations (défaut: {PROFILE_TOP})",
+                        "default": PROFILE_TOP
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="result_page",
+            description="Suite d'un résultat JSON tronqué (format=json) à partir de son page_cursor, sans relancer l'outil",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "cursor": {
+                        "type": "string",
+                        "description": "Valeur page_cursor d'un résultat JSON précédent"
+                    }
+                },
+                "required": ["cursor"]
+            }
+        ),
+        types.Tool(
+            name="batch",
+            description=("Exécute plusieurs appels d'outils en parallèle en une seule requête (ex: diagnostic complet "
+                         "cpu, mémoire, disque, processus, ping, logs); durée proche de l'appel le plus lent"),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "calls": {
+                        "type": "array",
+                        "minItems": 1,
+                        "maxItems": BATCH_MAX_CALLS,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string", "description": "Nom de l'outil"},
+                                "arguments": {"type": "object", "description": "Arguments de l'outil"}
+                            },
+                            "required": ["name"]
+                        },
+                        "description": f"Appels à exécuter: [{{\"name\": ..., \"arguments\": {{...}}}}] (max: {BATCH_MAX_CALLS})"
+                    },
+                    "deadline": {
+                        "type": "number",
+                        "description": (f"Délai du batch en secondes (défaut et max: {BATCH_DEADLINE:g}); les appels non "
+                                        "terminés sont interrompus et les résultats obtenus retournés"),
+                        "minimum": 0.1
                     }
                 },
-                "required": ["log_file", "pattern"]
+                "required": ["calls"]
             }
         )
     ]
+    for tool in tools:
+        # format="json" est commun à tous les outils (result_page retourne toujours du JSON)
+        if tool.name != "result_page":
+            tool.inputSchema["properties"].setdefault("format", RESPONSE_FORMAT_PROPERTY)
+        spec = tool_registry.get(tool.name)
+        if spec is not None and spec.cacheable:
+            tool.inputSchema["properties"].setdefault("cache", RESULT_CACHE_PROPERTY)
+    return tools
 
-@server.call_tool()
-async def call_tool(name: str, arguments: Dict[str, Any]) -> List[types.TextContent]:
-    """Exécute un outil spécifique."""
+tool_validators: Dict[str, Any] = {}
+
+async def get_tool_validator(name: str) -> Any:
+    """Validateur compilé une fois pour toutes du schéma d'entrée d'un outil (None si l'outil n'est pas listé)."""
+    if not tool_validators:
+        for tool in await list_tools():
+            validator_class = jsonschema.validators.validator_for(tool.inputSchema)
+            validator_class.check_schema(tool.inputSchema)
+            tool_validators[tool.name] = validator_class(tool.inputSchema)
+    return tool_validators.get(name)
+
+async def run_tool(name: str, arguments: Dict[str, Any]) -> List[types.TextContent]:
+    """Valide les arguments et exécute un outil (appel d'un client ou entrée d'un batch)."""
+    validator = await get_tool_validator(name)
+    if validator is not None:
+        error = jsonschema.exceptions.best_match(validator.iter_errors(arguments))
+        if error is not None:
+            # Levée hors du try: le SDK la retourne comme résultat en erreur (isError), comme sa propre validation
+            raise ValueError(f"Input validation error: {error.message}")
     try:
-        if name == "search_web":
-            return await search_web(arguments)
-        elif name == "calculator":
-            return await calculator(arguments)
-        elif name == "system_info":
-            return await system_info(arguments)
-        elif name == "ping_host":
-            return await ping_host(arguments)
-        elif name == "read_file":
-            return await read_file(arguments)
-        elif name == "http_request":
-            return await http_request(arguments)
-        elif name == "port_scan":
-            return await port_scan(arguments)
-        elif name == "log_analysis":
-            return await log_analysis(arguments)
-        else:
+        spec = tool_registry.get(name)
+        if spec is None:
             raise ValueError(f"Outil inconnu: {name}")
+        return await spec(arguments)
     except Exception as e:
         logger.error(f"Erreur lors de l'exécution de {name}: {e}")
-        return [types.TextContent(type="text", text=f"Erreur: {str(e)}")]
+        return tool_error(f"Erreur: {str(e)}")
 
-async def search_web(args: Dict[str, Any]) -> List[types.TextContent]:
-    """Effectue une recherche web basique."""
-    query = args["query"]
-    max_results = args.get("max_results", 5)
-    
-    # Simulation d'une recherche web (remplacer par une vraie API)
-    results = f"""Résultats de recherche pour "{query}":
+# La validation du SDK revérifie le schéma lui-même à chaque appel (~10 ms): run_tool valide avec un validateur compilé
+@server.call_tool(validate_input=False)
+async def call_tool(name: str, arguments: Dict[str, Any]) -> Union[List[types.TextContent], types.CallToolResult]:
+    """Exécute un outil spécifique."""
+    result = await run_tool(name, arguments)
+    if reported_error(result):
+        # Échec signalé par le gestionnaire: le client le reçoit comme résultat en erreur (isError)
+        return types.CallToolResult(content=result, isError=True)
+    return result
 
-1. Documentation officielle - https://docs.example.com/{query.replace(' ', '-')}
-2. Stack Overflow - Questions relatives à {query}
-3. GitHub - Projets open source sur {query}
-4. Tutorial - Guide complet pour {query}
-5. Blog technique - Meilleures pratiques {query}
+HTML_DROP_RE = re.compile(r"<(script|style|noscript|template)\b.*?</\1\s*>|<!--.*?-->", re.S | re.I)
+HTML_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title\s*>", re.S | re.I)
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+WHITESPACE_RE = re.compile(r"\s+")
+SEARCH_TERM_RE = re.compile(r"\w+")
 
-Note: Il s'agit d'une simulation. Pour une vraie recherche, intégrer une API comme DuckDuckGo ou Google."""
-    
-    return [types.TextContent(type="text", text=results)]
+def html_to_text(markup: str) -> Tuple[str, str]:
+    """Extrait le titre et le texte visible d'une page HTML."""
+    found = HTML_TITLE_RE.search(markup)
+    title = WHITESPACE_RE.sub(" ", html.unescape(found.group(1))).strip() if found else ""
+    text = HTML_TAG_RE.sub(" ", HTML_DROP_RE.sub(" ", markup))
+    return title, WHITESPACE_RE.sub(" ", html.unescape(text)).strip()
 
-async def calculator(args: Dict[str, Any]) -> List[types.TextContent]:
-    """Calculatrice sécurisée."""
-    expression = args["expression"]
-    
-    try:
-        # Import des fonctions mathématiques sécurisées
-        import math
-        
-        # Dictionnaire des fonctions autorisées
-        safe_dict = {
-            "abs": abs, "round": round, "min": min, "max": max,
-            "sin": math.sin, "cos": math.cos, "tan": math.tan,
-            "asin": math.asin, "acos": math.acos, "atan": math.atan,
-            "sqrt": math.sqrt, "log": math.log, "log10": math.log10,
-            "exp": math.exp, "pow": pow, "pi": math.pi, "e": math.e
-        }
+class SearchIndex:
+    """Index plein texte local (SQLite FTS5, classement BM25) des pages lues par http_request et des documents locaux.
+
+    Chaque document est identifié par son URL (file:// pour les fichiers) et une version (empreinte du
+    contenu, ou mtime et taille pour un fichier) qui évite de réindexer ce qui n'a pas changé.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY,
+            url TEXT UNIQUE NOT NULL,
+            version TEXT NOT NULL,
+            source TEXT NOT NULL,
+            indexed_at REAL NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(title, body, tokenize='unicode61 remove_diacritics 2');
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()  # une connexion par thread du pool d'E/S
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self.local.conn = conn
+        return conn
+
+    def add(self, url: str, title: str, body: str, version: str, source: str) -> bool:
+        """Indexe ou met à jour un document; retourne False s'il était déjà indexé dans cette version."""
+        conn = self.connect()
+        row = conn.execute("SELECT id, version FROM documents WHERE url = ?", (url,)).fetchone()
+        if row and row[1] == version:
+            return False
+        with conn:
+            if row:
+                doc_id = row[0]
+                conn.execute("DELETE FROM pages WHERE rowid = ?", (doc_id,))
+                conn.execute("UPDATE documents SET version = ?, source = ?, indexed_at = ? WHERE id = ?",
+                             (version, source, time.time(), doc_id))
+            else:
+                doc_id = conn.execute("INSERT INTO documents (url, version, source, indexed_at) VALUES (?, ?, ?, ?)",
+                                      (url, version, source, time.time())).lastrowid
+            conn.execute("INSERT INTO pages (rowid, title, body) VALUES (?, ?, ?)",
+                         (doc_id, title, body[:SEARCH_INDEX_MAX_CHARS]))
+        return True
+
+    def add_page(self, url: str, content_type: str, text: str) -> bool:
+        """Indexe une page lue par http_request."""
+        if "html" in content_type:
+            title, body = html_to_text(text)
+        else:
+            title, body = "", text
+        version = hashlib.sha1(text.encode("utf-8", errors="replace")).hexdigest()
+        return self.add(url, title or url, body, version, "http")
+
+    def add_file(self, path: Path) -> bool:
+        """Indexe un document local, sans le relire s'il n'a pas changé."""
+        st = path.stat()
+        url = path.resolve().as_uri()
+        version = f"{st.st_mtime_ns}:{st.st_size}"
+        conn = self.connect()
+        row = conn.execute("SELECT version FROM documents WHERE url = ?", (url,)).fetchone()
+        if row and row[0] == version:
+            return False
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read(SEARCH_INDEX_MAX_CHARS)
+        if path.suffix.lower() in (".html", ".htm"):
+            title, body = html_to_text(text)
+        else:
+            heading = next((line.lstrip("#= ").strip() for line in text.splitlines() if line.strip()), "")
+            title, body = heading[:200], text
+        return self.add(url, title or path.name, body, version, "docs")
+
+    def index_directories(self, directories: List[str]) -> Tuple[int, int]:
+        """Indexe récursivement les documents des répertoires; retourne (indexés, inchangés)."""
+        indexed = unchanged = 0
+        for directory in directories:
+            for path in Path(directory).rglob("*"):
+                if path.suffix.lower() not in SEARCH_DOC_EXTENSIONS or not path.is_file():
+                    continue
+                try:
+                    if self.add_file(path):
+                        indexed += 1
+                    else:
+                        unchanged += 1
+                except OSError as e:
+                    logger.warning(f"Indexation impossible de {path}: {e}")
+        return indexed, unchanged
+
+    def search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Recherche par BM25 (titre pondéré 5x): tous les termes d'abord, puis n'importe lequel."""
+        terms = SEARCH_TERM_RE.findall(query)
+        if not terms:
+            return []
+        conn = self.connect()
+        quoted = [f'"{term}"' for term in terms]
+        for expression in (" AND ".join(quoted), " OR ".join(quoted)):
+            rows = conn.execute(
+                """SELECT d.url, pages.title, snippet(pages, 1, '«', '»', '…', 16), bm25(pages, 5.0, 1.0) AS score
+                   FROM pages JOIN documents d ON d.id = pages.rowid
+                   WHERE pages MATCH ? ORDER BY score LIMIT ?""",
+                (expression, limit)
+            ).fetchall()
+            if rows or len(terms) == 1:
+                break
+        return [{"url": url, "title": title, "snippet": WHITESPACE_RE.sub(" ", snippet), "score": -score}
+                for url, title, snippet, score in rows]
+
+    def count(self) -> int:
+        return self.connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+
+class SearchProvider:
+    """Fournisseur de recherche: search(query, max_results) retourne des dicts title/url/snippet."""
+
+    name = ""
+    label = ""
+
+    async def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+class LocalIndexProvider(SearchProvider):
+    """Index local: pages déjà consultées et documentation, sans accès réseau."""
+
+    name = "local"
+    label = "index local"
+
+    async def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        return await run_io(search_index.search, query, max_results)
+
+class DuckDuckGoProvider(SearchProvider):
+    """API Instant Answer de DuckDuckGo (sans clé): résumé et sujets associés."""
+
+    name = "duckduckgo"
+    label = "DuckDuckGo"
+    URL = "https://api.duckduckgo.com/"
+
+    async def search(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        session = await http_pool.start()
+        params = {"q": query, "format": "json", "no_html": "1", "skip_disambig": "1"}
+        async with session.get(self.URL, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        results = []
+        if data.get("AbstractURL"):
+            results.append({"url": data["AbstractURL"], "title": data.get("Heading") or query,
+                            "snippet": data.get("AbstractText", "")})
+        topics = list(data.get("RelatedTopics", []))
+        while topics and len(results) < max_results:
+            topic = topics.pop(0)
+            if "Topics" in topic:
+                topics[:0] = topic["Topics"]
+            elif topic.get("FirstURL"):
+                text = topic.get("Text", "")
+                results.append({"url": topic["FirstURL"], "title": text.split(" - ")[0], "snippet": text})
+        return results[:max_results]
+
+SEARCH_PROVIDER_TYPES = {provider.name: provider for provider in (LocalIndexProvider, DuckDuckGoProvider)}
+search_providers = {name: provider() for name, provider in SEARCH_PROVIDER_TYPES.items()}
+
+async def index_docs_dirs() -> None:
+    """Indexe les répertoires de documentation configurés (MCP_SEARCH_DOCS_DIRS) en arrière-plan."""
+    try:
+        indexed, unchanged = await run_io(search_index.index_directories, SEARCH_DOCS_DIRS)
+        logger.info(f"Documentation indexée: {indexed} documents mis à jour, {unchanged} inchangés")
+    except Exception as e:
+        logger.error(f"Indexation de la documentation impossible: {e}")
+
+@register_tool("search_web", timeout=30)
+async def search_web(args: Dict[str, Any]) -> List[types.TextContent]:
+    """Interroge les fournisseurs de recherche dans l'ordre jusqu'à obtenir max_results résultats."""
+    query = args["query"]
+    max_results = max(1, min(int(args.get("max_results", 5)), 50))
+    names = args.get("providers") or SEARCH_PROVIDERS
+    
+    try:
+        started = time.perf_counter()
+        results: List[Dict[str, Any]] = []
+        seen = set()
+        sources = []
+        for name in names:
+            if len(results) >= max_results:
+                break
+            provider = search_providers.get(name)
+            if provider is None:
+                sources.append(f"{name}: fournisseur inconnu")
+                continue
+            try:
+                found = await provider.search(query, max_results - len(results))
+            except Exception as e:
+                sources.append(f"{provider.label}: indisponible ({e})")
+                continue
+            found = [item for item in found if item["url"] not in seen]
+            seen.update(item["url"] for item in found)
+            results.extend(found)
+            sources.append(f"{provider.label}: {len(found)} résultats")
+        elapsed = (time.perf_counter() - started) * 1000
         
-        # Évaluation sécurisée
-        result = eval(expression, {"__builtins__": {}}, safe_dict)
+        if args.get("format") == "json":
+            return json_result({
+                "query": query,
+                "sources": sources,
+                "elapsed_ms": round(elapsed, 1),
+                "results": [{"title": item["title"], "url": item["url"], "snippet": (item.get("snippet") or "")[:300]}
+                            for item in results],
+            }, paged=("results",))
+        
+        result = f"Résultats de recherche pour \"{query}\":\n\n"
+        if results:
+            for i, item in enumerate(results, 1):
+                result += f"{i}. {item['title']} - {item['url']}\n"
+                if item.get("snippet"):
+                    result += f"   {item['snippet'][:300]}\n"
+        else:
+            result += "Aucun résultat.\n"
+        result += f"\nSources: {', '.join(sources)} ({elapsed:.0f} ms)"
+        
+        return [types.TextContent(type="text", text=result)]
+    
+    except Exception as e:
+        return tool_error(f"Erreur lors de la recherche: {str(e)}")
+
+class CalculatorError(ValueError):
+    """Expression refusée ou invalide."""
+
+def checked_pow(base: Any, exponent: Any) -> Any:
+    """Puissance avec plafonds sur l'exposant et la taille des entiers produits."""
+    if np is not None and isinstance(exponent, np.ndarray):
+        if exponent.size and np.max(np.abs(exponent)) > CALC_MAX_EXPONENT:
+            raise CalculatorError(f"Exposant trop grand (max: {CALC_MAX_EXPONENT})")
+        return np.power(base, exponent)
+    if not (np is not None and isinstance(base, np.ndarray)) and base not in (0, 1, -1):
+        if abs(exponent) > CALC_MAX_EXPONENT:
+            raise CalculatorError(f"Exposant trop grand (max: {CALC_MAX_EXPONENT})")
+        if isinstance(base, int) and isinstance(exponent, int) and (base.bit_length() - 1) * exponent + 1 > CALC_MAX_INT_BITS:
+            raise CalculatorError(f"Résultat entier trop grand (max: {CALC_MAX_INT_BITS} bits)")
+    return pow(base, exponent)
+
+def checked_mul(left: Any, right: Any) -> Any:
+    """Multiplication avec plafond sur la taille des entiers produits."""
+    if isinstance(left, int) and isinstance(right, int) and left.bit_length() + right.bit_length() > CALC_MAX_INT_BITS:
+        raise CalculatorError(f"Résultat entier trop grand (max: {CALC_MAX_INT_BITS} bits)")
+    return left * right
+
+def checked_round(value: Any, ndigits: Any = None) -> Any:
+    """Arrondi avec plafond sur le nombre de chiffres: round(5, -10**7) prend plusieurs secondes sur un entier."""
+    if ndigits is None:
+        return round(value)
+    if isinstance(ndigits, (int, float)) and abs(ndigits) > CALC_MAX_EXPONENT:
+        raise CalculatorError(f"Nombre de chiffres trop grand pour round (max: {CALC_MAX_EXPONENT})")
+    if np is not None and isinstance(value, np.ndarray):
+        return np.round(value, ndigits)
+    return round(value, ndigits)
+
+CALC_CONSTANTS = {"pi": math.pi, "e": math.e}
+
+CALC_FUNCTIONS = {
+    "abs": abs, "round": checked_round, "min": min, "max": max,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "asin": math.asin, "acos": math.acos, "atan": math.atan,
+    "sqrt": math.sqrt, "log": math.log, "log10": math.log10,
+    "exp": math.exp, "pow": checked_pow
+}
+
+CALC_NUMPY_FUNCTIONS = {
+    "abs": np.abs, "round": checked_round,
+    "min": lambda *values: functools.reduce(np.minimum, values),
+    "max": lambda *values: functools.reduce(np.maximum, values),
+    "sin": np.sin, "cos": np.cos, "tan": np.tan,
+    "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan,
+    "sqrt": np.sqrt, "log": lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base),
+    "log10": np.log10, "exp": np.exp, "pow": checked_pow
+} if np is not None else {}
+
+CALC_BINARY_OPERATORS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: checked_mul,
+    ast.Div: lambda a, b: a / b,
+    ast.FloorDiv: lambda a, b: a // b,
+    ast.Mod: lambda a, b: a % b,
+    ast.Pow: checked_pow,
+}
+
+CALC_UNARY_OPERATORS = {
+    ast.UAdd: lambda a: +a,
+    ast.USub: lambda a: -a,
+}
+
+def compile_node(node: ast.AST, variables: set) -> Any:
+    """Transforme un nœud d'AST autorisé en fonction (valeurs, fonctions) -> résultat."""
+    if isinstance(node, ast.Expression):
+        return compile_node(node.body, variables)
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise CalculatorError(f"Constante non autorisée: {node.value!r}")
+        value = node.value
+        return lambda env, fns: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in CALC_CONSTANTS:
+            value = CALC_CONSTANTS[name]
+            return lambda env, fns: value
+        variables.add(name)
+        def load(env, fns):
+            try:
+                value = env[name]
+            except KeyError:
+                raise CalculatorError(f"Variable non définie: {name}") from None
+            if isinstance(value, bool) or not isinstance(value, (int, float)) and not (np is not None and isinstance(value, np.ndarray)):
+                raise CalculatorError(f"Valeur non numérique pour {name}: {value!r}")
+            return value
+        return load
+    if isinstance(node, ast.BinOp) and type(node.op) in CALC_BINARY_OPERATORS:
+        op = CALC_BINARY_OPERATORS[type(node.op)]
+        left = compile_node(node.left, variables)
+        right = compile_node(node.right, variables)
+        return lambda env, fns: op(left(env, fns), right(env, fns))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in CALC_UNARY_OPERATORS:
+        op = CALC_UNARY_OPERATORS[type(node.op)]
+        operand = compile_node(node.operand, variables)
+        return lambda env, fns: op(operand(env, fns))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in CALC_FUNCTIONS:
+        if node.keywords:
+            raise CalculatorError("Arguments nommés non autorisés")
+        name = node.func.id
+        arguments = [compile_node(arg, variables) for arg in node.args]
+        return lambda env, fns: fns[name](*[arg(env, fns) for arg in arguments])
+    raise CalculatorError(f"Élément non autorisé dans l'expression: {type(node).__name__}")
+
+@functools.lru_cache(maxsize=CALC_CACHE_SIZE)
+def compile_expression(expression: str) -> Tuple[Any, Tuple[str, ...], int]:
+    """Analyse et compile une expression (cache LRU); retourne (fonction, variables utilisées, nombre de nœuds)."""
+    if len(expression) > CALC_MAX_EXPRESSION_LENGTH:
+        raise CalculatorError(f"Expression trop longue (max: {CALC_MAX_EXPRESSION_LENGTH} caractères)")
+    try:
+        # 2^10 s'écrit couramment pour une puissance: on le traite comme ** (même priorité)
+        tree = ast.parse(expression.strip().replace("^", "**"), mode="eval")
+    except SyntaxError as e:
+        raise CalculatorError(f"Syntaxe invalide: {e.msg}") from None
+    variables: set = set()
+    compiled = compile_node(tree, variables)
+    return compiled, tuple(sorted(variables)), sum(1 for _ in ast.walk(tree))
+
+def evaluate_batch(expression: str, batch: List[Dict[str, Any]]) -> List[Any]:
+    """Évalue une expression pour chaque jeu de variables, en une seule passe NumPy si possible."""
+    compiled, names, nodes = compile_expression(expression)
+    if np is not None and batch:
+        try:
+            env = {name: np.array([float(bindings[name]) for bindings in batch]) for name in names}
+        except KeyError as e:
+            raise CalculatorError(f"Variable non définie: {e.args[0]}") from None
+        with np.errstate(all="ignore"):
+            result = compiled(env, CALC_NUMPY_FUNCTIONS)
+        return np.broadcast_to(result, (len(batch),)).tolist()
+    # Sans NumPy, chaque jeu de variables parcourt tout l'arbre: le coût total est borné avant l'évaluation
+    if nodes * len(batch) > CALC_MAX_OPERATIONS:
+        raise CalculatorError(f"Calcul trop coûteux sans NumPy: {nodes} nœuds × {len(batch)} jeux de variables "
+                              f"(max: {CALC_MAX_OPERATIONS} opérations)")
+    return [compiled(bindings, CALC_FUNCTIONS) for bindings in batch]
+
+def json_number(value: Any) -> Any:
+    """NaN et infinis n'existent pas en JSON: ils sont retournés sous forme de texte."""
+    return value if not isinstance(value, float) or math.isfinite(value) else str(value)
+
+# Dans le pool d'E/S plutôt que le pool de processus, où elle attendrait derrière les recherches multi-fichiers.
+# Un thread ne s'interrompt pas au délai: le coût est borné avant et pendant l'évaluation (exposants et chiffres
+# de round: CALC_MAX_EXPONENT, entiers: CALC_MAX_INT_BITS, batch: CALC_MAX_BATCH et CALC_MAX_OPERATIONS)
+@register_tool("calculator", kind="io", concurrency=max(1, IO_POOL_WORKERS // 2), timeout=30)
+def calculator(args: Dict[str, Any]) -> List[types.TextContent]:
+    """Calculatrice sécurisée."""
+    expression = args["expression"]
+    
+    try:
+        batch = args.get("batch")
+        if batch is not None:
+            if len(batch) > CALC_MAX_BATCH:
+                raise CalculatorError(f"Trop de jeux de variables (max: {CALC_MAX_BATCH})")
+            results = evaluate_batch(expression, batch)
+            if args.get("format") == "json":
+                return json_result({"expression": expression, "count": len(batch), "numpy": np is not None,
+                                    "results": [json_number(value) for value in results]}, paged=("results",))
+            mode = "vectorisé NumPy" if np is not None else "séquentiel"
+            lines = [f"Résultats de '{expression}' pour {len(batch)} jeux de variables ({mode}):"]
+            for bindings, result in zip(batch, results):
+                lines.append(f"- {', '.join(f'{k}={v}' for k, v in bindings.items())} → {result}")
+            return [types.TextContent(type="text", text="\n".join(lines))]
+        
+        compiled, _, _ = compile_expression(expression)
+        result = compiled(args.get("variables") or {}, CALC_FUNCTIONS)
+        if args.get("format") == "json":
+            return json_result({"expression": expression, "result": json_number(result)})
         
         return [types.TextContent(
             type="text", 
             text=f"Résultat de '{expression}' = {result}"
         )]
     except Exception as e:
-        return [types.TextContent(
-            type="text", 
-            text=f"Erreur de calcul: {str(e)}"
-        )]
+        return tool_error(f"Erreur de calcul: {str(e)}")
+
+class RingBuffer:
+    """Série temporelle de taille fixe stockée dans un array('d')."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values = array('d', bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+
+    def append(self, value: float) -> None:
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self, default: float = 0.0) -> float:
+        return self.values[self.head - 1] if self.count else default
+
+    def last(self, n: int) -> List[float]:
+        """Retourne les n dernières valeurs dans l'ordre chronologique."""
+        n = min(n, self.count)
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.values[start:start + n].tolist()
+        return self.values[start:].tolist() + self.values[:self.head].tolist()
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Calcule min/moy/max/p95 d'une série."""
+    ordered = sorted(values)
+    return {
+        "min": ordered[0],
+        "avg": sum(ordered) / len(ordered),
+        "max": ordered[-1],
+        "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+    }
+
+class ProcessTracker:
+    """Suivi des processus: objets psutil.Process conservés entre échantillons et lus via oneshot()."""
+
+    SORT_KEYS = {"cpu": 1, "memory": 2, "io": 3, "fds": 4}
+    SORT_LABELS = {"cpu": "CPU", "memory": "mémoire", "io": "E/S", "fds": "descripteurs ouverts"}
+
+    def __init__(self):
+        self.handles: Dict[int, psutil.Process] = {}
+        # pid -> (nom, %CPU, RSS, débit E/S en octets/s ou None, descripteurs ou None)
+        self.snapshots: Dict[int, Tuple[str, float, int, Optional[float], Optional[int]]] = {}
+        self.io_totals: Dict[int, int] = {}
+        self.sampled_at: Optional[float] = None
+
+    def refresh(self) -> None:
+        """Met à jour l'instantané de tous les processus (exécuté dans le thread de l'échantillonneur)."""
+        now = time.monotonic()
+        elapsed = now - self.sampled_at if self.sampled_at else None
+        pids = set(psutil.pids())
+        for pid in list(self.handles):
+            if pid not in pids:
+                del self.handles[pid]
+                self.snapshots.pop(pid, None)
+                self.io_totals.pop(pid, None)
+        for pid in pids:
+            proc = self.handles.get(pid)
+            try:
+                if proc is None:
+                    proc = self.handles[pid] = psutil.Process(pid)
+                with proc.oneshot():
+                    name = proc.name()
+                    cpu = proc.cpu_percent(interval=None)
+                    rss = proc.memory_info().rss
+                    try:
+                        counters = proc.io_counters()
+                        io_total = counters.read_bytes + counters.write_bytes
+                    except (psutil.AccessDenied, AttributeError):
+                        io_total = None
+                    try:
+                        fds = proc.num_fds()
+                    except (psutil.AccessDenied, AttributeError):
+                        fds = None
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                self.handles.pop(pid, None)
+                self.snapshots.pop(pid, None)
+                continue
+            except psutil.AccessDenied:
+                continue
+            io_rate = None
+            if io_total is not None:
+                previous = self.io_totals.get(pid)
+                if previous is not None and elapsed:
+                    io_rate = max(0, io_total - previous) / elapsed
+                self.io_totals[pid] = io_total
+            self.snapshots[pid] = (name, cpu, rss, io_rate, fds)
+        self.sampled_at = now
+
+    def top(self, n: int, key: str = "cpu",
+            snapshots: Optional[Dict[int, Tuple[str, float, int, Optional[float], Optional[int]]]] = None
+            ) -> List[Tuple[int, Tuple[str, float, int, Optional[float], Optional[int]]]]:
+        """Sélectionne les n premiers processus selon key (dans snapshots si fourni), par tas plutôt que par tri complet."""
+        index = self.SORT_KEYS[key]
+        return heapq.nlargest(n, (self.snapshots if snapshots is None else snapshots).items(), key=lambda item: item[1][index] or 0)
+
+DISK_RATE_FIELDS = ("read_bytes", "write_bytes", "read_count", "write_count")
+NET_RATE_FIELDS = ("bytes_sent", "bytes_recv", "errin", "errout", "dropin", "dropout")
+
+def counter_rates(current: Dict[str, Any], previous: Dict[str, Any], elapsed: float,
+                  fields: Tuple[str, ...]) -> Dict[str, Dict[str, float]]:
+    """Débits par périphérique à partir de deux instantanés de compteurs cumulés."""
+    rates = {}
+    for name, counters in current.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        # Un compteur qui recule (remise à zéro, périphérique recréé) donne un débit nul
+        rates[name] = {field: max(0, getattr(counters, field) - getattr(before, field)) / elapsed
+                       for field in fields}
+    return rates
+
+def mount_usage() -> List[Tuple[Any, Any]]:
+    """Occupation de toutes les partitions physiques (hors pseudo-systèmes de fichiers)."""
+    mounts = []
+    seen = set()
+    for partition in psutil.disk_partitions(all=False):
+        if partition.mountpoint in seen:
+            continue
+        seen.add(partition.mountpoint)
+        try:
+            mounts.append((partition, psutil.disk_usage(partition.mountpoint)))
+        except (PermissionError, OSError):
+            continue
+    return mounts
+
+class MetricsSampler:
+    """Collecte périodique des métriques système dans des tampons circulaires.
+
+    Les outils répondent à partir du dernier échantillon au lieu d'appeler psutil de façon
+    bloquante (cpu_percent(interval=1)) à chaque requête.
+    """
+
+    def __init__(self, interval: float = METRICS_INTERVAL, capacity: int = METRICS_HISTORY):
+        self.interval = interval
+        self.capacity = capacity
+        self.series: Dict[str, RingBuffer] = {}
+        self.latest: Dict[str, Any] = {}
+        self.processes = ProcessTracker()
+        self.previous: Optional[Tuple[float, Any, Any]] = None
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def record(self, name: str, value: float) -> None:
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = RingBuffer(self.capacity)
+        series.append(value)
+
+    def prime(self) -> None:
+        """Premier appel non bloquant de cpu_percent: sert de référence au suivant."""
+        psutil.cpu_percent(percpu=True)
+        self.previous = (time.monotonic(), psutil.disk_io_counters(), psutil.net_io_counters(),
+                         psutil.disk_io_counters(perdisk=True) or {}, psutil.net_io_counters(pernic=True) or {})
+        self.processes.refresh()
+
+    def sample(self) -> None:
+        """Prend un échantillon (exécuté dans un thread pour ne pas bloquer la boucle)."""
+        now = time.monotonic()
+        per_core = psutil.cpu_percent(percpu=True)
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        disk_io = psutil.disk_io_counters()
+        net_io = psutil.net_io_counters()
+        per_disk = psutil.disk_io_counters(perdisk=True) or {}
+        per_nic = psutil.net_io_counters(pernic=True) or {}
+        
+        self.record("time", time.time())
+        self.record("cpu", sum(per_core) / len(per_core) if per_core else 0.0)
+        for i, value in enumerate(per_core):
+            self.record(f"cpu_core_{i}", value)
+        self.record("memory", memory.percent)
+        self.record("swap", swap.percent)
+        
+        previous_time, previous_disk, previous_net, previous_per_disk, previous_per_nic = self.previous
+        elapsed = max(now - previous_time, 1e-6)
+        if disk_io and previous_disk:
+            self.record("disk_read_bps", (disk_io.read_bytes - previous_disk.read_bytes) / elapsed)
+            self.record("disk_write_bps", (disk_io.write_bytes - previous_disk.write_bytes) / elapsed)
+        if net_io and previous_net:
+            self.record("net_sent_bps", (net_io.bytes_sent - previous_net.bytes_sent) / elapsed)
+            self.record("net_recv_bps", (net_io.bytes_recv - previous_net.bytes_recv) / elapsed)
+        self.previous = (now, disk_io, net_io, per_disk, per_nic)
+        self.processes.refresh()
+        
+        self.latest = {
+            "per_core": per_core, "memory": memory, "swap": swap, "disk_io": disk_io, "net_io": net_io,
+            "disk_rates": counter_rates(per_disk, previous_per_disk, elapsed, DISK_RATE_FIELDS),
+            "net_rates": counter_rates(per_nic, previous_per_nic, elapsed, NET_RATE_FIELDS),
+            "per_nic": per_nic,
+            "mounts": mount_usage(),
+        }
+
+    def read_direct(self) -> Dict[str, Any]:
+        """Valeurs instantanées lues directement dans psutil, au format de latest (débits inconnus: vides)."""
+        return {
+            "per_core": psutil.cpu_percent(percpu=True), "memory": psutil.virtual_memory(),
+            "swap": psutil.swap_memory(), "disk_io": psutil.disk_io_counters(), "net_io": psutil.net_io_counters(),
+            "disk_rates": {}, "net_rates": {}, "per_nic": psutil.net_io_counters(pernic=True) or {},
+            "mounts": mount_usage(),
+        }
+
+    async def run(self) -> None:
+        await asyncio.to_thread(self.prime)
+        # Premier échantillon rapproché pour disposer rapidement de valeurs significatives
+        await asyncio.sleep(min(0.5, self.interval))
+        while True:
+            try:
+                await asyncio.to_thread(self.sample)
+                self.ready.set()
+            except Exception as e:
+                logger.warning(f"Échantillonnage des métriques impossible: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.ready = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def wait_ready(self, timeout: float = 2.0) -> None:
+        """Démarre l'échantillonneur si besoin et attend le premier échantillon."""
+        self.start()
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def window(self, name: str, minutes: float) -> Optional[Dict[str, float]]:
+        """Statistiques d'une série sur les N dernières minutes."""
+        series = self.series.get(name)
+        if series is None or not series.count:
+            return None
+        n = max(1, int(minutes * 60 / self.interval))
+        return summarize(series.last(n))
+
+sampler = MetricsSampler()
+
+# Valeurs système mémorisées pour la durée d'un batch (un dictionnaire par batch, hérité par ses tâches)
+batch_snapshots: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("batch_snapshots", default=None)
+
+def shared_snapshot(key: str, func: Any) -> Any:
+    """Retourne func(), calculé une seule fois par batch: les entrées d'un batch voient le même état du système."""
+    memo = batch_snapshots.get()
+    if memo is None:
+        return func()
+    if key not in memo:
+        memo[key] = func()
+    return memo[key]
 
+def sampled(name: str) -> float:
+    """Dernière valeur d'une série de l'échantillonneur (0 si indisponible)."""
+    return shared_snapshot(f"series:{name}", lambda: sampler.series[name].latest() if name in sampler.series else 0.0)
+
+async def latest_sample() -> Dict[str, Any]:
+    """Dernier échantillon (partagé par les entrées d'un batch), ou lecture directe s'il n'est pas encore prêt."""
+    await sampler.wait_ready()
+    latest = shared_snapshot("latest", lambda: sampler.latest)
+    if not latest:
+        # Premier échantillon plus long que l'attente (hôte chargé): 0,5 s de pause et deux passes sur les processus
+        latest = await run_io(sampler.read_direct)
+    return latest
+
+def process_snapshots() -> Dict[int, Tuple[str, float, int, Optional[float], Optional[int]]]:
+    """Copie de l'instantané des processus, que le thread de l'échantillonneur modifie en place."""
+    return shared_snapshot("processes", lambda: dict(sampler.processes.snapshots))
+
+def format_window(label: str, stats: Optional[Dict[str, float]], unit: str = "%", scale: float = 1.0) -> str:
+    """Formate une ligne min/moy/max/p95."""
+    if stats is None:
+        return f"- {label}: historique indisponible\n"
+    return (f"- {label}: min {stats['min'] / scale:.1f}{unit} / moy {stats['avg'] / scale:.1f}{unit} / "
+            f"max {stats['max'] / scale:.1f}{unit} / p95 {stats['p95'] / scale:.1f}{unit}\n")
+
+def system_info_json(info_type: str, args: Dict[str, Any], latest: Dict[str, Any]) -> List[Any]:
+    """Vue structurée de system_info (octets et octets/s bruts, pourcentages arrondis)."""
+    window_minutes = args.get("window_minutes")
+
+    def window(*names: str) -> Optional[Dict[str, Any]]:
+        if not window_minutes:
+            return None
+        stats = {name: sampler.window(name, window_minutes) for name in names}
+        return {name: {key: round(value, 1) for key, value in values.items()} if values else None
+                for name, values in stats.items()}
+
+    def current(name: str) -> float:
+        return round(sampled(name), 1)
+
+    if info_type == "general":
+        return json_result({
+            "os": platform.system(), "release": platform.release(), "machine": platform.machine(),
+            "processor": platform.processor(), "hostname": platform.node(), "python": platform.python_version(),
+            "user": os.getenv("USER"), "cwd": os.getcwd(),
+        })
+
+    if info_type == "cpu":
+        cpu_freq = shared_snapshot("cpu_freq", psutil.cpu_freq)
+        return json_result({
+            "percent": current("cpu"),
+            "per_core": [round(value, 1) for value in latest.get("per_core", [])],
+            "count": shared_snapshot("cpu_count", psutil.cpu_count),
+            "freq_mhz": {"current": round(cpu_freq.current), "max": round(cpu_freq.max)} if cpu_freq else None,
+            "boot_time": datetime.fromtimestamp(shared_snapshot("boot_time", psutil.boot_time)).isoformat(),
+            "window": window("cpu"),
+        })
+
+    if info_type == "memory":
+        memory, swap = latest["memory"], latest["swap"]
+        return json_result({
+            "total": memory.total, "used": memory.used, "available": memory.available, "percent": memory.percent,
+            "swap": {"total": swap.total, "used": swap.used, "percent": swap.percent},
+            "window": window("memory", "swap"),
+        })
+
+    if info_type == "disk":
+        disk_io = latest["disk_io"]
+        return json_result({
+            "read_count": disk_io.read_count if disk_io else None,
+            "write_count": disk_io.write_count if disk_io else None,
+            "read_bps": current("disk_read_bps"), "write_bps": current("disk_write_bps"),
+            "per_disk": {name: {key: round(value, 1) for key, value in rate.items()}
+                         for name, rate in sorted(latest["disk_rates"].items())},
+            "window": window("disk_read_bps", "disk_write_bps"),
+            "partitions": [{"mountpoint": partition.mountpoint, "device": partition.device, "fstype": partition.fstype,
+                            "total": usage.total, "used": usage.used, "free": usage.free, "percent": usage.percent}
+                           for partition, usage in latest["mounts"]],
+        }, paged=("partitions",))
+
+    if info_type == "network":
+        net_io, net_rates, per_nic = latest["net_io"], latest["net_rates"], latest["per_nic"]
+        interfaces = []
+        for interface, addrs in shared_snapshot("net_if_addrs", psutil.net_if_addrs).items():
+            counters = per_nic.get(interface)
+            interfaces.append({
+                "name": interface,
+                "ipv4": [addr.address for addr in addrs if addr.family == socket.AF_INET],
+                "rates": {key: round(value, 1) for key, value in net_rates.get(interface, {}).items()} or None,
+                "errors": [counters.errin, counters.errout] if counters else None,
+                "drops": [counters.dropin, counters.dropout] if counters else None,
+            })
+        return json_result({
+            "bytes_sent": net_io.bytes_sent, "bytes_recv": net_io.bytes_recv,
+            "packets_sent": net_io.packets_sent, "packets_recv": net_io.packets_recv,
+            "sent_bps": current("net_sent_bps"), "recv_bps": current("net_recv_bps"),
+            "window": window("net_sent_bps", "net_recv_bps"),
+            "interfaces": interfaces,
+        }, paged=("interfaces",))
+
+    sort_by = args.get("sort_by", "cpu")
+    limit = max(1, min(int(args.get("limit", 10)), 100))
+    total_memory = latest["memory"].total
+    processes = process_snapshots()
+    return json_result({
+        "sort_by": sort_by,
+        "tracked": len(processes),
+        "processes": [{"pid": pid, "name": name, "cpu": round(cpu, 1), "rss": rss,
+                       "memory_percent": round(rss / total_memory * 100, 1),
+                       "io_bps": round(io_rate) if io_rate is not None else None, "fds": fds}
+                      for pid, (name, cpu, rss, io_rate, fds) in sampler.processes.top(limit, sort_by, processes)],
+    }, paged=("processes",))
+
+@register_tool("system_info", timeout=30, cache_ttl=2.0)
 async def system_info(args: Dict[str, Any]) -> List[types.TextContent]:
     """Récupère les informations système."""
     info_type = args["info_type"]
+    window_minutes = args.get("window_minutes")
     
     try:
+        latest = await latest_sample() if info_type != "general" else {}
+        if args.get("format") == "json":
+            return system_info_json(info_type, args, latest)
+        
         if info_type == "general":
             info = f"""Informations générales du système:
 - OS: {platform.system()} {platform.release()}
@@ -281,20 +2309,26 @@ async def system_info(args: Dict[str, Any]) -> List[types.TextContent]:
 """
         
         elif info_type == "cpu":
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_count = psutil.cpu_count()
-            cpu_freq = psutil.cpu_freq()
+            cpu_percent = sampled("cpu")
+            per_core = latest.get("per_core", [])
+            cpu_count = shared_snapshot("cpu_count", psutil.cpu_count)
+            cpu_freq = shared_snapshot("cpu_freq", psutil.cpu_freq)
+            freq = f"{cpu_freq.current:.2f} MHz (max: {cpu_freq.max:.2f} MHz)" if cpu_freq else "N/A"
             
             info = f"""Informations CPU:
-- Utilisation: {cpu_percent}%
+- Utilisation: {cpu_percent:.1f}%
+- Utilisation par cœur: {', '.join(f'{value:.0f}%' for value in per_core)}
 - Nombre de cœurs: {cpu_count}
-- Fréquence: {cpu_freq.current:.2f} MHz (max: {cpu_freq.max:.2f} MHz)
-- Temps de fonctionnement: {datetime.fromtimestamp(psutil.boot_time()).strftime('%Y-%m-%d %H:%M:%S')}
+- Fréquence: {freq}
+- Temps de fonctionnement: {datetime.fromtimestamp(shared_snapshot("boot_time", psutil.boot_time)).strftime('%Y-%m-%d %H:%M:%S')}
 """
+            if window_minutes:
+                info += f"\nSur les {window_minutes:g} dernières minutes:\n"
+                info += format_window("Utilisation", sampler.window("cpu", window_minutes))
         
         elif info_type == "memory":
-            memory = psutil.virtual_memory()
-            swap = psutil.swap_memory()
+            memory = latest["memory"]
+            swap = latest["swap"]
             
             info = f"""Informations mémoire:
 - RAM totale: {memory.total / (1024**3):.2f} GB
@@ -303,285 +2337,2210 @@ async def system_info(args: Dict[str, Any]) -> List[types.TextContent]:
 - SWAP total: {swap.total / (1024**3):.2f} GB
 - SWAP utilisé: {swap.used / (1024**3):.2f} GB ({swap.percent}%)
 """
+            if window_minutes:
+                info += f"\nSur les {window_minutes:g} dernières minutes:\n"
+                info += format_window("RAM utilisée", sampler.window("memory", window_minutes))
+                info += format_window("SWAP utilisé", sampler.window("swap", window_minutes))
         
         elif info_type == "disk":
-            disk_usage = psutil.disk_usage('/')
-            disk_io = psutil.disk_io_counters()
+            disk_io = latest["disk_io"]
+            read_bps = sampled("disk_read_bps")
+            write_bps = sampled("disk_write_bps")
+            
+            info = "Informations disque:\n\nPartitions:\n"
+            for partition, usage in latest["mounts"]:
+                info += (f"- {partition.mountpoint} ({partition.device}, {partition.fstype}): "
+                         f"{usage.used / (1024**3):.2f} / {usage.total / (1024**3):.2f} GB utilisés ({usage.percent:.1f}%), "
+                         f"{usage.free / (1024**3):.2f} GB libres\n")
             
-            info = f"""Informations disque:
-- Espace total: {disk_usage.total / (1024**3):.2f} GB
-- Espace utilisé: {disk_usage.used / (1024**3):.2f} GB ({disk_usage.used/disk_usage.total*100:.1f}%)
-- Espace libre: {disk_usage.free / (1024**3):.2f} GB
+            info += f"""
+Activité:
 - Lectures: {disk_io.read_count if disk_io else 'N/A'}
 - Écritures: {disk_io.write_count if disk_io else 'N/A'}
+- Débit actuel: lecture {read_bps / (1024**2):.2f} MB/s, écriture {write_bps / (1024**2):.2f} MB/s
 """
+            disk_rates = latest["disk_rates"]
+            if disk_rates:
+                info += "\nDébit par disque:\n"
+                for name, rate in sorted(disk_rates.items()):
+                    info += (f"- {name}: lecture {rate['read_bytes'] / (1024**2):.2f} MB/s ({rate['read_count']:.0f} IOPS), "
+                             f"écriture {rate['write_bytes'] / (1024**2):.2f} MB/s ({rate['write_count']:.0f} IOPS)\n")
+            if window_minutes:
+                info += f"\nSur les {window_minutes:g} dernières minutes:\n"
+                info += format_window("Lecture", sampler.window("disk_read_bps", window_minutes), " MB/s", 1024**2)
+                info += format_window("Écriture", sampler.window("disk_write_bps", window_minutes), " MB/s", 1024**2)
         
         elif info_type == "network":
-            net_io = psutil.net_io_counters()
-            interfaces = psutil.net_if_addrs()
+            net_io = latest["net_io"]
+            interfaces = shared_snapshot("net_if_addrs", psutil.net_if_addrs)
+            sent_bps = sampled("net_sent_bps")
+            recv_bps = sampled("net_recv_bps")
             
             info = f"""Informations réseau:
 - Bytes envoyés: {net_io.bytes_sent / (1024**2):.2f} MB
 - Bytes reçus: {net_io.bytes_recv / (1024**2):.2f} MB
 - Paquets envoyés: {net_io.packets_sent}
 - Paquets reçus: {net_io.packets_recv}
-
-Interfaces réseau:
+- Débit actuel: envoi {sent_bps / 1024:.1f} KB/s, réception {recv_bps / 1024:.1f} KB/s
 """
+            if window_minutes:
+                info += f"\nSur les {window_minutes:g} dernières minutes:\n"
+                info += format_window("Envoi", sampler.window("net_sent_bps", window_minutes), " KB/s", 1024)
+                info += format_window("Réception", sampler.window("net_recv_bps", window_minutes), " KB/s", 1024)
+            
+            net_rates = latest["net_rates"]
+            per_nic = latest["per_nic"]
+            info += "\nInterfaces réseau:\n"
             for interface, addrs in interfaces.items():
                 info += f"- {interface}: "
                 for addr in addrs:
                     if addr.family == 2:  # IPv4
                         info += f"IPv4={addr.address} "
+                rate = net_rates.get(interface)
+                if rate:
+                    info += (f"envoi {rate['bytes_sent'] / 1024:.1f} KB/s, réception {rate['bytes_recv'] / 1024:.1f} KB/s, "
+                             f"erreurs {rate['errin'] + rate['errout']:.1f}/s, pertes {rate['dropin'] + rate['dropout']:.1f}/s")
+                counters = per_nic.get(interface)
+                if counters and (counters.errin or counters.errout or counters.dropin or counters.dropout):
+                    info += (f" (cumul: erreurs {counters.errin}/{counters.errout}, "
+                             f"pertes {counters.dropin}/{counters.dropout} entrée/sortie)")
                 info += "\n"
         
         elif info_type == "processes":
-            processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-                try:
-                    processes.append(proc.info)
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            
-            # Trier par utilisation CPU
-            processes.sort(key=lambda x: x['cpu_percent'] or 0, reverse=True)
+            sort_by = args.get("sort_by", "cpu")
+            limit = max(1, min(int(args.get("limit", 10)), 100))
+            processes = process_snapshots()
+            total_memory = latest["memory"].total
             
-            info = "Top 10 des processus (par CPU):\n"
-            for i, proc in enumerate(processes[:10]):
-                info += f"{i+1}. {proc['name']} (PID: {proc['pid']}) - CPU: {proc['cpu_percent']:.1f}% - RAM: {proc['memory_percent']:.1f}%\n"
+            info = f"Top {limit} des processus (par {ProcessTracker.SORT_LABELS[sort_by]}, {len(processes)} suivis):\n"
+            for i, (pid, (name, cpu, rss, io_rate, fds)) in enumerate(sampler.processes.top(limit, sort_by, processes)):
+                io_text = f"{io_rate / 1024:.1f} KB/s" if io_rate is not None else "N/A"
+                fds_text = str(fds) if fds is not None else "N/A"
+                info += (f"{i+1}. {name} (PID: {pid}) - CPU: {cpu:.1f}% - RAM: {rss / total_memory * 100:.1f}% "
+                         f"({rss / (1024**2):.0f} MB) - E/S: {io_text} - FD: {fds_text}\n")
         
         return [types.TextContent(type="text", text=info)]
     
     except Exception as e:
-        return [types.TextContent(
-            type="text", 
-            text=f"Erreur lors de la récupération des informations système: {str(e)}"
-        )]
+        return tool_error(f"Erreur lors de la récupération des informations système: {str(e)}")
+
+def expand_targets(specs: List[str]) -> List[str]:
+    """Développe une liste d'hôtes et de réseaux CIDR en cibles individuelles."""
+    targets: List[str] = []
+    for spec in specs:
+        for item in spec.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if '/' in item:
+                network = ipaddress.ip_network(item, strict=False)
+                hosts = network.hosts() if network.num_addresses > 2 else iter(network)
+                for address in hosts:
+                    targets.append(str(address))
+                    if len(targets) > PING_SWEEP_MAX_HOSTS:
+                        raise ValueError(f"Trop d'hôtes à balayer (limite: {PING_SWEEP_MAX_HOSTS})")
+            else:
+                targets.append(item)
+    if len(targets) > PING_SWEEP_MAX_HOSTS:
+        raise ValueError(f"Trop d'hôtes à balayer (limite: {PING_SWEEP_MAX_HOSTS})")
+    return targets
+
+def ping_command(host: str, count: int, timeout: float) -> List[str]:
+    """Construit la commande ping selon l'OS."""
+    if platform.system().lower() == "windows":
+        return ["ping", "-n", str(count), "-w", str(int(timeout * 1000)), host]
+    return ["ping", "-c", str(count), "-i", "0.2", "-W", str(max(1, int(round(timeout)))), host]
 
+async def run_ping(host: str, count: int, timeout: float) -> Tuple[str, str]:
+    """Exécute ping dans un sous-processus asynchrone, sans bloquer la boucle d'événements."""
+    proc = await asyncio.create_subprocess_exec(
+        *ping_command(host, count, timeout),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=count * (timeout + 0.2) + 5)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+PING_RTT_RE = re.compile(r"(?:time|temps|durée)[=<]\s*([\d.,]+)\s*ms", re.IGNORECASE)
+
+async def probe_icmp(host: str, count: int, timeout: float) -> List[float]:
+    """Retourne les RTT (ms) des réponses ICMP obtenues pour un hôte."""
+    try:
+        stdout, _ = await run_ping(host, count, timeout)
+    except asyncio.TimeoutError:
+        return []
+    return [float(value.replace(',', '.')) for value in PING_RTT_RE.findall(stdout)]
+
+async def probe_tcp(host: str, port: int, count: int, timeout: float) -> List[float]:
+    """Retourne les RTT (ms) de connexions TCP; un refus (RST) compte comme une réponse."""
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await asyncio.wait_for(loop.getaddrinfo(host, None, type=socket.SOCK_STREAM), timeout=timeout * 5)
+    except (socket.gaierror, asyncio.TimeoutError):
+        return []
+    family, _, _, _, sockaddr = infos[0]
+    rtts = []
+    for _ in range(count):
+        for attempt in range(PORT_SCAN_MAX_ATTEMPTS):
+            state, rtt = await probe_port(sockaddr[0], family, port, timeout)
+            if state != "exhausted":
+                break
+            await asyncio.sleep(0.05 * (attempt + 1))
+        if state in ("open", "closed"):
+            rtts.append(rtt * 1000)
+    return rtts
+
+async def ping_sweep(targets: List[str], method: str, port: int, count: int, timeout: float,
+                     as_json: bool = False) -> List[Any]:
+    """Sonde plusieurs hôtes en parallèle et agrège min/moy/max/perte par hôte."""
+    semaphore = asyncio.Semaphore(PING_SWEEP_CONCURRENCY)
+    started = time.monotonic()
+    done = 0
+    
+    async def probe(target: str) -> List[float]:
+        nonlocal done
+        async with semaphore:
+            if method == "tcp":
+                rtts = await probe_tcp(target, port, count, timeout)
+            else:
+                rtts = await probe_icmp(target, count, timeout)
+        done += 1
+        await report_progress(done, len(targets), f"{target}: {'actif' if rtts else 'sans réponse'}")
+        return rtts
+    
+    all_rtts = await asyncio.gather(*(probe(target) for target in targets))
+    
+    if as_json:
+        hosts = [{"host": target,
+                  "min_ms": round(min(rtts), 2) if rtts else None,
+                  "avg_ms": round(sum(rtts) / len(rtts), 2) if rtts else None,
+                  "max_ms": round(max(rtts), 2) if rtts else None,
+                  "loss_percent": round(100.0 * (count - len(rtts)) / count, 1)}
+                 for target, rtts in zip(targets, all_rtts)]
+        return json_result({
+            "method": method, "port": port if method == "tcp" else None, "count": count,
+            "alive": sum(1 for rtts in all_rtts if rtts), "elapsed_s": round(time.monotonic() - started, 3),
+            "hosts": hosts,
+        }, paged=("hosts",))
+    
+    lines = []
+    alive = 0
+    for target, rtts in zip(targets, all_rtts):
+        loss = 100.0 * (count - len(rtts)) / count
+        if rtts:
+            alive += 1
+            lines.append(
+                f"- {target}: min/moy/max = {min(rtts):.2f}/{sum(rtts) / len(rtts):.2f}/{max(rtts):.2f} ms, perte {loss:.0f}%"
+            )
+        else:
+            lines.append(f"- {target}: aucune réponse, perte 100%")
+    
+    probe_name = f"TCP port {port}" if method == "tcp" else "ICMP"
+    header = (
+        f"Balayage {probe_name} de {len(targets)} hôtes ({count} sondes/hôte): "
+        f"{alive} actifs en {time.monotonic() - started:.2f} s\n\n"
+    )
+    return [types.TextContent(type="text", text=header + "\n".join(lines))]
+
+@register_tool("ping_host", timeout=300)
 async def ping_host(args: Dict[str, Any]) -> List[types.TextContent]:
-    """Ping un hôte pour tester la connectivité."""
-    host = args["host"]
-    count = args.get("count", 4)
+    """Ping un ou plusieurs hôtes pour tester la connectivité."""
+    host = args.get("host", "")
+    count = max(1, min(int(args.get("count", 4)), 100))
+    method = args.get("method", "icmp")
+    port = int(args.get("port", 80))
+    timeout = max(0.1, float(args.get("timeout", 1)))
     
     try:
-        # Commande ping selon l'OS
-        if platform.system().lower() == "windows":
-            cmd = ["ping", "-n", str(count), host]
-        else:
-            cmd = ["ping", "-c", str(count), host]
+        specs = ([host] if host else []) + list(args.get("hosts", []))
+        targets = expand_targets(specs)
+        if not targets:
+            raise ValueError("Aucun hôte spécifié")
         
-        result = subprocess.run(
-            cmd, 
-            capture_output=True, 
-            text=True, 
-            timeout=30
-        )
+        as_json = args.get("format") == "json"
+        if len(targets) > 1 or method == "tcp" or as_json:
+            # En JSON, un hôte unique passe aussi par le balayage: RTT extraits plutôt que sortie brute de ping
+            return await ping_sweep(targets, method, port, count, timeout, as_json)
         
-        output = f"Ping vers {host}:\n\n"
-        output += result.stdout
+        stdout, stderr = await run_ping(targets[0], count, timeout)
         
-        if result.stderr:
-            output += f"\nErreurs:\n{result.stderr}"
+        output = f"Ping vers {targets[0]}:\n\n"
+        output += stdout
+        
+        if stderr:
+            output += f"\nErreurs:\n{stderr}"
         
         return [types.TextContent(type="text", text=output)]
     
-    except subprocess.TimeoutExpired:
-        return [types.TextContent(
-            type="text", 
-            text=f"Timeout lors du ping vers {host}"
-        )]
+    except asyncio.TimeoutError:
+        return tool_error(f"Timeout lors du ping vers {host}")
+    except FileNotFoundError:
+        return tool_error("Commande ping introuvable: utilisez method='tcp' pour une sonde par connexion TCP")
     except Exception as e:
-        return [types.TextContent(
-            type="text", 
-            text=f"Erreur lors du ping: {str(e)}"
-        )]
+        return tool_error(f"Erreur lors du ping: {str(e)}")
+
+def read_file_cache_key(args: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (file_state(args["file_path"]),)
+
+READ_CURSOR_RE = re.compile(r"^([bl])(\d+)(?:\.(\d+))?-([0-9a-f]+)-([0-9a-f]+)$")
+
+def parse_read_cursor(cursor: str, st: os.stat_result) -> Tuple[bool, int, Optional[int]]:
+    """Décode un jeton de continuation de read_file: (par lignes, position, dernière ligne), vérifié contre l'état du fichier."""
+    found = READ_CURSOR_RE.match(cursor)
+    if not found:
+        raise ValueError(f"Jeton de continuation invalide: {cursor}")
+    kind, position, last_line, inode, size = found.groups()
+    # Le fichier peut avoir grandi (log en cours d'écriture), mais pas été remplacé ni tronqué
+    if int(inode, 16) != st.st_ino or st.st_size < int(size, 16):
+        raise ValueError("Le fichier a été remplacé ou tronqué depuis l'appel précédent, relancez la lecture")
+    return kind == "l", int(position), int(last_line) if last_line else None
+
+def check_line_range(start_line: Optional[int], end_line: Optional[int]) -> None:
+    """Refuse une plage de lignes qui ne vérifie pas 1 <= start_line <= end_line."""
+    if start_line is None:
+        if end_line is not None:
+            raise ValueError("end_line exige start_line")
+        return
+    if start_line < 1:
+        raise ValueError(f"start_line doit être supérieur ou égal à 1 (reçu: {start_line})")
+    if end_line is not None and end_line < start_line:
+        raise ValueError(f"end_line ({end_line}) doit être supérieur ou égal à start_line ({start_line})")
+
+HEXDUMP_PRINTABLE = bytes(b if 32 <= b < 127 else ord(".") for b in range(256))
+
+def hexdump(data: bytes, base: int) -> str:
+    """Vue hexadécimale classique: offset, 16 octets en hexadécimal, puis leur forme ASCII."""
+    lines = []
+    for i in range(0, len(data), 16):
+        chunk = data[i:i + 16]
+        lines.append(f"{base + i:08x}  {chunk[:8].hex(' '):<23}  {chunk[8:].hex(' '):<23}  "
+                     f"|{chunk.translate(HEXDUMP_PRINTABLE).decode('ascii')}|")
+    return "\n".join(lines)
+
+TEXT_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+def sniff_encoding(data: Any) -> Tuple[Optional[str], int]:
+    """Devine l'encodage d'après les premiers octets (BOM, octets NUL, validité UTF-8).
+
+    Retourne (encodage, longueur du BOM), avec None comme encodage pour un fichier binaire.
+    data est le fichier projeté en mémoire: seul le préfixe est examiné, sans copie du reste.
+    """
+    with memoryview(data) as buf:
+        prefix = buf[:READ_FILE_SNIFF_BYTES]
+        head = bytes(prefix[:4])
+        for bom, name in TEXT_BOMS:
+            if head.startswith(bom):
+                return name, len(bom)
+        if data.find(b"\x00", 0, len(prefix)) >= 0:
+            # UTF-16 sans BOM: texte ASCII avec un octet nul sur deux
+            sample = bytes(prefix[:4096])
+            even, odd = sample[0::2].count(0), sample[1::2].count(0)
+            half = len(sample) // 2
+            if odd > half * 0.3 and even < half * 0.05:
+                return "utf-16-le", 0
+            if even > half * 0.3 and odd < half * 0.05:
+                return "utf-16-be", 0
+            return None, 0
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(prefix, final=len(prefix) == len(buf))
+            return "utf-8", 0
+        except UnicodeDecodeError:
+            return "cp1252", 0
+
+def decode_window(window: memoryview, start: int, end: int, encoding: str, final: bool,
+                  fallback: bool = False, bom: int = 0) -> Tuple[str, int, str]:
+    """Décode une fenêtre d'octets découpée arbitrairement; retourne le texte, l'offset réellement consommé et l'encodage.
+
+    Les octets de continuation UTF-8 en début de fenêtre sont ignorés; en UTF-16/32, le début est
+    avancé jusqu'à la prochaine unité de code (comptée après le BOM de bom octets) et une seconde
+    moitié de paire de substitution est sautée. Un caractère coupé en fin de fenêtre est laissé pour
+    la suite. Avec fallback, une fenêtre invalide (préfixe UTF-8 valide mais suite en Windows-1252,
+    par exemple) est redécodée depuis la même mémoire, sans relire le fichier.
+    """
+    name = codecs.lookup(encoding).name
+    skip = 0
+    if start > 0 and name == "utf-8":
+        while skip < min(3, len(window)) and window[skip] & 0xC0 == 0x80:
+            skip += 1
+    elif name.startswith(("utf-16", "utf-32")):
+        unit = 4 if name.startswith("utf-32") else 2
+        skip = min(len(window), -(start - bom) % unit)
+        big_endian = name.endswith("-be") or (name in ("utf-16", "utf-32") and sys.byteorder == "big")
+        if unit == 2 and start + skip > bom and skip + 2 <= len(window):
+            high = window[skip] if big_endian else window[skip + 1]
+            if 0xDC <= high <= 0xDF:
+                skip += 2
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        with window[skip:] as chunk:
+            text = decoder.decode(chunk, final=final)
+    except UnicodeDecodeError:
+        if not fallback:
+            raise
+        return codecs.decode(window, "cp1252", errors="replace"), end, "cp1252"
+    pending = len(decoder.getstate()[0])
+    return text, end - pending, encoding
 
-async def read_file(args: Dict[str, Any]) -> List[types.TextContent]:
-    """Lit le contenu d'un fichier."""
+def render_file_window(args: Dict[str, Any], path: Path, f: BinaryIO, st: os.stat_result, data: Any) -> List[Any]:
+    """Sélectionne, décode et met en forme la fenêtre demandée d'un fichier projeté en mémoire."""
+    file_path = args["file_path"]
+    size = st.st_size
+    encoding = args.get("encoding", "auto")
+    view = args.get("view")
+    notes = []
+    
+    bom = 0
+    binary = False
+    if encoding == "auto":
+        encoding, bom = sniff_encoding(data)
+        if encoding is None:
+            binary = True
+            notes.append("fichier binaire")
+            view = view or "hex"
+            encoding = "latin-1"
+        elif encoding != "utf-8":
+            notes.append(f"encodage détecté: {encoding}")
+    view = view or "text"
+    
+    if view == "hex":
+        length = max(1, min(int(args.get("length", READ_FILE_HEX_WINDOW)), READ_FILE_MAX_HEX_WINDOW))
+    else:
+        length = max(1, min(int(args.get("length", READ_FILE_MAX_WINDOW)), READ_FILE_MAX_WINDOW))
+    as_json = args.get("format") == "json"
+    if as_json:
+        # La fenêtre doit tenir dans le budget de réponse (hexdump: ~5 caractères par octet, marge pour l'échappement)
+        length = min(length, max(16, RESPONSE_MAX_BYTES // 5 if view == "hex" else RESPONSE_MAX_BYTES * 3 // 4))
+    
+    by_lines = False
+    last_line = None
+    if args.get("cursor"):
+        by_lines, position, last_line = parse_read_cursor(args["cursor"], st)
+    elif args.get("start_line") is not None or args.get("end_line") is not None:
+        check_line_range(args.get("start_line"), args.get("end_line"))
+        by_lines, position = True, int(args["start_line"]) - 1
+        if args.get("end_line") is not None:
+            last_line = int(args["end_line"])
+    elif args.get("tail"):
+        position = max(bom, size - length)
+    else:
+        position = max(bom, int(args.get("offset", 0)))
+    
+    if by_lines:
+        if codecs.lookup(encoding).name.startswith(("utf-16", "utf-32")):
+            raise ValueError(f"Lecture par lignes impossible en {encoding}, utilisez offset et length")
+        with line_index_lock:
+            index = get_line_index(path, f, st)
+            start = max(bom, index.line_offset(f, position))
+            stop = index.line_offset(f, last_line) if last_line is not None else size
+            index.save()
+    else:
+        start, stop = min(position, size), size
+    end = min(stop, start + length)
+    if by_lines and end < stop:
+        # Fenêtre tronquée: on s'arrête à la dernière ligne complète (au moins une ligne)
+        cut = data.rfind(b"\n", start, end)
+        if cut >= 0:
+            end = cut + 1
+    
+    # Seule la fenêtre demandée est lue depuis le fichier projeté en mémoire, sans copie intermédiaire
+    with memoryview(data) as buf, buf[start:end] as window:
+        if view == "hex":
+            raw = bytes(window)
+            content = hexdump(raw, start)
+            lines_read = raw.count(b"\n")
+        else:
+            sniffed = encoding
+            content, end, encoding = decode_window(window, start, end, encoding, final=end >= size,
+                                                   fallback=args.get("encoding", "auto") == "auto", bom=bom)
+            lines_read = content.count("\n")
+            if encoding != sniffed:
+                notes.append(f"encodage détecté: {encoding}")
+    
+    if by_lines:
+        first_line = position + 1
+        shown = lines_read + (1 if end > start and data[end - 1:end] != b"\n" else 0)
+        scope = f"lignes {first_line} à {first_line + shown - 1}" if shown else f"ligne {first_line}: au-delà de la fin"
+        next_cursor = f"l{position + lines_read}" if end < stop else None
+        if next_cursor and last_line is not None:
+            next_cursor += f".{last_line}"
+    else:
+        scope = f"octets {start}-{end} sur {size}"
+        next_cursor = f"b{end}" if end < size else None
+    
+    cursor = f"{next_cursor}-{st.st_ino:x}-{size:x}" if next_cursor else None
+    if as_json:
+        return json_result({
+            "file": file_path, "size": size, "encoding": encoding, "binary": binary, "view": view,
+            "start": start, "end": end,
+            "first_line": position + 1 if by_lines else None, "line_count": shown if by_lines else None,
+            "cursor": cursor, "content": content,
+        })
+    
+    if by_lines or start > bom or end < size or view == "hex":
+        notes.insert(0, scope)
+    header = f"Contenu du fichier '{file_path}'" + (f" ({', '.join(notes)})" if notes else "")
+    result = f"{header}:\n\n{content}"
+    if cursor:
+        result += f"\n\n... (suite disponible avec cursor={cursor})"
+    return [types.TextContent(type="text", text=result)]
+
+@register_tool("read_file", kind="io", timeout=30, cache_ttl=30.0, cache_key=read_file_cache_key)
+def read_file(args: Dict[str, Any]) -> List[types.TextContent]:
+    """Lit une fenêtre d'un fichier (octets, lignes ou fin de fichier) via mmap, sans charger le reste."""
     file_path = args["file_path"]
-    encoding = args.get("encoding", "utf-8")
     
     try:
         path = Path(file_path)
         
         if not path.exists():
-            return [types.TextContent(
-                type="text", 
-                text=f"Fichier non trouvé: {file_path}"
-            )]
+            return tool_error(f"Fichier non trouvé: {file_path}")
         
         if not path.is_file():
-            return [types.TextContent(
-                type="text", 
-                text=f"Le chemin spécifié n'est pas un fichier: {file_path}"
-            )]
-        
-        # Limite de taille pour éviter les fichiers trop volumineux
-        if path.stat().st_size > 1024 * 1024:  # 1MB
-            return [types.TextContent(
-                type="text", 
-                text=f"Fichier trop volumineux (> 1MB): {file_path}"
-            )]
-        
-        with open(path, 'r', encoding=encoding) as f:
-            content = f.read()
-        
-        result = f"Contenu du fichier '{file_path}':\n\n{content}"
+            return tool_error(f"Le chemin spécifié n'est pas un fichier: {file_path}")
         
-        return [types.TextContent(type="text", text=result)]
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if st.st_size == 0:
+                return render_file_window(args, path, f, st, b"")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return render_file_window(args, path, f, st, mm)
     
     except UnicodeDecodeError:
-        return [types.TextContent(
-            type="text", 
-            text=f"Erreur d'encodage lors de la lecture de {file_path}. Essayez un autre encodage."
-        )]
+        return tool_error(f"Erreur d'encodage lors de la lecture de {file_path} en {args.get('encoding')}. Essayez encoding=auto pour la détection automatique.")
     except Exception as e:
-        return [types.TextContent(
-            type="text", 
-            text=f"Erreur lors de la lecture du fichier: {str(e)}"
-        )]
+        return tool_error(f"Erreur lors de la lecture du fichier: {str(e)}")
+
+def http_request_cache_key(args: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    # Seules les lectures sans corps sont rejouables; un corps enregistré sur disque reste propre à l'appel
+    if args.get("method", "GET").upper() not in ("GET", "HEAD") or args.get("data") or args.get("spill"):
+        return None
+    return ()
 
+@register_tool("http_request", cache_ttl=5.0, cache_key=http_request_cache_key)
 async def http_request(args: Dict[str, Any]) -> List[types.TextContent]:
     """Exécute une requête HTTP."""
     url = args["url"]
     method = args.get("method", "GET")
     headers = args.get("headers", {})
     data = args.get("data")
+    spill = bool(args.get("spill", False))
+    max_bytes = int(args.get("max_bytes", HTTP_SPILL_MAX_BYTES if spill else HTTP_MAX_BODY_BYTES))
+    max_bytes = max(0, min(max_bytes, HTTP_SPILL_MAX_BYTES))
+    preview_chars = max(0, int(args.get("preview_chars", 1000)))
+    hash_name = args.get("hash")
+    index_page = bool(args.get("index", SEARCH_INDEX_HTTP))
+    as_json = args.get("format") == "json"
+    if as_json:
+        preview_chars = min(preview_chars, RESPONSE_MAX_BYTES // 2)
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.request(
-                method=method,
-                url=url,
-                headers=headers,
-                data=data,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                content = await response.text()
-                
-                result = f"""Requête HTTP {method} vers {url}:
+        if spill:
+            require_process_state("spill")
+        session = await http_pool.start()
+        async with session.request(
+            method=method,
+            url=url,
+            headers=headers,
+            data=data,
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            body_id = spill_path = None
+            if spill:
+                body_id, spill_path = body_store.create(url, response.charset or "utf-8")
+            content_type = response.content_type or ""
+            indexable = (index_page and method.upper() == "GET" and response.status == 200
+                         and content_type in SEARCH_INDEXED_TYPES)
+            # Pour l'index de recherche, on décode davantage que l'aperçu affiché
+            captured_chars = max(preview_chars, SEARCH_INDEX_MAX_CHARS) if indexable else preview_chars
+            body = await read_body(response, max_bytes, captured_chars, hash_name, spill_path)
+            if body_id:
+                body_store.entries[body_id]["size"] = body["size"]
+            if indexable:
+                try:
+                    await run_io(search_index.add_page, str(response.url), content_type, body["preview"])
+                except Exception as e:
+                    logger.warning(f"Indexation de {url} impossible: {e}")
+            preview = body["preview"][:preview_chars]
+            
+            if as_json:
+                headers_out: Dict[str, str] = {}
+                for key, value in response.headers.items():
+                    headers_out[key] = f"{headers_out[key]}, {value}" if key in headers_out else value
+                return json_result({
+                    "url": url, "method": method, "status": response.status, "reason": response.reason,
+                    "headers": headers_out, "size": body["size"], "truncated": body["truncated"],
+                    "digest": body["digest"], "body_id": body_id, "preview": preview,
+                })
+            
+            result = f"""Requête HTTP {method} vers {url}:
 Status: {response.status} {response.reason}
 Headers de réponse:
 """
-                for key, value in response.headers.items():
-                    result += f"  {key}: {value}\n"
-                
-                result += f"\nContenu (premiers 1000 caractères):\n{content[:1000]}"
-                
-                if len(content) > 1000:
-                    result += f"\n... (contenu tronqué, {len(content)} caractères au total)"
-                
-                return [types.TextContent(type="text", text=result)]
+            for key, value in response.headers.items():
+                result += f"  {key}: {value}\n"
+            
+            result += f"\nContenu (premiers {preview_chars} caractères):\n{preview}"
+            
+            if body["truncated"]:
+                result += f"\n... (contenu tronqué: limite de {max_bytes} octets atteinte, connexion fermée)"
+            elif len(preview) >= preview_chars and body["size"] > len(preview):
+                result += "\n... (contenu tronqué)"
+            
+            result += f"\n\nTaille lue: {body['size']} octets"
+            if body["digest"]:
+                result += f"\n{hash_name.upper()}: {body['digest']}"
+            if body_id:
+                result += f"\nCorps enregistré: body_id={body_id} (à relire avec l'outil http_body)"
+            
+            return [types.TextContent(type="text", text=result)]
     
     except asyncio.TimeoutError:
-        return [types.TextContent(
-            type="text", 
-            text=f"Timeout lors de la requête vers {url}"
-        )]
+        return tool_error(f"Timeout lors de la requête vers {url}")
     except Exception as e:
-        return [types.TextContent(
-            type="text", 
-            text=f"Erreur lors de la requête HTTP: {str(e)}"
-        )]
+        return tool_error(f"Erreur lors de la requête HTTP: {str(e)}")
+
+@register_tool("http_body", kind="io", timeout=30)
+def http_body(args: Dict[str, Any]) -> List[types.TextContent]:
+    """Relit une portion d'un corps HTTP enregistré sur disque."""
+    body_id = args["body_id"]
+    offset = max(0, int(args.get("offset", 0)))
+    length = max(0, min(int(args.get("length", 65536)), 1024 * 1024))
+    if args.get("format") == "json":
+        length = min(length, RESPONSE_MAX_BYTES * 3 // 4)
+    
+    try:
+        entry = body_store.get(body_id)
+        with open(entry["path"], "rb") as f:
+            f.seek(offset)
+            chunk = f.read(length)
+        
+        end = offset + len(chunk)
+        if args.get("format") == "json":
+            return json_result({
+                "body_id": body_id, "url": entry["url"], "start": offset, "end": end, "size": entry["size"],
+                "next_offset": end if end < entry["size"] else None,
+                "content": chunk.decode(entry["charset"], errors="replace"),
+            })
+        result = f"Corps {body_id} ({entry['url']}), octets {offset}-{end} sur {entry['size']}:\n\n"
+        result += chunk.decode(entry["charset"], errors="replace")
+        if end < entry["size"]:
+            result += f"\n\n... (suite disponible avec offset={end})"
+        
+        return [types.TextContent(type="text", text=result)]
+    
+    except Exception as e:
+        return tool_error(f"Erreur lors de la lecture du corps HTTP: {str(e)}")
 
+def parse_ports(ports_str: str) -> List[int]:
+    """Convertit une spécification de ports ('22,80,8000-8100') en liste sans doublons."""
+    ports: List[int] = []
+    seen = set()
+    for part in ports_str.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = map(int, part.split('-', 1))
+        else:
+            start = end = int(part)
+        if not (1 <= start <= end <= 65535):
+            raise ValueError(f"Plage de ports invalide: {part}")
+        for port in range(start, end + 1):
+            if port not in seen:
+                seen.add(port)
+                ports.append(port)
+    return ports
+
+class AdaptiveTimeout:
+    """Timeout par port calculé à partir du RTT observé (à la manière de TCP, RFC 6298)."""
+
+    def __init__(self, initial: float, minimum: float = PORT_SCAN_MIN_TIMEOUT):
+        self.initial = initial
+        self.minimum = min(minimum, initial)
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+
+    def observe(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    @property
+    def value(self) -> float:
+        if self.srtt is None:
+            return self.initial
+        return max(self.minimum, min(self.initial, self.srtt + 4 * self.rttvar))
+
+async def probe_port(ip: str, family: int, port: int, timeout: float) -> Tuple[str, float]:
+    """Tente une connexion TCP et retourne (état, RTT).
+
+    États: open, closed (refus ou RST de la cible), filtered (sans réponse), unreachable, exhausted
+    (ressources locales épuisées: rien n'est appris sur la cible) et error (autre erreur locale).
+    """
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    try:
+        transport, _ = await asyncio.wait_for(
+            loop.create_connection(asyncio.Protocol, ip, port, family=family),
+            timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        return "filtered", timeout
+    except (ConnectionRefusedError, ConnectionResetError):
+        return "closed", time.monotonic() - start
+    except OSError as e:
+        if e.errno in (errno.EHOSTUNREACH, errno.ENETUNREACH):
+            return "unreachable", time.monotonic() - start
+        if e.errno in PORT_SCAN_EXHAUSTED_ERRNOS:
+            return "exhausted", time.monotonic() - start
+        return "error", time.monotonic() - start
+    transport.close()
+    return "open", time.monotonic() - start
+
+@register_tool("port_scan", concurrency=4, timeout=600)
 async def port_scan(args: Dict[str, Any]) -> List[types.TextContent]:
     """Scanne les ports d'un hôte."""
     host = args["host"]
     ports_str = args.get("ports", "22,23,25,53,80,110,443,993,995")
+    concurrency = max(1, min(int(args.get("concurrency", PORT_SCAN_CONCURRENCY)), 4096))
+    initial_timeout = max(0.05, float(args.get("timeout", PORT_SCAN_TIMEOUT)))
+    # Le budget reste sous le délai de l'outil, qui ferait perdre les résultats déjà obtenus
+    budget = max(1.0, min(float(args.get("budget", PORT_SCAN_BUDGET)), tool_registry["port_scan"].timeout * 0.9))
     
     try:
-        # Parse les ports
-        ports = []
-        for part in ports_str.split(','):
-            if '-' in part:
-                start, end = map(int, part.split('-'))
-                ports.extend(range(start, end + 1))
-            else:
-                ports.append(int(part))
+        ports = parse_ports(ports_str)
         
-        # Limite le nombre de ports pour éviter les scans trop longs
-        if len(ports) > 100:
-            ports = ports[:100]
+        # Limite le nombre de ports (signalée dans le résultat plutôt que silencieuse)
+        skipped = 0
+        if len(ports) > PORT_SCAN_MAX_PORTS:
+            skipped = len(ports) - PORT_SCAN_MAX_PORTS
+            ports = ports[:PORT_SCAN_MAX_PORTS]
         
-        open_ports = []
-        closed_ports = []
+        # Résolution DNS unique pour tout le scan
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(host, None, type=socket.SOCK_STREAM),
+                timeout=initial_timeout * 5
+            )
+        except (socket.gaierror, asyncio.TimeoutError) as e:
+            return tool_error(f"Impossible de résoudre l'hôte {host}: {e}")
+        family, _, _, _, sockaddr = infos[0]
+        ip = sockaddr[0]
         
-        for port in ports:
+        timeouts = AdaptiveTimeout(initial_timeout)
+        results: Dict[str, List[int]] = {"open": [], "closed": [], "filtered": [], "unreachable": [], "error": []}
+        queue = deque(ports)
+        attempts: Dict[int, int] = {}
+        started = time.monotonic()
+        deadline = started + budget
+        abort = asyncio.Event()
+        done = 0
+        active = running = min(concurrency, len(ports))
+        
+        async def worker() -> None:
+            nonlocal running
             try:
-                # Test de connexion rapide
-                reader, writer = await asyncio.wait_for(
-                    asyncio.open_connection(host, port),
-                    timeout=2.0
-                )
-                writer.close()
-                await writer.wait_closed()
-                open_ports.append(port)
-            except:
-                closed_ports.append(port)
-        
-        result = f"Scan de ports pour {host}:\n\n"
+                await scan()
+            finally:
+                running -= 1
+        
+        async def scan() -> None:
+            nonlocal done, active
+            while queue:
+                remaining = deadline - time.monotonic()
+                if abort.is_set() or remaining <= 0:
+                    return
+                port = queue.popleft()
+                state, rtt = await probe_port(ip, family, port, min(timeouts.value, remaining))
+                if state == "exhausted":
+                    attempts[port] = attempts.get(port, 0) + 1
+                    if attempts[port] < PORT_SCAN_MAX_ATTEMPTS:
+                        # Trop de connexions simultanées pour les limites locales: le port est repris
+                        # plus tard et ce worker s'arrête, ce qui réduit la concurrence
+                        queue.append(port)
+                        if running > 1:
+                            active -= 1
+                            return
+                        await asyncio.sleep(0.05 * attempts[port])
+                        continue
+                    state = "error"
+                if state in ("open", "closed"):
+                    timeouts.observe(rtt)
+                results[state].append(port)
+                done += 1
+                if state == "unreachable":
+                    # Hôte injoignable: inutile de poursuivre
+                    abort.set()
+                elif state == "open":
+                    await report_progress(done, len(ports), f"Port {port} ouvert")
+                elif done % max(1, len(ports) // 20) == 0:
+                    await report_progress(done, len(ports))
+        
+        workers = [asyncio.create_task(worker()) for _ in range(active)]
+        try:
+            await asyncio.wait_for(asyncio.gather(*workers), timeout=budget + initial_timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for task in workers:
+                task.cancel()
+        
+        elapsed = time.monotonic() - started
+        open_ports = sorted(results["open"])
+        closed_ports = sorted(results["closed"])
+        filtered_ports = sorted(results["filtered"])
+        error_ports = sorted(results["error"])
+        not_scanned = len(ports) - done
+        
+        if args.get("format") == "json":
+            return json_result({
+                "host": host, "ip": ip, "tested": done, "elapsed_s": round(elapsed, 3),
+                "timeout_ms": round(timeouts.value * 1000), "closed_count": len(closed_ports),
+                "filtered_count": len(filtered_ports), "unreachable": bool(results["unreachable"]),
+                "errors": error_ports[:100], "error_count": len(error_ports), "concurrency": active,
+                "not_scanned": not_scanned, "skipped": skipped, "open": open_ports,
+            }, paged=("open",))
+        
+        result = f"Scan de ports pour {host} ({ip}):\n\n"
         result += f"Ports ouverts ({len(open_ports)}): {', '.join(map(str, open_ports))}\n"
         result += f"Ports fermés ({len(closed_ports)}): {', '.join(map(str, closed_ports[:20]))}"
         
         if len(closed_ports) > 20:
             result += f" ... et {len(closed_ports) - 20} autres"
         
+        result += f"\nPorts filtrés/sans réponse ({len(filtered_ports)}): {', '.join(map(str, filtered_ports[:20]))}"
+        if len(filtered_ports) > 20:
+            result += f" ... et {len(filtered_ports) - 20} autres"
+        
+        if error_ports:
+            result += (f"\nPorts non déterminés, erreur locale ({len(error_ports)}): "
+                       f"{', '.join(map(str, error_ports[:20]))}")
+            if len(error_ports) > 20:
+                result += f" ... et {len(error_ports) - 20} autres"
+        
+        result += f"\n\n{done} ports testés en {elapsed:.2f} s (timeout adaptatif final: {timeouts.value * 1000:.0f} ms)"
+        if active < concurrency and active < len(ports):
+            result += f"\nConcurrence réduite à {active} (limites locales de descripteurs ou de ports atteintes)"
+        if results["unreachable"]:
+            result += "\nHôte injoignable: scan interrompu."
+        if not_scanned:
+            result += f"\n{not_scanned} ports non testés (budget de {budget:.0f} s épuisé ou scan interrompu)"
+        if skipped:
+            result += f"\n{skipped} ports ignorés (limite de {PORT_SCAN_MAX_PORTS} ports par scan)"
+        
         return [types.TextContent(type="text", text=result)]
     
     except Exception as e:
-        return [types.TextContent(
-            type="text", 
-            text=f"Erreur lors du scan de ports: {str(e)}"
-        )]
+        return tool_error(f"Erreur lors du scan de ports: {str(e)}")
+
+class LineIndex:
+    """Index clairsemé des débuts de ligne d'un fichier (un point de reprise environ toutes les K lignes).
+
+    L'index est persisté dans un fichier annexe (MCP_LINE_INDEX_DIR) identifié par le chemin
+    du fichier, et validé par inode, taille, mtime et empreintes du début du fichier et des
+    derniers octets indexés.
+    """
+
+    def __init__(self, path: Path, st: os.stat_result, step: int = LINE_INDEX_STEP):
+        self.path = path
+        self.step = step
+        self.reset(st)
+
+    def reset(self, st: os.stat_result) -> None:
+        self.inode = st.st_ino
+        self.size = st.st_size
+        self.mtime = st.st_mtime_ns
+        self.fingerprint = hashlib.sha1(b"").hexdigest()
+        self.fingerprint_len = 0
+        self.boundary = hashlib.sha1(b"").hexdigest()
+        self.boundary_len = 0
+        self.offsets = [0]       # offsets des points de reprise (toujours des débuts de ligne)
+        self.lines = [0]         # nombre de lignes précédant chaque point de reprise
+        self.indexed = 0         # octets déjà parcourus
+        self.indexed_lines = 0   # sauts de ligne rencontrés avant self.indexed
+        self.dirty = True
+
+    @staticmethod
+    def sidecar_path(path: Path) -> Path:
+        digest = hashlib.sha1(str(path).encode()).hexdigest()
+        return Path(LINE_INDEX_DIR) / f"{digest}.json"
+
+    @classmethod
+    def load(cls, path: Path, st: os.stat_result) -> "LineIndex":
+        """Charge l'index persisté s'il existe, sinon crée un index vide."""
+        index = cls(path, st)
+        try:
+            with open(cls.sidecar_path(path), "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state["path"] == str(path) and state["step"] == index.step:
+                for key in ("inode", "size", "mtime", "fingerprint", "fingerprint_len", "boundary",
+                            "boundary_len", "offsets", "lines", "indexed", "indexed_lines"):
+                    setattr(index, key, state[key])
+                index.dirty = False
+        except (OSError, ValueError, KeyError):
+            pass
+        return index
+
+    def save(self) -> None:
+        """Écrit l'index de façon atomique s'il a changé."""
+        if not self.dirty:
+            return
+        target = self.sidecar_path(self.path)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({
+                    "path": str(self.path), "step": self.step, "inode": self.inode,
+                    "size": self.size, "mtime": self.mtime, "fingerprint": self.fingerprint,
+                    "fingerprint_len": self.fingerprint_len, "boundary": self.boundary,
+                    "boundary_len": self.boundary_len, "offsets": self.offsets,
+                    "lines": self.lines, "indexed": self.indexed, "indexed_lines": self.indexed_lines,
+                }, f, separators=(",", ":"))
+            os.replace(tmp, target)
+            self.dirty = False
+        except OSError as e:
+            logger.warning(f"Impossible d'enregistrer l'index de lignes de {self.path}: {e}")
+
+    def validate(self, f: BinaryIO, st: os.stat_result) -> None:
+        """Reconstruit l'index si le fichier a été remplacé (rotation), tronqué ou réécrit."""
+        if (st.st_ino, st.st_size, st.st_mtime_ns) == (self.inode, self.size, self.mtime):
+            return
+        if st.st_ino != self.inode or st.st_size < self.indexed:
+            logger.info(f"Rotation ou troncature détectée pour {self.path}, reconstruction de l'index")
+            self.reset(st)
+        else:
+            f.seek(0)
+            head = f.read(self.fingerprint_len)
+            f.seek(self.indexed - self.boundary_len)
+            boundary = f.read(self.boundary_len)
+            if (hashlib.sha1(head).hexdigest() != self.fingerprint
+                    or hashlib.sha1(boundary).hexdigest() != self.boundary):
+                logger.info(f"Contenu de {self.path} réécrit, reconstruction de l'index")
+                self.reset(st)
+        if self.fingerprint_len < LINE_INDEX_FINGERPRINT_BYTES and st.st_size > self.fingerprint_len:
+            f.seek(0)
+            head = f.read(LINE_INDEX_FINGERPRINT_BYTES)
+            self.fingerprint = hashlib.sha1(head).hexdigest()
+            self.fingerprint_len = len(head)
+        self.size = st.st_size
+        self.mtime = st.st_mtime_ns
+        self.dirty = True
+
+    def extend(self, f: BinaryIO, upto: int, until_line: Optional[int] = None) -> None:
+        """Étend l'index jusqu'à l'offset upto (ou jusqu'à until_line lignes) en ne comptant que les sauts de ligne."""
+        offset = self.indexed
+        lines = self.indexed_lines
+        f.seek(offset)
+        block = b""
+        while offset < upto and (until_line is None or lines < until_line):
+            block = f.read(min(LOG_BLOCK_SIZE, upto - offset))
+            if not block:
+                break
+            count = block.count(b"\n")
+            if count:
+                lines += count
+                if lines - self.lines[-1] >= self.step:
+                    self.offsets.append(offset + block.rfind(b"\n") + 1)
+                    self.lines.append(lines)
+            offset += len(block)
+        if offset != self.indexed:
+            self.indexed = offset
+            self.indexed_lines = lines
+            # Empreinte des derniers octets indexés pour détecter une troncature suivie d'une réécriture
+            if len(block) < LINE_INDEX_FINGERPRINT_BYTES:
+                f.seek(max(0, offset - LINE_INDEX_FINGERPRINT_BYTES))
+                block = f.read(offset - max(0, offset - LINE_INDEX_FINGERPRINT_BYTES))
+            tail = block[-LINE_INDEX_FINGERPRINT_BYTES:]
+            self.boundary = hashlib.sha1(tail).hexdigest()
+            self.boundary_len = len(tail)
+            self.dirty = True
+
+    def line_number_at(self, f: BinaryIO, offset: int) -> int:
+        """Retourne le nombre de lignes précédant offset, en repartant du point de reprise le plus proche."""
+        if offset >= self.indexed:
+            self.extend(f, offset)
+            return self.indexed_lines
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        position = self.offsets[i]
+        lines = self.lines[i]
+        f.seek(position)
+        while position < offset:
+            block = f.read(min(LOG_BLOCK_SIZE, offset - position))
+            if not block:
+                break
+            lines += block.count(b"\n")
+            position += len(block)
+        return lines
+
+    def line_offset(self, f: BinaryIO, line: int) -> int:
+        """Retourne l'offset du début de la ligne line (0-based), ou la taille du fichier s'il en compte moins."""
+        if line >= self.indexed_lines:
+            self.extend(f, self.size, until_line=line + 1)
+        i = bisect.bisect_right(self.lines, line) - 1
+        position = self.offsets[i]
+        to_skip = line - self.lines[i]
+        f.seek(position)
+        while to_skip:
+            block = f.read(LOG_BLOCK_SIZE)
+            if not block:
+                return position
+            count = block.count(b"\n")
+            if count < to_skip:
+                to_skip -= count
+                position += len(block)
+                continue
+            found = -1
+            for _ in range(to_skip):
+                found = block.index(b"\n", found + 1)
+            return position + found + 1
+        return position
+
+    def read_lines(self, f: BinaryIO, first: int, count: int) -> List[bytes]:
+        """Lit count lignes à partir de la ligne first (0-based) en O(plage) grâce aux points de reprise."""
+        if first >= self.indexed_lines:
+            self.extend(f, self.size, until_line=first + 1)
+        i = bisect.bisect_right(self.lines, first) - 1
+        f.seek(self.offsets[i])
+        to_skip = first - self.lines[i]
+        result: List[bytes] = []
+        pending = b""
+        while len(result) < count:
+            block = f.read(LOG_BLOCK_SIZE)
+            if not block:
+                if pending and to_skip == 0:
+                    result.append(pending)
+                break
+            parts = (pending + block).split(b"\n")
+            pending = parts.pop()
+            if to_skip:
+                skipped = min(to_skip, len(parts))
+                del parts[:skipped]
+                to_skip -= skipped
+            result.extend(parts[:count - len(result)])
+        return result
+
+line_indexes: "OrderedDict[str, LineIndex]" = OrderedDict()
+line_index_lock = threading.RLock()  # les index sont lus et étendus depuis le pool d'E/S
 
+def get_line_index(path: Path, f: BinaryIO, st: os.stat_result) -> LineIndex:
+    """Retourne l'index de lignes d'un fichier (cache LRU puis index persisté), validé contre son état actuel."""
+    path = path.resolve()
+    key = str(path)
+    index = line_indexes.get(key)
+    if index is None:
+        index = LineIndex.load(path, st)
+        line_indexes[key] = index
+        while len(line_indexes) > LINE_INDEX_MAX_FILES:
+            line_indexes.popitem(last=False)
+    else:
+        line_indexes.move_to_end(key)
+    index.validate(f, st)
+    return index
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compile_pattern(pattern: str) -> "re.Pattern[str]":
+    """Compile un pattern insensible à la casse (cache LRU partagé entre les appels)."""
+    return re.compile(pattern, re.IGNORECASE)
+
+class PatternMatcher:
+    """Recherche de plusieurs patterns en une seule passe, insensible à la casse.
+
+    Chaque pattern sans métacaractère est cherché par simple sous-chaîne; les expressions
+    régulières sont combinées en une alternance à groupes nommés, testée une seule fois par
+    ligne, sauf celles à références arrière (renumérotées dans l'alternance), testées à part.
+    """
+
+    def __init__(self, patterns: Tuple[str, ...]):
+        self.patterns = patterns
+        self.literals: List[Tuple[int, str]] = []
+        self.separate: List[Tuple[int, "re.Pattern[str]"]] = []
+        self.grouped: List[Tuple[int, "re.Pattern[str]"]] = []
+        self.combined: Optional["re.Pattern[str]"] = None
+        for i, pattern in enumerate(patterns):
+            if not REGEX_METACHARACTERS.intersection(pattern):
+                self.literals.append((i, pattern.lower()))
+            elif BACKREFERENCE_RE.search(pattern):
+                self.separate.append((i, compile_pattern(pattern)))
+            else:
+                self.grouped.append((i, compile_pattern(pattern)))
+        if len(self.grouped) > 1:
+            try:
+                self.combined = compile_pattern("|".join(f"(?P<p{i}>{patterns[i]})" for i, _ in self.grouped))
+            except re.error:
+                # Patterns incompatibles dans une alternance (groupes homonymes, drapeaux en ligne...)
+                self.combined = None
+        if self.combined is None:
+            self.separate.extend(self.grouped)
+            self.grouped = []
+
+    def match(self, line: str) -> List[int]:
+        """Retourne les indices des patterns trouvés dans la ligne."""
+        if not self.separate and self.combined is None:
+            lowered = line.lower()
+            return [i for i, literal in self.literals if literal in lowered]
+        found = []
+        if self.literals:
+            lowered = line.lower()
+            found = [i for i, literal in self.literals if literal in lowered]
+        found.extend(i for i, regex in self.separate if regex.search(line))
+        if self.combined is not None:
+            hit = self.combined.search(line)
+            if hit is not None:
+                first = int(hit.lastgroup[1:])
+                found.extend(i for i, regex in self.grouped if i == first or regex.search(line))
+        if len(found) > 1:
+            found.sort()
+        return found
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def get_matcher(patterns: Tuple[str, ...]) -> PatternMatcher:
+    """Retourne le matcher (cache LRU) d'un ensemble de patterns."""
+    return PatternMatcher(patterns)
+
+def tail_lines(f: BinaryIO, size: int, count: int) -> Tuple[int, List[bytes]]:
+    """Lit les count dernières lignes en remontant depuis la fin par blocs; retourne (offset de début, lignes)."""
+    if count <= 0 or size == 0:
+        return size, []
+    blocks: List[bytes] = []
+    newlines = 0
+    position = size
+    f.seek(size - 1)
+    trailing = 1 if f.read(1) == b"\n" else 0
+    # Il faut count sauts de ligne (en plus du saut final éventuel) pour isoler count lignes
+    while position > 0 and newlines < count + trailing:
+        read_size = min(LOG_BLOCK_SIZE, position)
+        position -= read_size
+        f.seek(position)
+        block = f.read(read_size)
+        blocks.append(block)
+        newlines += block.count(b"\n")
+    data = b"".join(reversed(blocks))
+    body = data[:-1] if trailing else data
+    lines = body.split(b"\n")[-count:]
+    start = position + len(body) - len(b"\n".join(lines))
+    return start, lines
+
+MONTHS = {m: i for i, m in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+ISO_TIMESTAMP_RE = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d+))?\s?(Z|[+-]\d{2}:?\d{2})?")
+SYSLOG_TIMESTAMP_RE = re.compile(r"^([A-Z][a-z]{2}) +(\d{1,2}) (\d{2}):(\d{2}):(\d{2})")
+CLF_TIMESTAMP_RE = re.compile(r"\[(\d{2})/([A-Z][a-z]{2})/(\d{4}):(\d{2}):(\d{2}):(\d{2}) ([+-]\d{4})\]")
+
+@functools.lru_cache(maxsize=4096)
+def timestamp_value(kind: str, text: str, year: int) -> Optional[float]:
+    """Convertit un horodatage déjà repéré en epoch (cache: les lignes voisines partagent souvent la même seconde)."""
+    try:
+        if kind == "iso":
+            found = ISO_TIMESTAMP_RE.match(text)
+            year_s, month, day, hour, minute, second, fraction, tz = found.groups()
+            tzinfo = None
+            if tz:
+                tzinfo = datetime.strptime("+0000" if tz == "Z" else tz.replace(":", ""), "%z").tzinfo
+            stamp = datetime(int(year_s), int(month), int(day), int(hour), int(minute), int(second), tzinfo=tzinfo)
+            return stamp.timestamp() + (float("0." + fraction) if fraction else 0.0)
+        if kind == "syslog":
+            found = SYSLOG_TIMESTAMP_RE.match(text)
+            month = MONTHS.get(found.group(1).lower())
+            if month is None:
+                return None
+            return datetime(year, month, int(found.group(2)), int(found.group(3)),
+                            int(found.group(4)), int(found.group(5))).timestamp()
+        found = CLF_TIMESTAMP_RE.match(text)
+        return datetime.strptime(" ".join(found.groups()), "%d %b %Y %H %M %S %z").timestamp()
+    except ValueError:
+        return None
+
+def find_timestamp(line: str, default_year: Optional[int] = None) -> Tuple[Optional[float], int, int]:
+    """Repère l'horodatage d'une ligne (ISO 8601, syslog ou Apache/nginx); retourne (epoch, début, fin)."""
+    year = default_year or datetime.now().year
+    for kind, found in (("iso", ISO_TIMESTAMP_RE.search(line, 0, 64)),
+                        ("syslog", SYSLOG_TIMESTAMP_RE.match(line)),
+                        ("clf", CLF_TIMESTAMP_RE.search(line, 0, 128))):
+        if found:
+            return timestamp_value(kind, found.group(0), year), found.start(), found.end()
+    return None, 0, 0
+
+def parse_timestamp(line: str, default_year: Optional[int] = None) -> Optional[float]:
+    """Extrait l'horodatage (epoch) d'une ligne de log."""
+    return find_timestamp(line, default_year)[0]
+
+def open_log_stream(path: str) -> BinaryIO:
+    """Ouvre un fichier de log en flux binaire, en décompressant les rotations .gz/.bz2/.xz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith((".xz", ".lzma")):
+        return lzma.open(path, "rb")
+    return open(path, "rb")
+
+class LogLines:
+    """Lignes d'un flux de log lues par blocs de LOG_BLOCK_SIZE (sans le saut de ligne final).
+
+    La mémoire reste bornée quelle que soit la longueur des lignes (tronquées à LOG_MAX_LINE_BYTES)
+    et le délai est vérifié à chaque bloc lu: complete passe à False s'il est dépassé.
+    """
+
+    def __init__(self, f: BinaryIO, deadline: float, head: bytes = b""):
+        self.f = f
+        self.deadline = deadline
+        self.head = head
+        self.complete = True
+
+    def __iter__(self) -> Iterator[bytes]:
+        pending = b""
+        block = self.head
+        while True:
+            if block:
+                lines = (pending + block).split(b"\n")
+                pending = lines.pop()[:LOG_MAX_LINE_BYTES]
+                for line in lines:
+                    yield line[:LOG_MAX_LINE_BYTES]
+            if time.time() > self.deadline:
+                self.complete = False
+                return
+            block = self.f.read(LOG_BLOCK_SIZE)
+            if not block:
+                break
+        if pending:
+            yield pending
+
+def open_text_log(path: str, deadline: float) -> Optional[Tuple[BinaryIO, LogLines]]:
+    """Ouvre un log pour un parcours complet; None si le contenu est binaire (wtmp, lastlog, *.journal...)."""
+    f = open_log_stream(path)
+    try:
+        head = f.read(READ_FILE_SNIFF_BYTES)
+        if head and sniff_encoding(head)[0] is None:
+            f.close()
+            return None
+    except BaseException:
+        f.close()
+        raise
+    return f, LogLines(f, deadline, head)
+
+def search_log_file(path: str, patterns: Tuple[str, ...], max_matches: int, deadline: float) -> Dict[str, Any]:
+    """Recherche les patterns dans un fichier complet (exécuté dans le pool de processus).
+
+    Seules les max_matches dernières correspondances sont conservées et horodatées; une
+    ligne sans horodatage hérite de celui de la correspondance précédente.
+    """
+    matcher = get_matcher(patterns)
+    hits = [0] * len(patterns)
+    kept: deque = deque(maxlen=max_matches)
+    opened = open_text_log(path, deadline)
+    if opened is None:
+        return {"path": path, "hits": hits, "matches": [], "complete": True, "binary": True}
+    f, lines = opened
+    with f:
+        for line_no, raw in enumerate(lines, 1):
+            line = raw.decode("utf-8", errors="ignore")
+            found = matcher.match(line)
+            if not found:
+                continue
+            for j in found:
+                hits[j] += 1
+            kept.append((line_no, line.strip()))
+    year = datetime.fromtimestamp(os.stat(path).st_mtime).year
+    timestamp = float("-inf")
+    matches = []
+    for line_no, text in kept:
+        timestamp = parse_timestamp(text, year) or timestamp
+        matches.append((timestamp, path, line_no, text))
+    return {"path": path, "hits": hits, "matches": matches, "complete": lines.complete, "binary": False}
+
+# Seuls les mots contenant un chiffre sont examinés, puis classés par l'alternative qui les reconnaît
+TEMPLATE_TOKEN_RE = re.compile(r"[\w.:-]*\d[\w.:-]*")
+TEMPLATE_CLASS_RE = re.compile(
+    r"(?P<UUID>[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"
+    r"|(?P<IP>(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?)"
+    r"|(?P<MAC>(?:[0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2})"
+    r"|(?P<HEX>0x[0-9a-fA-F]+|[0-9a-fA-F]{12,})"
+    r"|(?P<NUM>\d+(?:\.\d+)?)"
+)
+TEMPLATE_DIGITS_RE = re.compile(r"\d+(?:\.\d+)?")
+
+def template_mask(found: "re.Match[str]") -> str:
+    token = found.group(0)
+    core = token.rstrip(".:-")
+    found = TEMPLATE_CLASS_RE.fullmatch(core)
+    if found:
+        return f"<{found.lastgroup}>" + token[len(core):]
+    return TEMPLATE_DIGITS_RE.sub("<NUM>", token)
+
+def message_template(line: str, start: int = 0, end: int = 0) -> str:
+    """Réduit une ligne à son modèle: horodatage retiré, UUID, IP, hexadécimaux et nombres masqués."""
+    if end:
+        line = line[:start] + line[end:]
+    return " ".join(TEMPLATE_TOKEN_RE.sub(template_mask, line).split())
+
+class SpaceSaving:
+    """Comptage approximatif des éléments les plus fréquents en mémoire bornée (algorithme Space-Saving)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.heap: List[Tuple[int, str]] = []  # minimum paresseux: les entrées périmées sont remises à jour au dépilage
+
+    def add(self, key: str, count: int = 1) -> None:
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+            heapq.heappush(self.heap, (count, key))
+            return
+        while True:
+            minimum, victim = heapq.heappop(self.heap)
+            if self.counts[victim] == minimum:
+                break
+            heapq.heappush(self.heap, (self.counts[victim], victim))
+        del self.counts[victim]
+        del self.errors[victim]
+        self.counts[key] = minimum + count
+        self.errors[key] = minimum
+        heapq.heappush(self.heap, (minimum + count, key))
+
+    def merge(self, counts: Dict[str, int], errors: Dict[str, int]) -> None:
+        for key, count in counts.items():
+            if key in self.counts:
+                self.counts[key] += count
+                self.errors[key] += errors.get(key, 0)
+            else:
+                self.add(key, count)
+                self.errors[key] += errors.get(key, 0)
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """Retourne les k éléments les plus fréquents avec (compte, erreur maximale)."""
+        return [(key, count, self.errors[key])
+                for key, count in heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])]
+
+def aggregate_log_file(path: str, patterns: Tuple[str, ...], bucket_seconds: int, capacity: int,
+                       deadline: float) -> Dict[str, Any]:
+    """Agrège un fichier en une passe (exécuté dans le pool de processus): histogramme et modèles fréquents."""
+    matcher = get_matcher(patterns) if patterns else None
+    histogram: Dict[int, int] = {}
+    templates = SpaceSaving(capacity)
+    year = datetime.fromtimestamp(os.stat(path).st_mtime).year
+    scanned = matched = untimed = 0
+    opened = open_text_log(path, deadline)
+    if opened is None:
+        return {"path": path, "histogram": histogram, "counts": {}, "errors": {}, "scanned": 0, "matched": 0,
+                "untimed": 0, "complete": True, "binary": True}
+    f, lines = opened
+    with f:
+        for raw in lines:
+            scanned += 1
+            line = raw.decode("utf-8", errors="ignore")
+            if matcher is not None and not matcher.match(line):
+                continue
+            matched += 1
+            timestamp, start, end = find_timestamp(line, year)
+            if timestamp is None:
+                untimed += 1
+            else:
+                bucket = int(timestamp // bucket_seconds) * bucket_seconds
+                histogram[bucket] = histogram.get(bucket, 0) + 1
+            templates.add(message_template(line, start, end))
+    return {
+        "path": path, "histogram": histogram, "counts": templates.counts, "errors": templates.errors,
+        "scanned": scanned, "matched": matched, "untimed": untimed, "complete": lines.complete, "binary": False,
+    }
+
+def expand_log_files(spec: str) -> List[str]:
+    """Liste les fichiers désignés par un répertoire (récursif) ou un glob, du plus ancien au plus récent.
+
+    Parcours et stat bloquants: à appeler via run_io. Un fichier qui disparaît entre le glob et le stat
+    (rotation) est ignoré.
+    """
+    if os.path.isfile(spec):
+        # Nom existant contenant des métacaractères de glob ([, *, ?): pris tel quel
+        return [spec]
+    if os.path.isdir(spec):
+        candidates = glob.glob(os.path.join(spec, "**", "*"), recursive=True)
+    else:
+        candidates = glob.glob(spec, recursive=True)
+    dated = []
+    for candidate in candidates:
+        try:
+            st = os.stat(candidate)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            dated.append((st.st_mtime, candidate))
+    dated.sort()
+    return [candidate for _, candidate in dated]
+
+def log_search_budget(args: Dict[str, Any]) -> float:
+    """Durée d'une recherche ou agrégation multi-fichiers, bornée sous le délai de log_analysis."""
+    return max(1.0, min(float(args.get("budget", LOG_SEARCH_BUDGET)), tool_registry["log_analysis"].timeout * 0.9))
+
+async def search_log_files(spec: str, patterns: Tuple[str, ...], max_matches: int,
+                           budget: float, as_json: bool = False) -> List[Any]:
+    """Recherche en parallèle dans plusieurs fichiers de log et fusionne les résultats par horodatage."""
+    files = await run_io(expand_log_files, spec)
+    if not files:
+        return tool_error(f"Aucun fichier de log trouvé pour: {spec}")
+    skipped = max(0, len(files) - LOG_SEARCH_MAX_FILES)
+    files = files[-LOG_SEARCH_MAX_FILES:]
+    
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    deadline = time.time() + budget
+    futures = {
+        loop.run_in_executor(pool, search_log_file, path, patterns, max_matches, deadline): path
+        for path in files
+    }
+    done, pending = await asyncio.wait(futures, timeout=budget + 1)
+    for future in pending:
+        future.cancel()
+    
+    hits = [0] * len(patterns)
+    per_file = []
+    errors = []
+    binary = []
+    incomplete = [futures[f] for f in pending]
+    for future in done:
+        try:
+            partial = future.result()
+        except Exception as e:
+            errors.append(f"{futures[future]}: {e}")
+            continue
+        if partial["binary"]:
+            binary.append(partial["path"])
+            continue
+        hits = [a + b for a, b in zip(hits, partial["hits"])]
+        per_file.append(partial["matches"])
+        if not partial["complete"]:
+            incomplete.append(partial["path"])
+    
+    # Chaque liste est déjà triée (ordre du fichier); fusion puis conservation des plus récentes
+    merged = list(heapq.merge(*per_file, key=lambda m: m[0]))[-max_matches:]
+    
+    if as_json:
+        return json_result({
+            "source": spec, "files": len(files), "hits": dict(zip(patterns, hits)), "match_count": sum(hits),
+            "incomplete": incomplete, "skipped": skipped, "binary_skipped": binary, "errors": errors,
+            "matches": [{"file": path, "line": line_no, "text": text} for _, path, line_no, text in merged],
+        }, paged=("matches",))
+    
+    result = f"Recherche dans {len(files)} fichiers de log ('{spec}'):\n"
+    result += f"Pattern recherché: {' | '.join(patterns)}\n"
+    result += f"Correspondances trouvées: {sum(hits)} ({len(merged)} plus récentes affichées, triées par date)\n"
+    if len(patterns) > 1:
+        result += "Correspondances par pattern: " + ", ".join(
+            f"{p}: {n}" for p, n in zip(patterns, hits)
+        ) + "\n"
+    if incomplete:
+        result += f"Fichiers non terminés (budget de {budget:.0f} s): {', '.join(incomplete)}\n"
+    if skipped:
+        result += f"{skipped} fichiers les plus anciens ignorés (limite de {LOG_SEARCH_MAX_FILES})\n"
+    if binary:
+        result += f"Fichiers binaires ignorés: {', '.join(binary)}\n"
+    for error in errors:
+        result += f"Erreur: {error}\n"
+    result += "\n"
+    
+    if merged:
+        result += "Lignes correspondantes:\n"
+        for _, path, line_no, text in merged:
+            result += f"{path}:{line_no}: {text}\n"
+    else:
+        result += "Aucune correspondance trouvée."
+    
+    return [types.TextContent(type="text", text=result)]
+
+async def aggregate_log_files(spec: str, patterns: Tuple[str, ...], bucket: str, top_k: int,
+                              budget: float, as_json: bool = False) -> List[Any]:
+    """Agrège un ou plusieurs fichiers de log en parallèle: histogramme temporel et top-K des modèles."""
+    files = await run_io(expand_log_files, spec)
+    if not files:
+        return tool_error(f"Aucun fichier de log trouvé pour: {spec}")
+    files = files[-LOG_SEARCH_MAX_FILES:]
+    bucket_seconds = 3600 if bucket == "hour" else 60
+    capacity = max(top_k * LOG_AGGREGATE_CAPACITY_FACTOR, 200)
+    
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    deadline = time.time() + budget
+    futures = {
+        loop.run_in_executor(pool, aggregate_log_file, path, patterns, bucket_seconds, capacity, deadline): path
+        for path in files
+    }
+    done, pending = await asyncio.wait(futures, timeout=budget + 1)
+    for future in pending:
+        future.cancel()
+    
+    histogram: Dict[int, int] = {}
+    templates = SpaceSaving(capacity)
+    scanned = matched = untimed = 0
+    incomplete = [futures[f] for f in pending]
+    errors = []
+    binary = []
+    for future in done:
+        try:
+            partial = future.result()
+        except Exception as e:
+            errors.append(f"{futures[future]}: {e}")
+            continue
+        if partial["binary"]:
+            binary.append(partial["path"])
+            continue
+        for key, count in partial["histogram"].items():
+            histogram[key] = histogram.get(key, 0) + count
+        templates.merge(partial["counts"], partial["errors"])
+        scanned += partial["scanned"]
+        matched += partial["matched"]
+        untimed += partial["untimed"]
+        if not partial["complete"]:
+            incomplete.append(partial["path"])
+    
+    if as_json:
+        # Histogramme complet (la pagination remplace la limite d'affichage du texte)
+        return json_result({
+            "source": spec, "files": len(files), "bucket": bucket, "scanned": scanned, "matched": matched,
+            "untimed": untimed, "incomplete": incomplete, "binary_skipped": binary, "errors": errors,
+            "templates": [{"template": template, "count": count, "error": error}
+                          for template, count, error in templates.top(top_k)],
+            "histogram": [{"time": datetime.fromtimestamp(key).isoformat(), "count": count}
+                          for key, count in sorted(histogram.items())],
+        }, paged=("templates", "histogram"))
+    
+    label = "heure" if bucket == "hour" else "minute"
+    result = f"Agrégation de {len(files)} fichier(s) de log ('{spec}'):\n"
+    result += f"Pattern recherché: {' | '.join(patterns) if patterns else '(toutes les lignes)'}\n"
+    result += f"Lignes analysées: {scanned}, correspondances: {matched} ({untimed} sans horodatage)\n"
+    if incomplete:
+        result += f"Fichiers non terminés (budget de {budget:.0f} s): {', '.join(incomplete)}\n"
+    if binary:
+        result += f"Fichiers binaires ignorés: {', '.join(binary)}\n"
+    for error in errors:
+        result += f"Erreur: {error}\n"
+    
+    if histogram:
+        buckets = sorted(histogram.items())
+        shown = buckets[-LOG_AGGREGATE_SHOWN_BUCKETS:]
+        peak = max(count for _, count in shown)
+        fmt = "%Y-%m-%d %H:00" if bucket == "hour" else "%Y-%m-%d %H:%M"
+        result += f"\nHistogramme par {label} ({len(buckets)} intervalles"
+        result += f", {len(shown)} derniers affichés):\n" if len(shown) < len(buckets) else "):\n"
+        for key, count in shown:
+            bar = "#" * max(1, round(30 * count / peak))
+            result += f"{datetime.fromtimestamp(key).strftime(fmt)} {bar} {count}\n"
+    
+    top = templates.top(top_k)
+    if top:
+        result += f"\nTop {len(top)} des modèles de messages:\n"
+        for i, (template, count, error) in enumerate(top, 1):
+            approx = f" (±{error})" if error else ""
+            result += f"{i}. {count}{approx} × {template[:200]}\n"
+    
+    return [types.TextContent(type="text", text=result)]
+
+# Constantes inotify (linux/inotify.h)
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+
+@functools.lru_cache(maxsize=1)
+def inotify_libc() -> Optional[ctypes.CDLL]:
+    """Charge la libc si inotify est disponible (Linux uniquement)."""
+    if not LOG_FOLLOW_INOTIFY or not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class FileWatcher:
+    """Réveil sur modification d'un fichier via inotify, avec repli sur un sondage périodique."""
+
+    def __init__(self, path: Path):
+        self.event = asyncio.Event()
+        self.fd: Optional[int] = None
+        libc = inotify_libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return
+        # Le répertoire parent est surveillé pour détecter la création du fichier après rotation
+        file_wd = libc.inotify_add_watch(fd, os.fsencode(str(path)), IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF)
+        dir_wd = libc.inotify_add_watch(fd, os.fsencode(str(path.parent)), IN_CREATE | IN_MOVED_TO)
+        if file_wd < 0 and dir_wd < 0:
+            os.close(fd)
+            return
+        self.fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._on_event)
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.fd is not None else "sondage"
+
+    def _on_event(self) -> None:
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        self.event.set()
+
+    async def wait(self, timeout: float) -> None:
+        # Même avec inotify, un réveil périodique vérifie l'état du fichier
+        if self.fd is None:
+            timeout = min(timeout, LOG_FOLLOW_POLL_INTERVAL)
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout=max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
+
+    def close(self) -> None:
+        if self.fd is not None:
+            asyncio.get_running_loop().remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+class LogSubscription:
+    """Position de lecture d'un suivi de log, conservée entre les appels."""
+
+    def __init__(self, path: Path, patterns: Tuple[str, ...]):
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.patterns = patterns
+        self.lock = threading.Lock()  # deux appels de suivi concurrents sur le même abonnement
+        self.file: Optional[BinaryIO] = open(path, "rb")
+        st = os.fstat(self.file.fileno())
+        self.inode = st.st_ino
+        self.offset = st.st_size
+        with line_index_lock:
+            index = get_line_index(path, self.file, st)
+            self.next_line = index.line_number_at(self.file, st.st_size) + 1
+            index.save()
+
+    def read_new(self) -> List[Tuple[int, str]]:
+        """Lit les lignes complètes ajoutées depuis la dernière lecture, en suivant rotations et troncatures."""
+        new_lines: List[Tuple[int, str]] = []
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if self.file is not None:
+            current = os.fstat(self.file.fileno())
+            if current.st_size < self.offset:
+                logger.info(f"Troncature détectée pour {self.path}, reprise au début")
+                self.offset = 0
+                self.next_line = 1
+            new_lines.extend(self._drain())
+        if st is not None and st.st_ino != self.inode:
+            # Rotation: le reste de l'ancien fichier a été lu, on passe au nouveau
+            logger.info(f"Rotation détectée pour {self.path}, ouverture du nouveau fichier")
+            self.close()
+            self.file = open(self.path, "rb")
+            self.inode = os.fstat(self.file.fileno()).st_ino
+            self.offset = 0
+            self.next_line = 1
+            new_lines.extend(self._drain())
+        return new_lines
+
+    def read_matches(self) -> List[Tuple[int, str]]:
+        """Nouvelles lignes correspondant aux patterns de l'abonnement (E/S et regex bloquantes, dans le pool d'E/S)."""
+        with self.lock:
+            matcher = get_matcher(self.patterns)
+            return [(n, line.strip()) for n, line in self.read_new() if matcher.match(line)]
+
+    def _drain(self) -> List[Tuple[int, str]]:
+        self.file.seek(self.offset)
+        data = self.file.read(LOG_FOLLOW_READ_LIMIT)
+        end = data.rfind(b"\n")
+        if end < 0:
+            return []
+        complete = data[:end]
+        self.offset += end + 1
+        lines = complete.split(b"\n")
+        first = self.next_line
+        self.next_line += len(lines)
+        return [(first + i, line.decode("utf-8", errors="ignore")) for i, line in enumerate(lines)]
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+log_subscriptions: "OrderedDict[str, LogSubscription]" = OrderedDict()
+
+async def follow_log(path: Path, patterns: Tuple[str, ...], duration: float,
+                     subscription_id: Optional[str], as_json: bool = False) -> List[Any]:
+    """Suit un fichier de log et retourne les nouvelles lignes correspondantes."""
+    require_process_state("Le suivi de log (follow)")
+    sub = log_subscriptions.get(subscription_id) if subscription_id else None
+    if subscription_id and sub is None:
+        raise ValueError(f"Abonnement inconnu ou expiré: {subscription_id}")
+    if sub is None:
+        sub = await run_io(LogSubscription, path, patterns)
+        log_subscriptions[sub.id] = sub
+        while len(log_subscriptions) > LOG_FOLLOW_MAX_SUBSCRIPTIONS:
+            _, evicted = log_subscriptions.popitem(last=False)
+            evicted.close()
+    else:
+        if path.resolve() != sub.path.resolve():
+            raise ValueError(f"L'abonnement {sub.id} suit {sub.path}, pas {path}")
+        # Les patterns passés à la reprise remplacent ceux de l'abonnement
+        sub.patterns = patterns
+        log_subscriptions.move_to_end(sub.id)
+    
+    watcher = FileWatcher(sub.path)
+    deadline = time.monotonic() + duration
+    matches: List[Tuple[int, str]] = []
+    try:
+        while True:
+            found = await run_io(sub.read_matches)
+            if found:
+                matches.extend(found)
+                await report_progress(len(matches), None, "\n".join(f"Ligne {n}: {text}" for n, text in found))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await watcher.wait(remaining)
+    finally:
+        mode = watcher.mode
+        watcher.close()
+    
+    if as_json:
+        return json_result({
+            "file": str(sub.path), "duration_s": duration, "mode": mode, "subscription_id": sub.id,
+            "match_count": len(matches),
+            "matches": [{"line": n, "text": text} for n, text in matches],
+        }, paged=("matches",))
+    
+    result = f"Suivi du fichier de log '{sub.path}' pendant {duration:.0f} s (mode {mode}):\n"
+    result += f"Pattern recherché: {' | '.join(sub.patterns)}\n"
+    result += f"Nouvelles correspondances: {len(matches)}\n\n"
+    if matches:
+        result += "\n".join(f"Ligne {n}: {text}" for n, text in matches[-50:]) + "\n"
+        if len(matches) > 50:
+            result += f"\n... et {len(matches) - 50} correspondances plus anciennes (envoyées en notifications)\n"
+    result += f"\nAbonnement: {sub.id} (relancer avec subscription_id pour recevoir la suite)"
+    return [types.TextContent(type="text", text=result)]
+
+def analyze_log_file(log_file: str, path: Path, patterns: Tuple[str, ...], lines: int,
+                     start_line: Optional[int], end_line: Optional[int]) -> Dict[str, Any]:
+    """Recherche les patterns dans les dernières lignes ou une plage de lignes d'un fichier (E/S bloquantes)."""
+    with open(path, 'rb') as f, line_index_lock:
+        st = os.fstat(f.fileno())
+        index = get_line_index(path, f, st)
+        if start_line is not None:
+            # Plage de lignes arbitraire, lue à partir du point de reprise le plus proche
+            first_line = int(start_line)
+            last_line = int(end_line) if end_line is not None else first_line + lines - 1
+            raw_lines = index.read_lines(f, first_line - 1, max(0, last_line - first_line + 1))
+        else:
+            # Lire les dernières lignes du fichier en remontant depuis la fin
+            start, raw_lines = tail_lines(f, st.st_size, lines)
+            first_line = index.line_number_at(f, start) + 1
+        index.save()
+    recent_lines = [line.decode('utf-8', errors='ignore') for line in raw_lines]
+
+    # Rechercher tous les patterns en une seule passe
+    matcher = get_matcher(patterns)
+    hits = [0] * len(patterns)
+    matches = []
+    for i, line in enumerate(recent_lines):
+        found = matcher.match(line)
+        if found:
+            for j in found:
+                hits[j] += 1
+            matches.append((first_line + i, line.strip()))
+
+    return {"file": log_file, "range": start_line is not None, "first_line": first_line,
+            "line_count": len(recent_lines), "patterns": patterns, "hits": hits, "matches": matches}
+
+def format_log_analysis(analysis: Dict[str, Any]) -> str:
+    """Compte rendu texte de analyze_log_file."""
+    patterns, hits, matches = analysis["patterns"], analysis["hits"], analysis["matches"]
+    if analysis["range"]:
+        scope = f"lignes {analysis['first_line']} à {analysis['first_line'] + analysis['line_count'] - 1}"
+    else:
+        scope = f"dernières {analysis['line_count']} lignes"
+    result = f"Analyse du fichier de log '{analysis['file']}' ({scope}):\n"
+    result += f"Pattern recherché: {' | '.join(patterns)}\n"
+    result += f"Correspondances trouvées: {len(matches)}\n"
+    if len(patterns) > 1:
+        result += "Correspondances par pattern: " + ", ".join(
+            f"{p}: {n}" for p, n in zip(patterns, hits)
+        ) + "\n"
+    result += "\n"
+
+    if matches:
+        result += "Lignes correspondantes:\n"
+        for line_no, text in matches[:50]:  # Limiter à 50 résultats
+            result += f"Ligne {line_no}: {text}\n"
+
+        if len(matches) > 50:
+            result += f"\n... et {len(matches) - 50} autres correspondances"
+    else:
+        result += "Aucune correspondance trouvée."
+
+    return result
+
+def log_analysis_cache_key(args: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    # Le suivi en continu dépend de l'instant de l'appel: jamais en cache
+    if args.get("follow") or args.get("subscription_id"):
+        return None
+    log_file = args["log_file"]
+    if os.path.isfile(log_file):
+        return (file_state(log_file),)
+    try:
+        return tuple((path, file_state(path)) for path in expand_log_files(log_file))
+    except OSError:
+        return None
+
+@register_tool("log_analysis", timeout=600, cache_ttl=10.0, cache_key=log_analysis_cache_key)
 async def log_analysis(args: Dict[str, Any]) -> List[types.TextContent]:
     """Analyse les logs système."""
     log_file = args["log_file"]
-    pattern = args["pattern"]
+    patterns = tuple(args.get("patterns") or [args.get("pattern", "")])
     lines = args.get("lines", 100)
+    start_line = args.get("start_line")
+    end_line = args.get("end_line")
     
     try:
-        import re
-        
         path = Path(log_file)
+        as_json = args.get("format") == "json"
+        if args.get("mode") == "aggregate":
+            top_k = max(1, min(int(args.get("top_k", 10)), 100))
+            budget = log_search_budget(args)
+            patterns = tuple(p for p in patterns if p)
+            return await aggregate_log_files(log_file, patterns, args.get("bucket", "minute"), top_k, budget,
+                                             as_json)
+        
+        if not any(patterns):
+            raise ValueError("Un pattern est requis (pattern ou patterns)")
+        
+        # Un fichier existant dont le nom contient [, * ou ? n'est pas un glob
+        if path.is_dir() or (not path.exists() and any(c in log_file for c in "*?[")):
+            max_matches = max(1, min(int(args.get("max_matches", 50)), 10000))
+            budget = log_search_budget(args)
+            return await search_log_files(log_file, patterns, max_matches, budget, as_json)
+        
         if not path.exists():
-            return [types.TextContent(
-                type="text", 
-                text=f"Fichier de log non trouvé: {log_file}"
-            )]
-        
-        # Lire les dernières lignes du fichier
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            all_lines = f.readlines()
-            recent_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-        
-        # Rechercher le pattern
-        matches = []
-        for i, line in enumerate(recent_lines, 1):
-            if re.search(pattern, line, re.IGNORECASE):
-                matches.append(f"Ligne {len(all_lines) - len(recent_lines) + i}: {line.strip()}")
-        
-        result = f"Analyse du fichier de log '{log_file}' (dernières {len(recent_lines)} lignes):\n"
-        result += f"Pattern recherché: {pattern}\n"
-        result += f"Correspondances trouvées: {len(matches)}\n\n"
-        
-        if matches:
-            result += "Lignes correspondantes:\n"
-            for match in matches[:50]:  # Limiter à 50 résultats
-                result += f"{match}\n"
-            
-            if len(matches) > 50:
-                result += f"\n... et {len(matches) - 50} autres correspondances"
-        else:
-            result += "Aucune correspondance trouvée."
+            return tool_error(f"Fichier de log non trouvé: {log_file}")
         
-        return [types.TextContent(type="text", text=result)]
+        if args.get("follow") or args.get("subscription_id"):
+            duration = max(0.0, min(float(args.get("follow_seconds", 30)), LOG_FOLLOW_MAX_SECONDS))
+            return await follow_log(path, patterns, duration, args.get("subscription_id"), as_json)
+        
+        check_line_range(start_line, end_line)
+        analysis = await run_io(analyze_log_file, log_file, path, patterns, lines, start_line, end_line)
+        if as_json:
+            return json_result({
+                "file": log_file, "first_line": analysis["first_line"], "line_count": analysis["line_count"],
+                "hits": dict(zip(patterns, analysis["hits"])), "match_count": len(analysis["matches"]),
+                "matches": [{"line": line_no, "text": text} for line_no, text in analysis["matches"]],
+            }, paged=("matches",))
+        return [types.TextContent(type="text", text=format_log_analysis(analysis))]
     
     except Exception as e:
-        return [types.TextContent(
-            type="text", 
-            text=f"Erreur lors de l'analyse des logs: {str(e)}"
-        )]
+        return tool_error(f"Erreur lors de l'analyse des logs: {str(e)}")
+
+@register_tool("result_page", timeout=10)
+async def result_page(args: Dict[str, Any]) -> List[types.TextContent]:
+    """Sert la suite des listes d'un résultat JSON tronqué, depuis le stock de pages."""
+    try:
+        require_process_state("result_page")
+        page_id, _, offsets = args["cursor"].partition(":")
+        lists = page_store.get(page_id)
+        starts = [int(n) for n in offsets.split(".")] if offsets else []
+        if len(starts) != len(lists):
+            raise ValueError(f"Curseur invalide: {args['cursor']}")
+        positions = dict(zip(lists, starts))
+        return [render_json({"offsets": positions, **lists}, tuple(lists), page_id=page_id, starts=positions)]
+    
+    except Exception as e:
+        return tool_error(f"Erreur lors de la lecture de la page: {str(e)}")
+
+async def run_batch_entry(call: Dict[str, Any], as_json: bool) -> Tuple[str, List[types.TextContent]]:
+    """Exécute une entrée d'un batch via run_tool (validation, cache et limites de l'outil compris)."""
+    name = call["name"]
+    arguments = call.get("arguments") or {}
+    if as_json and name != "result_page":
+        arguments = {"format": "json", **arguments}
+    try:
+        if name == "batch":
+            raise ValueError("Un batch ne peut pas contenir d'appel à batch")
+        result = await run_tool(name, arguments)
+    except Exception as e:
+        # Erreurs de validation des arguments: levées par run_tool hors de son propre try
+        result = tool_error(f"Erreur: {e}")
+    if as_json:
+        # Outil inconnu ou erreur de validation: pas de passage par ToolSpec.finish
+        result = [item if item.text.startswith("{") else type(item)(type="text", text=JSON_ENCODER.encode({"error": item.text}))
+                  for item in result]
+    return ("error" if reported_error(result) else "ok"), result
+
+@register_tool("batch", timeout=BATCH_DEADLINE + 5)
+async def batch(args: Dict[str, Any]) -> List[types.TextContent]:
+    """Exécute des appels d'outils en parallèle, sous un délai commun, et retourne les résultats disponibles."""
+    calls = args["calls"][:BATCH_MAX_CALLS]
+    deadline = max(0.1, min(float(args.get("deadline", BATCH_DEADLINE)), BATCH_DEADLINE))
+    as_json = args.get("format") == "json"
+    started = time.perf_counter()
+    elapsed: Dict[int, float] = {}
+    
+    async def entry(i: int, call: Dict[str, Any]) -> Tuple[str, List[types.TextContent]]:
+        outcome = await run_batch_entry(call, as_json)
+        elapsed[i] = (time.perf_counter() - started) * 1000
+        await report_progress(len(elapsed), len(calls), f"{call['name']} terminé")
+        return outcome
+    
+    # Les tâches copient le contexte à leur création: elles partagent le dictionnaire d'instantanés du batch
+    token = batch_snapshots.set({})
+    try:
+        tasks = [asyncio.create_task(entry(i, call)) for i, call in enumerate(calls)]
+    finally:
+        batch_snapshots.reset(token)
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+    finally:
+        for task in tasks:
+            task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    entries = []
+    for i, (call, task) in enumerate(zip(calls, tasks)):
+        if task in done and not task.cancelled():
+            status, result = task.result()
+        else:
+            status, result = "timeout", []
+        entries.append((call, status, result, elapsed.get(i)))
+    counts = {status: sum(1 for _, s, _, _ in entries if s == status) for status in ("ok", "error", "timeout")}
+    total = (time.perf_counter() - started) * 1000
+    
+    if as_json:
+        results = []
+        for call, status, result, duration in entries:
+            text = "".join(item.text for item in result)
+            try:
+                value = json.loads(text) if text else None
+            except ValueError:
+                value = text
+            results.append({"name": call["name"], "status": status,
+                            "elapsed_ms": round(duration, 1) if status != "timeout" else None, "result": value})
+        return json_result({"calls": len(calls), "deadline_s": deadline, "elapsed_ms": round(total, 1), **counts,
+                            "results": results}, paged=("results",))
+    
+    result = (f"Batch de {len(calls)} appels en {total:.0f} ms: {counts['ok']} réussis, {counts['error']} en erreur, "
+              f"{counts['timeout']} interrompus (délai de {deadline:g} s)\n")
+    for i, (call, status, items, duration) in enumerate(entries, 1):
+        arguments = json.dumps(call.get("arguments") or {}, ensure_ascii=False, separators=(",", ":"))
+        timing = f"{duration:.0f} ms" if status != "timeout" else "non terminé"
+        result += f"\n=== [{i}] {call['name']} {arguments} ({timing}) ===\n"
+        if status == "timeout":
+            result += f"Interrompu: délai du batch de {deadline:g} s dépassé\n"
+        for item in items:
+            result += item.text.rstrip("\n") + "\n"
+    return [types.TextContent(type="text", text=result)]
+
+def prometheus_value(value: Any) -> str:
+    if isinstance(value, float):
+        return "+Inf" if value == float("inf") else repr(value)
+    return str(value)
+
+def prometheus_escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_labels(**labels: Any) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{prometheus_escape(value)}"' for key, value in labels.items()) + "}"
+
+def pool_stats() -> Dict[str, int]:
+    """Occupation des pools d'exécution (threads d'E/S et processus CPU)."""
+    stats = {"io_threads": 0, "io_queued": 0, "process_workers": 0, "process_pending": 0}
+    if io_pool is not None:
+        stats["io_threads"] = len(getattr(io_pool, "_threads", ()))
+        queue = getattr(io_pool, "_work_queue", None)
+        stats["io_queued"] = queue.qsize() if queue is not None else 0
+    if process_pool is not None:
+        stats["process_workers"] = len(getattr(process_pool, "_processes", None) or ())
+        stats["process_pending"] = len(getattr(process_pool, "_pending_work_items", ()))
+    return stats
+
+def render_prometheus() -> str:
+    """Métriques du processus au format d'exposition texte Prometheus (un jeu par worker)."""
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str, samples: List[Tuple[Dict[str, Any], Any]]) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{prometheus_labels(**labels)} {prometheus_value(value)}")
+
+    def histogram(name: str, help_text: str, series: List[Tuple[Dict[str, Any], Histogram]]) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, hist in series:
+            for bound, count in hist.cumulative():
+                lines.append(f"{name}_bucket{prometheus_labels(**labels, le=bound)} {count}")
+            lines.append(f"{name}_sum{prometheus_labels(**labels)} {prometheus_value(hist.total)}")
+            lines.append(f"{name}_count{prometheus_labels(**labels)} {hist.count}")
+
+    specs = list(tool_registry.values())
+    cached = [spec for spec in specs if spec.cacheable]
+    family("mcp_worker_info", "gauge", "Worker du serveur MCP", [({"pid": os.getpid()}, 1)])
+    family("mcp_tool_calls_total", "counter", "Appels d'outils", [({"tool": spec.name}, spec.calls) for spec in specs])
+    histogram("mcp_tool_latency_seconds", "Durée des appels d'outils, cache compris",
+              [({"tool": spec.name}, spec.latency) for spec in specs])
+    family("mcp_tool_in_flight", "gauge", "Appels en cours d'exécution", [({"tool": spec.name}, spec.in_flight) for spec in specs])
+    family("mcp_tool_waiting", "gauge", "Appels en attente d'une place libre", [({"tool": spec.name}, spec.waiting) for spec in specs])
+    family("mcp_tool_timeouts_total", "counter", "Appels interrompus par le délai de l'outil",
+           [({"tool": spec.name}, spec.timeouts) for spec in specs])
+    family("mcp_tool_errors_total", "counter", "Erreurs par classe d'exception (ReportedError: erreur retournée en texte)",
+           [({"tool": spec.name, "exception": kind}, count) for spec in specs for kind, count in sorted(spec.errors.items())])
+    family("mcp_tool_result_bytes_total", "counter", "Octets de texte retournés",
+           [({"tool": spec.name}, spec.result_bytes) for spec in specs])
+    family("mcp_tool_cache_hits_total", "counter", "Résultats servis par le cache", [({"tool": spec.name}, spec.cache_hits) for spec in cached])
+    family("mcp_tool_cache_misses_total", "counter", "Résultats absents du cache", [({"tool": spec.name}, spec.cache_misses) for spec in cached])
+    family("mcp_tool_cache_coalesced_total", "counter", "Appels fusionnés avec un appel identique en cours",
+           [({"tool": spec.name}, spec.coalesced) for spec in cached])
+    family("mcp_result_cache_entries", "gauge", "Entrées du cache des résultats", [({}, len(result_cache.entries))])
+    family("mcp_result_cache_bytes", "gauge", "Taille du cache des résultats", [({}, result_cache.bytes)])
+    family("mcp_result_cache_evictions_total", "counter", "Évictions du cache des résultats", [({}, result_cache.evictions)])
+    pool = http_pool.stats()
+    family("mcp_http_pool_requests_total", "counter", "Requêtes du pool HTTP", [({}, pool["requests"])])
+    family("mcp_http_pool_connections_total", "counter", "Connexions HTTP par origine",
+           [({"state": "new"}, pool["new_connections"]), ({"state": "reused"}, pool["reused_connections"])])
+    family("mcp_http_pool_sockets", "gauge", "Sockets du pool HTTP",
+           [({"state": "open"}, pool["open_sockets"]), ({"state": "idle"}, pool["idle_sockets"])])
+    executors = pool_stats()
+    family("mcp_io_pool_threads", "gauge", "Threads du pool d'E/S", [({}, executors["io_threads"])])
+    family("mcp_io_pool_queued", "gauge", "Tâches en attente dans le pool d'E/S", [({}, executors["io_queued"])])
+    family("mcp_process_pool_pending", "gauge", "Tâches soumises au pool de processus", [({}, executors["process_pending"])])
+    histogram("mcp_event_loop_lag_seconds", "Retard de réveil de la boucle asyncio", [({}, loop_monitor.lag)])
+    family("mcp_event_loop_blocked_total", "counter", f"Blocages de la boucle au-delà de {LOOP_BLOCK_THRESHOLD:g} s",
+           [({}, loop_monitor.blocked)])
+    process = psutil.Process()
+    with process.oneshot():
+        cpu = process.cpu_times()
+        family("process_resident_memory_bytes", "gauge", "Mémoire résidente", [({}, process.memory_info().rss)])
+        family("process_cpu_seconds_total", "counter", "Temps CPU utilisateur et système", [({}, cpu.user + cpu.system)])
+        if hasattr(process, "num_fds"):
+            family("process_open_fds", "gauge", "Descripteurs ouverts", [({}, process.num_fds())])
+    return "\n".join(lines) + "\n"
+
+@register_tool("server_stats", timeout=10)
+async def server_stats(args: Dict[str, Any]) -> List[types.TextContent]:
+    """Expose les statistiques internes du serveur et pilote le profilage à chaud."""
+    top = max(1, int(args.get("top", PROFILE_TOP)))
+    if args.get("profile") == "start":
+        profiler.start(min(1.0, max(0.0, float(args.get("profile_rate", PROFILE_SAMPLE_RATE or PROFILE_DEFAULT_RATE)))))
+    elif args.get("profile") == "stop":
+        profiler.stop()
+    if args.get("tracemalloc") == "start":
+        await run_io(allocations.start)
+    elif args.get("tracemalloc") == "stop":
+        allocations.stop()
+    
+    if args.get("format", "text") == "prometheus":
+        return [types.TextContent(type="text", text=render_prometheus())]
+    
+    pool = http_pool.stats()
+    executors = pool_stats()
+    if args.get("format") == "json":
+        def latency(hist: Histogram) -> Dict[str, Any]:
+            return {"count": hist.count, "p50_ms": round(hist.quantile(0.5) * 1000, 2),
+                    "p95_ms": round(hist.quantile(0.95) * 1000, 2), "p99_ms": round(hist.quantile(0.99) * 1000, 2),
+                    "max_ms": round(hist.max * 1000, 2)}
+        return json_result({
+            "pid": os.getpid(),
+            "http_pool": pool,
+            "executors": executors,
+            "loop": {**latency(loop_monitor.lag), "blocked": loop_monitor.blocked},
+            "cache": {"entries": len(result_cache.entries), "bytes": result_cache.bytes,
+                      "max_bytes": result_cache.max_bytes, "evictions": result_cache.evictions},
+            "tools": [{
+                "name": name, "kind": spec.kind, "calls": spec.calls, "in_flight": spec.in_flight,
+                "concurrency": spec.concurrency, "waiting": spec.waiting, "timeouts": spec.timeouts,
+                "timeout_s": spec.timeout, "result_bytes": spec.result_bytes, "errors": spec.errors,
+                "latency": latency(spec.latency),
+                "cache": {"hits": spec.cache_hits, "misses": spec.cache_misses, "coalesced": spec.coalesced}
+                if spec.cacheable else None,
+            } for name, spec in tool_registry.items()],
+            "profile": profiler.report(top) if profiler.rate > 0 else None,
+            "allocations": await run_io(allocations.report, top) if allocations.active else None,
+        }, paged=("tools",))
+    
+    result = f"""Statistiques du serveur (pid {os.getpid()}):
+
+Pool HTTP:
+- Requêtes: {pool['requests']}
+- Connexions créées: {pool['new_connections']}
+- Connexions réutilisées: {pool['reused_connections']} ({pool['reuse_ratio'] * 100:.1f}%)
+- Sockets ouverts: {pool['open_sockets']} (dont {pool['idle_sockets']} inactifs)
+- Limites: {HTTP_POOL_LIMIT} connexions, {HTTP_POOL_LIMIT_PER_HOST} par hôte, cache DNS {HTTP_DNS_CACHE_TTL} s
+
+Pools d'exécution:
+- E/S: {executors['io_threads']}/{IO_POOL_WORKERS} threads, {executors['io_queued']} tâches en attente
+- CPU: {executors['process_workers']}/{LOG_SEARCH_WORKERS} processus, {executors['process_pending']} tâches soumises
+
+Boucle asyncio:
+- Retard: p50 {loop_monitor.lag.quantile(0.5) * 1000:.1f} ms / p99 {loop_monitor.lag.quantile(0.99) * 1000:.1f} ms / max {loop_monitor.lag.max * 1000:.1f} ms
+- Blocages > {LOOP_BLOCK_THRESHOLD:g} s: {loop_monitor.blocked}
+"""
+    if loop_monitor.recent_blocks:
+        when, stalled, stack = loop_monitor.recent_blocks[-1]
+        result += f"- Dernier blocage ({datetime.fromtimestamp(when):%H:%M:%S}, {stalled:.2f} s):\n{stack}"
+    
+    result += "\nOutils:\n"
+    for name, spec in tool_registry.items():
+        result += (f"- {name} ({spec.kind}): {spec.calls} appels, {spec.in_flight}/{spec.concurrency} en cours, "
+                   f"{spec.waiting} en attente, {spec.timeouts} délais dépassés (limite {spec.timeout:g} s)\n")
+        if spec.latency.count:
+            result += (f"  latence: p50 {spec.latency.quantile(0.5) * 1000:.1f} ms / p95 {spec.latency.quantile(0.95) * 1000:.1f} ms / "
+                       f"p99 {spec.latency.quantile(0.99) * 1000:.1f} ms, {spec.result_bytes / 1024:.1f} KB retournés\n")
+        if spec.errors:
+            result += "  erreurs: " + ", ".join(f"{kind} {count}" for kind, count in sorted(spec.errors.items())) + "\n"
+        if spec.cacheable:
+            lookups = spec.cache_hits + spec.cache_misses + spec.coalesced
+            hit_ratio = (spec.cache_hits + spec.coalesced) / lookups if lookups else 0.0
+            ttl = f"TTL {spec.cache_ttl:g} s" if spec.cache_ttl > 0 else f"sur demande, TTL {spec.opt_in_ttl:g} s"
+            result += (f"  cache ({ttl}): {spec.cache_hits} succès, {spec.cache_misses} échecs, "
+                       f"{spec.coalesced} appels fusionnés ({hit_ratio * 100:.1f}% évités)\n")
+    result += (f"\nCache des résultats: {len(result_cache.entries)} entrées, "
+               f"{result_cache.bytes / (1024**2):.2f} / {result_cache.max_bytes / (1024**2):.0f} MB, "
+               f"{result_cache.evictions} évictions\n")
+    
+    if profiler.rate > 0:
+        result += (f"\nProfilage ({profiler.rate * 100:g}% des appels, {profiler.sampled} échantillonnés depuis "
+                   f"{datetime.fromtimestamp(profiler.started):%H:%M:%S}):\n{profiler.report(top)}")
+    if allocations.active:
+        result += "\nAllocations depuis l'activation:\n" + await run_io(allocations.report, top)
+    return [types.TextContent(type="text", text=result)]
+
+docs_index_task: Optional[asyncio.Task] = None
+
+async def start_services() -> None:
+    """Démarre les ressources partagées d'un processus serveur (pool HTTP, échantillonneur, index de recherche)."""
+    global docs_index_task
+    await http_pool.start()
+    sampler.start()
+    loop_monitor.start()
+    if SEARCH_DOCS_DIRS and "local" in SEARCH_PROVIDERS:
+        docs_index_task = asyncio.create_task(index_docs_dirs())
+
+async def stop_services() -> None:
+    """Libère les ressources partagées d'un processus serveur."""
+    await sampler.stop()
+    await loop_monitor.stop()
+    await http_pool.close()
+    body_store.clear()
+    page_store.clear()
+    result_cache.clear()
+    for subscription in log_subscriptions.values():
+        subscription.close()
+    if process_pool is not None:
+        process_pool.shutdown(cancel_futures=True)
+    if io_pool is not None:
+        io_pool.shutdown(wait=False, cancel_futures=True)
+
+class StreamableHttpEndpoint:
+    """Point d'entrée ASGI délégant les requêtes MCP au gestionnaire de sessions."""
+
+    def __init__(self, manager: StreamableHTTPSessionManager):
+        self.manager = manager
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        await self.manager.handle_request(scope, receive, send)
+
+async def health(request: Request) -> JSONResponse:
+    """État du worker pour les sondes du proxy et de Docker."""
+    return JSONResponse({
+        "status": "ok",
+        "pid": os.getpid(),
+        "stateless": HTTP_STATELESS,
+        "in_flight": sum(spec.in_flight for spec in tool_registry.values()),
+    })
+
+async def metrics(request: Request) -> PlainTextResponse:
+    """Métriques du worker au format Prometheus."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+async def start_metrics_endpoint() -> web.AppRunner:
+    """Expose /metrics sur MCP_METRICS_HOST:MCP_METRICS_PORT en transport stdio (sans serveur HTTP)."""
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render_prometheus(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+    
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    logger.info(f"Métriques Prometheus sur http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
+def create_http_app() -> Starlette:
+    """Application ASGI d'un worker: transport Streamable HTTP sur MCP_HTTP_PATH, /health et /metrics."""
+    manager = StreamableHTTPSessionManager(app=server, stateless=HTTP_STATELESS)
+    
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette):
+        await start_services()
+        try:
+            async with manager.run():
+                logger.info(f"Worker {os.getpid()} prêt sur {HTTP_PATH} ({'sans état' if HTTP_STATELESS else 'avec sessions'})")
+                yield
+        finally:
+            await stop_services()
+            logger.info(f"Worker {os.getpid()} arrêté")
+    
+    return Starlette(
+        routes=[
+            Route(HTTP_PATH, endpoint=StreamableHttpEndpoint(manager), methods=["GET", "POST", "DELETE"]),
+            Route("/health", endpoint=health, methods=["GET"]),
+            Route("/metrics", endpoint=metrics, methods=["GET"]),
+        ],
+        lifespan=lifespan
+    )
+
+def serve_http() -> None:
+    """Lance le transport HTTP avec uvicorn; SIGTERM laisse MCP_HTTP_DRAIN_TIMEOUT s aux requêtes en cours."""
+    logger.info(f"Démarrage du transport HTTP sur {HTTP_HOST}:{HTTP_PORT}{HTTP_PATH} ({HTTP_WORKERS} workers)")
+    uvicorn.run(
+        f"{Path(__file__).stem}:create_http_app",
+        factory=True,
+        host=HTTP_HOST,
+        port=HTTP_PORT,
+        workers=HTTP_WORKERS,
+        timeout_graceful_shutdown=HTTP_DRAIN_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        log_level="info"
+    )
 
 async def main():
     """Point d'entrée principal du serveur MCP."""
@@ -591,11 +4550,22 @@ async def main():
     transport_type = os.getenv("MCP_TRANSPORT", "stdio")
     
     if transport_type == "stdio":
-        async with stdio_server() as (read_stream, write_stream):
-            await server.run(read_stream, write_stream, server.create_initialization_options())
+        await start_services()
+        metrics_runner = await start_metrics_endpoint() if METRICS_PORT else None
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, server.create_initialization_options())
+        finally:
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            await stop_services()
     else:
         logger.error(f"Type de transport non supporté: {transport_type}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if os.getenv("MCP_TRANSPORT", "stdio") == "http":
+        # uvicorn gère sa propre boucle et, au-delà d'un worker, ses processus
+        serve_http()
+    else:
+        asyncio.run(main())
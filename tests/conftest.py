@@ -0,0 +1,42 @@
+"""Configuration commune des tests: état du serveur isolé dans un répertoire temporaire.
+
+Les variables MCP_* sont lues à l'import de server.py: elles sont fixées ici, avant tout import.
+Les tests asynchrones utilisent le plugin pytest d'anyio (installé avec mcp), sur asyncio.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+STATE_DIR = Path(tempfile.mkdtemp(prefix="mcp-tests-"))
+
+os.environ.update({
+    "MCP_SEARCH_INDEX_PATH": str(STATE_DIR / "search-index.sqlite3"),
+    "MCP_SEARCH_PROVIDERS": "local",
+    "MCP_SEARCH_DOCS_DIRS": "",
+    "MCP_LINE_INDEX_DIR": str(STATE_DIR / "line-index"),
+    "MCP_HTTP_SPILL_DIR": str(STATE_DIR / "http-bodies"),
+    "MCP_TRANSPORT": "stdio",
+})
+sys.path.insert(0, str(ROOT))
+
+import server  # noqa: E402
+from mcp.shared.memory import create_connected_server_and_client_session  # noqa: E402
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture(scope="session")
+async def mcp_client(anyio_backend):
+    """Session MCP en mémoire sur le serveur importé, partagée par les tests (pools et services démarrés une fois)."""
+    await server.start_services()
+    try:
+        async with create_connected_server_and_client_session(server.server) as session:
+            yield session
+    finally:
+        await server.stop_services()
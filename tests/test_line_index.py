@@ -0,0 +1,126 @@
+"""Index de lignes clairsemé: plages et fin de fichier après ajouts, troncature et rotation."""
+
+import json
+import os
+
+import pytest
+
+import server
+
+def write_lines(path, first, last, mode="w"):
+    with open(path, mode, encoding="utf-8") as f:
+        f.writelines(f"ligne {n}\n" for n in range(first, last + 1))
+
+def expected(first, last):
+    return [f"ligne {n}".encode() for n in range(first, last + 1)]
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    """Blocs de lecture courts: un fichier de quelques Ko traverse de nombreux blocs et points de reprise."""
+    monkeypatch.setattr(server, "LOG_BLOCK_SIZE", 256)
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "app.log"
+    write_lines(path, 1, 1000)
+    return path
+
+def open_index(path, step=64):
+    """Index avec un point de reprise toutes les step lignes, pour exercer la recherche par bisection."""
+    f = open(path, "rb")
+    st = os.fstat(f.fileno())
+    index = server.LineIndex(path, st, step=step)
+    index.validate(f, st)
+    return f, index
+
+def test_read_lines_ranges(log):
+    f, index = open_index(log)
+    with f:
+        assert index.read_lines(f, 0, 3) == expected(1, 3)
+        assert index.read_lines(f, 499, 2) == expected(500, 501)
+        assert index.read_lines(f, 998, 10) == expected(999, 1000)
+        assert index.read_lines(f, 1000, 5) == []
+        assert len(index.offsets) > 10
+        assert index.line_offset(f, 500) == log.read_bytes().index(b"ligne 501\n")
+        assert index.line_number_at(f, index.line_offset(f, 700)) == 700
+
+def test_tail_lines(log):
+    with open(log, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        start, lines = server.tail_lines(f, size, 5)
+        assert lines == expected(996, 1000)
+        assert start == log.read_bytes().index(b"ligne 996\n")
+        assert server.tail_lines(f, size, 5000)[1] == expected(1, 1000)
+
+def test_tail_without_final_newline(tmp_path):
+    path = tmp_path / "partial.log"
+    path.write_bytes(b"a\nb\nc")
+    with open(path, "rb") as f:
+        assert server.tail_lines(f, 5, 2) == (2, [b"b", b"c"])
+
+def test_append_extends_existing_index(log):
+    f, index = open_index(log)
+    with f:
+        index.read_lines(f, 999, 1)
+        offsets = list(index.offsets)
+        write_lines(log, 1001, 1500, mode="a")
+        index.validate(f, os.fstat(f.fileno()))
+        # Ajout en fin de fichier: les points de reprise existants sont conservés
+        assert index.offsets == offsets
+        assert index.read_lines(f, 1199, 3) == expected(1200, 1202)
+        assert index.read_lines(f, 10, 1) == expected(11, 11)
+
+def test_truncation_rebuilds_index(log):
+    f, index = open_index(log)
+    with f:
+        index.read_lines(f, 999, 1)
+    write_lines(log, 1, 10)
+    with open(log, "rb") as f:
+        index.validate(f, os.fstat(f.fileno()))
+        assert index.indexed == 0 and index.offsets == [0]
+        assert index.read_lines(f, 5, 100) == expected(6, 10)
+
+def test_rewrite_with_same_length_rebuilds_index(log):
+    f, index = open_index(log)
+    with f:
+        index.read_lines(f, 999, 1)
+        content = log.read_bytes()
+        rewritten = content.replace(b"ligne 1\n", b"ligne X\n", 1)
+        with open(log, "r+b") as w:
+            w.write(rewritten + b"ligne 1001\n")
+        index.validate(f, os.fstat(f.fileno()))
+        assert index.read_lines(f, 0, 1) == [b"ligne X"]
+        assert index.read_lines(f, 1000, 1) == [b"ligne 1001"]
+
+def test_rotation_resets_index(log, tmp_path):
+    f, index = open_index(log)
+    with f:
+        index.read_lines(f, 999, 1)
+    os.rename(log, tmp_path / "app.log.1")
+    write_lines(log, 1, 3)
+    with open(log, "rb") as f:
+        index.validate(f, os.fstat(f.fileno()))
+        assert index.read_lines(f, 0, 10) == expected(1, 3)
+
+def test_persisted_index_is_reused(log):
+    f, index = open_index(log, step=server.LINE_INDEX_STEP)
+    with f:
+        index.read_lines(f, 999, 1)
+        index.save()
+        loaded = server.LineIndex.load(log, os.fstat(f.fileno()))
+        assert not loaded.dirty and loaded.indexed == index.indexed
+        loaded.validate(f, os.fstat(f.fileno()))
+        assert loaded.read_lines(f, 998, 2) == expected(999, 1000)
+
+@pytest.mark.anyio
+async def test_read_file_and_log_analysis_follow_appends(mcp_client, log):
+    result = await mcp_client.call_tool("read_file", {"file_path": str(log), "start_line": 999, "end_line": 1000})
+    assert result.content[0].text.endswith("ligne 999\nligne 1000\n")
+    write_lines(log, 1001, 1002, mode="a")
+    result = await mcp_client.call_tool("read_file", {"file_path": str(log), "start_line": 1001, "end_line": 1002})
+    assert result.content[0].text.endswith("ligne 1001\nligne 1002\n")
+    result = await mcp_client.call_tool("log_analysis", {"log_file": str(log), "pattern": "ligne 100", "lines": 3,
+                                                          "format": "json"})
+    data = json.loads(result.content[0].text)
+    assert data["first_line"] == 1000
+    assert [match["line"] for match in data["matches"]] == [1000, 1001, 1002]
@@ -0,0 +1,56 @@
+"""Recherche multi-patterns: sous-chaînes, alternance combinée et patterns testés à part."""
+
+import re
+
+import pytest
+
+import server
+
+def test_literals_use_substring_path():
+    matcher = server.PatternMatcher(("ERROR", "disk full"))
+    assert [i for i, _ in matcher.literals] == [0, 1]
+    assert matcher.combined is None and not matcher.separate
+    assert matcher.match("kernel: Disk Full on /var") == [1]
+    assert matcher.match("error: disk full") == [0, 1]
+    assert matcher.match("all good") == []
+
+def test_regexes_share_one_alternation():
+    matcher = server.PatternMatcher((r"time(out|d out)", r"\bfail(ed|ure)\b", "warn"))
+    assert matcher.combined is not None
+    assert [i for i, _ in matcher.grouped] == [0, 1]
+    assert matcher.match("Connection TIMEOUT") == [0]
+    assert matcher.match("warn: job failed") == [1, 2]
+
+def test_every_overlapping_regex_is_reported():
+    # L'alternance ne rapporte que la première branche: les suivantes sont vérifiées sur la ligne
+    matcher = server.PatternMatcher((r"err\w*", r"\w+or\b", r"\d{3}"))
+    assert matcher.match("HTTP 500 error") == [0, 1, 2]
+    assert matcher.match("mirror") == [1]
+
+def test_backreferences_are_matched_separately():
+    matcher = server.PatternMatcher((r"(\w+) \1", r"(?P<mot>\w+)-(?P=mot)", r"dup\w+", r"retr(y|ies)"))
+    assert [i for i, _ in matcher.separate] == [0, 1]
+    assert [i for i, _ in matcher.grouped] == [2, 3]
+    assert matcher.match("the the end") == [0]
+    assert matcher.match("bla-bla") == [1]
+    assert matcher.match("duplicate retries retries") == [0, 2, 3]
+    assert matcher.match("no repeat") == []
+
+def test_incompatible_patterns_fall_back_to_separate_regexes():
+    # Deux groupes homonymes ne peuvent pas cohabiter dans une même alternance
+    matcher = server.PatternMatcher((r"(?P<code>\d+) ms", r"code=(?P<code>\w+)"))
+    assert matcher.combined is None
+    assert [i for i, _ in matcher.separate] == [0, 1]
+    assert matcher.match("code=E42 after 30 ms") == [0, 1]
+
+def test_single_regex_is_not_combined():
+    matcher = server.PatternMatcher((r"5\d\d",))
+    assert matcher.combined is None and [i for i, _ in matcher.separate] == [0]
+    assert matcher.match("status=503") == [0]
+
+def test_invalid_pattern_raises():
+    with pytest.raises(re.error):
+        server.PatternMatcher(("(unclosed",))
+
+def test_get_matcher_is_cached():
+    assert server.get_matcher(("a", "b+")) is server.get_matcher(("a", "b+"))
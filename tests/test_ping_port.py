@@ -0,0 +1,77 @@
+"""Balayage ping (sonde TCP, CIDR) et scan de ports contre des ports locaux."""
+
+import asyncio
+import json
+import socket
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def listener():
+    """Port TCP en écoute sur 127.0.0.1 pendant le test."""
+    tcp = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+    try:
+        yield tcp.sockets[0].getsockname()[1]
+    finally:
+        tcp.close()
+        await tcp.wait_closed()
+
+def closed_port() -> int:
+    """Port libéré juste après avoir été réservé: une connexion y est refusée."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_expand_targets_cidr_and_lists():
+    assert server.expand_targets(["127.0.0.0/30"]) == ["127.0.0.1", "127.0.0.2"]
+    assert server.expand_targets(["10.0.0.1/32", "a.example, b.example"]) == ["10.0.0.1", "a.example", "b.example"]
+    with pytest.raises(ValueError):
+        server.expand_targets([f"10.0.0.0/{32 - (server.PING_SWEEP_MAX_HOSTS + 2).bit_length()}"])
+
+def test_parse_ports():
+    assert server.parse_ports("22, 80,8000-8002,80") == [22, 80, 8000, 8001, 8002]
+    with pytest.raises(ValueError):
+        server.parse_ports("0-10")
+    with pytest.raises(ValueError):
+        server.parse_ports("90-80")
+
+async def test_probe_port_states(listener):
+    assert (await server.probe_port("127.0.0.1", socket.AF_INET, listener, 1.0))[0] == "open"
+    assert (await server.probe_port("127.0.0.1", socket.AF_INET, closed_port(), 1.0))[0] == "closed"
+
+async def test_tcp_sweep(mcp_client, listener):
+    result = await mcp_client.call_tool("ping_host", {
+        "hosts": ["127.0.0.1", "localhost"], "method": "tcp", "port": listener, "count": 2, "format": "json",
+    })
+    assert not result.isError
+    data = json.loads(result.content[0].text)
+    assert data["method"] == "tcp" and data["alive"] == 2
+    assert [host["host"] for host in data["hosts"]] == ["127.0.0.1", "localhost"]
+    assert all(host["loss_percent"] == 0 and host["min_ms"] is not None for host in data["hosts"])
+
+async def test_tcp_sweep_counts_refusal_as_answer(mcp_client):
+    # Un refus de connexion (RST) prouve que l'hôte répond
+    result = await mcp_client.call_tool("ping_host", {
+        "host": "127.0.0.1", "method": "tcp", "port": closed_port(), "count": 1, "format": "json",
+    })
+    assert json.loads(result.content[0].text)["alive"] == 1
+
+async def test_port_scan_open_and_closed(mcp_client, listener):
+    closed = closed_port()
+    result = await mcp_client.call_tool("port_scan", {
+        "host": "127.0.0.1", "ports": f"{listener},{closed}", "format": "json",
+    })
+    assert not result.isError
+    data = json.loads(result.content[0].text)
+    assert data["open"] == [listener]
+    assert data["tested"] == 2 and data["closed_count"] == 1
+    assert data["error_count"] == 0 and data["not_scanned"] == 0
+
+async def test_port_scan_unknown_host_is_error(mcp_client):
+    result = await mcp_client.call_tool("port_scan", {"host": "host.invalid", "ports": "80"})
+    assert result.isError
+    assert "Impossible de résoudre" in result.content[0].text
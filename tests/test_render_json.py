@@ -0,0 +1,104 @@
+"""Mode JSON compact: budget d'octets par réponse, réduction des champs trop longs et pagination."""
+
+import json
+
+import pytest
+
+import server
+
+BUDGET = 2000
+
+def render(data, paged=(), **kwargs):
+    item = server.render_json(data, paged, budget=BUDGET, **kwargs)
+    assert len(item.text.encode("utf-8")) <= BUDGET
+    return json.loads(item.text)
+
+def read_all_pages(data, paged):
+    """Suit les curseurs comme result_page et retourne les listes reconstituées."""
+    page = render(data, paged)
+    collected = {key: list(page[key]) for key in paged}
+    while "page_cursor" in page:
+        page_id, _, offsets = page["page_cursor"].partition(":")
+        lists = server.page_store.get(page_id)
+        positions = dict(zip(lists, map(int, offsets.split("."))))
+        page = render({"offsets": positions, **lists}, tuple(lists), page_id=page_id, starts=positions)
+        for key in paged:
+            collected[key].extend(page[key])
+    return collected
+
+def test_small_result_is_compact_json():
+    data = {"host": "srv", "values": [1, 2.5, None], "nested": {"ok": True}}
+    item = server.render_json(data, ("values",), budget=BUDGET)
+    assert item.text == json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def test_paged_list_is_split_within_budget():
+    data = {"file": "app.log", "matches": [{"line": n, "text": f"ERROR requête {n} échouée"} for n in range(300)]}
+    page = render(data, ("matches",))
+    assert page["file"] == "app.log"
+    assert page["more"] == {"matches": 300 - len(page["matches"])}
+    assert read_all_pages(data, ("matches",)) == {"matches": data["matches"]}
+
+def test_several_paged_lists():
+    data = {"open": list(range(1000, 1400)), "hosts": [f"10.0.{n // 256}.{n % 256}" for n in range(400)]}
+    assert read_all_pages(data, ("open", "hosts")) == data
+
+def test_oversized_fields_are_clipped():
+    data = {"status": 200, "headers": {f"x-header-{n}": "v" * 200 for n in range(50)}, "body": "é" * 5000,
+            "results": list(range(100))}
+    page = render(data, ("results",))
+    assert page["status"] == 200
+    assert set(page["clipped"]) == {"headers", "body"}
+    assert page["body"].endswith(server.TRUNCATION_MARKER) and set(page["body"][:-len(server.TRUNCATION_MARKER)]) == {"é"}
+    # Les deux champs trop grands se partagent la place au lieu que le premier la prenne toute
+    assert 0 < len(page["headers"]) < 50 and len(page["body"]) > 100
+    # Un quart du budget reste aux listes paginées
+    assert len(page["results"]) > 0
+
+def test_oversized_first_item_is_clipped_not_skipped():
+    data = {"results": [{"text": "x" * 10 * BUDGET}, {"text": "suite"}]}
+    page = render(data, ("results",))
+    assert page["clipped"] == ["results"]
+    assert page["results"][0]["text"].endswith(server.TRUNCATION_MARKER)
+    assert page["more"] == {"results": 1}
+
+def test_fit_json():
+    assert server.fit_json({"a": [1, 2]}, 100) == {"a": [1, 2]}
+    clipped = server.fit_json("abcdef" * 100, 50)
+    assert clipped.endswith(server.TRUNCATION_MARKER) and len(json.dumps(clipped, ensure_ascii=False).encode()) <= 50
+    assert server.fit_json(list(range(100)), 20) == [0, 1, 2, 3, 4, 5, 6, 7, 8]
+    assert server.fit_json(12345678901234567890, 5) is None
+
+def test_no_cursor_without_process_state(monkeypatch):
+    monkeypatch.setattr(server, "HTTP_SHARED_SOCKET", True)
+    page = render({"items": list(range(2000))}, ("items",))
+    assert page["more"] and "page_cursor" not in page
+
+@pytest.mark.anyio
+async def test_result_page_follows_a_tool_result(mcp_client):
+    batch = [{"x": n} for n in range(5000)]
+    result = await mcp_client.call_tool("calculator", {"expression": "x * 2", "batch": batch, "format": "json"})
+    page = json.loads(result.content[0].text)
+    assert len(result.content[0].text.encode()) <= server.RESPONSE_MAX_BYTES
+    values = list(page["results"])
+    while "page_cursor" in page:
+        result = await mcp_client.call_tool("result_page", {"cursor": page["page_cursor"]})
+        assert len(result.content[0].text.encode()) <= server.RESPONSE_MAX_BYTES
+        page = json.loads(result.content[0].text)
+        values.extend(page["results"])
+    assert values == [n * 2 for n in range(5000)]
+
+@pytest.mark.anyio
+async def test_cached_result_gets_a_fresh_cursor(mcp_client, tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("".join(f"2024-01-01 10:00:{n % 60:02d} ERROR tâche {n} en échec\n" for n in range(3000)),
+                   encoding="utf-8")
+    args = {"log_file": str(log), "pattern": "ERROR", "lines": 3000, "format": "json", "cache": True}
+    first = json.loads((await mcp_client.call_tool("log_analysis", args)).content[0].text)
+    server.page_store.clear()
+    # Servi par le cache: le curseur est recréé, pas celui de la réponse précédente
+    second = json.loads((await mcp_client.call_tool("log_analysis", args)).content[0].text)
+    assert second["page_cursor"] != first["page_cursor"]
+    result = await mcp_client.call_tool("result_page", {"cursor": second["page_cursor"]})
+    assert not result.isError
+    following = json.loads(result.content[0].text)["matches"]
+    assert following[0]["line"] == second["matches"][-1]["line"] + 1
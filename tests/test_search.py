@@ -0,0 +1,77 @@
+"""Index plein texte local (SQLite FTS5) et outil search_web sur un corpus de fichiers."""
+
+import json
+import os
+
+import pytest
+
+import server
+
+@pytest.fixture
+def corpus(tmp_path):
+    docs = tmp_path / "docs"
+    (docs / "reseau").mkdir(parents=True)
+    (docs / "nginx.md").write_text("# Redémarrer nginx\n\nUtilisez systemctl restart nginx après un changement de configuration.\n",
+                                   encoding="utf-8")
+    (docs / "reseau" / "dns.txt").write_text("Résolution DNS\n\nVérifiez /etc/resolv.conf puis redémarrez le service.\n",
+                                             encoding="utf-8")
+    (docs / "page.html").write_text("<html><head><title>Disque plein</title><style>.x{}</style></head>"
+                                    "<body><p>Nettoyer /var/log avec logrotate</p><script>nginx()</script></body></html>",
+                                    encoding="utf-8")
+    (docs / "image.png").write_bytes(b"\x89PNG nginx")
+    return docs
+
+@pytest.fixture
+def index(tmp_path):
+    return server.SearchIndex(str(tmp_path / "index.sqlite3"))
+
+def test_index_directories_skips_unchanged_files(index, corpus):
+    assert index.index_directories([str(corpus)]) == (3, 0)
+    assert index.index_directories([str(corpus)]) == (0, 3)
+    assert index.count() == 3
+
+def test_search_ranks_title_and_ignores_diacritics(index, corpus):
+    index.index_directories([str(corpus)])
+    results = index.search("redemarrer nginx", 5)
+    assert [item["url"] for item in results] == [(corpus / "nginx.md").resolve().as_uri()]
+    assert results[0]["title"] == "Redémarrer nginx"
+    assert "«" in results[0]["snippet"]
+
+def test_search_falls_back_to_any_term(index, corpus):
+    index.index_directories([str(corpus)])
+    # Aucun document ne contient les deux termes: résultats pour l'un ou l'autre
+    urls = {item["url"] for item in index.search("logrotate resolv", 5)}
+    assert urls == {(corpus / "page.html").resolve().as_uri(), (corpus / "reseau" / "dns.txt").resolve().as_uri()}
+
+def test_html_text_excludes_scripts_and_styles(index, corpus):
+    index.index_directories([str(corpus)])
+    results = index.search("disque", 5)
+    assert results[0]["title"] == "Disque plein"
+    assert all("page.html" not in item["url"] for item in index.search("nginx", 5))
+
+def test_modified_file_is_reindexed(index, corpus):
+    index.index_directories([str(corpus)])
+    note = corpus / "nginx.md"
+    note.write_text("# Apache\n\nRedémarrer apache2.\n", encoding="utf-8")
+    os.utime(note, ns=(note.stat().st_atime_ns, note.stat().st_mtime_ns + 10**9))
+    assert index.index_directories([str(corpus)]) == (1, 2)
+    assert index.search("nginx", 5) == []
+    assert index.search("apache2", 5)[0]["title"] == "Apache"
+
+def test_add_page_versions_by_content(index):
+    assert index.add_page("http://intranet/wiki", "text/html", "<title>Wiki</title><p>sauvegarde nocturne</p>")
+    assert not index.add_page("http://intranet/wiki", "text/html", "<title>Wiki</title><p>sauvegarde nocturne</p>")
+    assert index.search("sauvegarde", 1)[0]["url"] == "http://intranet/wiki"
+
+@pytest.mark.anyio
+async def test_search_web_local_provider(mcp_client, corpus):
+    await server.run_io(server.search_index.index_directories, [str(corpus)])
+    result = await mcp_client.call_tool("search_web", {"query": "resolv.conf", "providers": ["local"], "format": "json"})
+    assert not result.isError
+    data = json.loads(result.content[0].text)
+    assert [item["url"] for item in data["results"]] == [(corpus / "reseau" / "dns.txt").resolve().as_uri()]
+    assert data["sources"] == ["index local: 1 résultats"]
+    result = await mcp_client.call_tool("search_web", {"query": "introuvable", "providers": ["local"]})
+    assert not result.isError and "Aucun résultat." in result.content[0].text
+    result = await mcp_client.call_tool("search_web", {"query": "nginx", "providers": ["inconnu"]})
+    assert result.isError